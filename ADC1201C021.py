@@ -4,10 +4,17 @@
 # Use it any way you want, profit or free, provided it fits in the licenses of
 # its associated works.
 
+from smbus2 import i2c_msg
+
+from i2c_views import message_view, transfer
+
 class ADC121C021():
     class Error(Exception):
         pass
 
+    # Values written by read_into, in order
+    FIELDS = ("value", "alert")
+
     REG_RESULT             = 0x00
     REG_ALERT_STATUS       = 0x01
     REG_CONFIG             = 0x02
@@ -43,6 +50,12 @@ class ADC121C021():
         self._bus = bus
         self._address = address
 
+        # Preallocated conversion result messages for read_into
+        self._result_write = i2c_msg.write(address, [self.REG_RESULT])
+        self._result_read = i2c_msg.read(address, 2)
+        self._result_data = message_view(self._result_read)
+        self._read_result = transfer(bus, self._result_write, self._result_read)
+
         self.set_config(convert)
 
     def set_config(self,
@@ -52,7 +65,7 @@ class ADC121C021():
                    alert_pin=False,
                    polarity=False):
         if convert not in self._CONVERT_VALUES:
-            raise Error("Unexpected convert value {0}".format(convert))
+            raise self.Error("Unexpected convert value {0}".format(convert))
 
         config = convert << 5
         if alert_hold: config |= 1 << 4
@@ -65,12 +78,25 @@ class ADC121C021():
     def read_result(self):
         msb, lsb = self._bus.read_i2c_block_data(self._address, self.REG_RESULT, 2)
 
-        alert_flag = 1 == (msb & 0x80)
+        alert_flag = 0 != (msb & 0x80)
 
-        value = ((msb & 0xf0) << 8) | lsb
+        value = ((msb & 0x0f) << 8) | lsb
 
         return value, alert_flag
 
+    def read_into(self, buffer, offset=0):
+        """Read the conversion result and alert flag (0 or 1) into
+        buffer[offset:offset + 2] (an array, NumPy row or memoryview) without
+        allocating.  Returns the number of values written."""
+        data = self._result_data
+
+        self._read_result()
+
+        buffer[offset]     = ((data[0] & 0x0f) << 8) | data[1]
+        buffer[offset + 1] = data[0] >> 7
+
+        return 2
+
 if __name__ == "__main__":
     import datetime
     import smbus2
@@ -19,6 +19,8 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import os
+
 import Adafruit_GPIO.Platform as Platform
 
 
@@ -405,16 +407,35 @@ class AdafruitMinnowAdapter(BaseGPIO):
         """
         self.bbio_gpio.wait_for_edge(self.mraa_gpio.Gpio(pin), self._edge_mapping[edge])
 
-def get_platform_gpio(**keywords):
+# Environment variable selecting the GPIO backend when get_platform_gpio()
+# isn't given one, 'cdev' for the Linux GPIO character device.
+BACKEND_ENV = 'ADAFRUIT_GPIO_BACKEND'
+
+def get_platform_gpio(backend=None, **keywords):
     """Attempt to return a GPIO instance for the platform which the code is being
     executed on.  Currently supports only the Raspberry Pi using the RPi.GPIO
     library and Beaglebone Black using the Adafruit_BBIO library.  Will throw an
     exception if a GPIO instance can't be created for the current platform.  The
     returned GPIO object is an instance of BaseGPIO.
+
+    With backend='cdev' (or ADAFRUIT_GPIO_BACKEND=cdev) the Linux GPIO character
+    device is used on any platform, keywords are passed to CdevGPIO (chip,
+    consumer).  A Raspberry Pi without RPi.GPIO installed also uses it.
     """
+    if backend is None:
+        backend = os.environ.get(BACKEND_ENV)
+    if backend == 'cdev':
+        from Adafruit_GPIO.GPIOCdev import CdevGPIO
+        return CdevGPIO(**keywords)
+    elif backend is not None:
+        raise ValueError('Unknown GPIO backend {0!r}.'.format(backend))
     plat = Platform.platform_detect()
     if plat == Platform.RASPBERRY_PI:
-        import RPi.GPIO
+        try:
+            import RPi.GPIO
+        except ImportError:
+            from Adafruit_GPIO.GPIOCdev import CdevGPIO
+            return CdevGPIO()
         return RPiGPIOAdapter(RPi.GPIO, **keywords)
     elif plat == Platform.BEAGLEBONE_BLACK:
         import Adafruit_BBIO.GPIO
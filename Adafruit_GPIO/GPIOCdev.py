@@ -0,0 +1,473 @@
+# GPIO through the Linux GPIO character device (/dev/gpiochipN), v2 uAPI.
+#
+# Unlike the sysfs and memory mapped libraries the character device hands
+# out lines in groups: one GPIO_V2_GET_LINE ioctl requests every line a
+# program uses, and one GPIO_V2_LINE_GET_VALUES or GPIO_V2_LINE_SET_VALUES
+# ioctl reads or writes any subset of them.  CdevGPIO keeps all of its pins
+# in one such request, so input_pins(), output_pins() and setup_pins() cost
+# one system call however many pins they touch.
+#
+# Pins are line offsets on the chip, on the Raspberry Pi the offsets of
+# gpiochip0 are the BCM GPIO numbers.
+#
+# Edge events are queued by the kernel with a CLOCK_MONOTONIC timestamp
+# taken in the interrupt handler and read from the line request's fd.
+# edge_events() yields them to asyncio code from the event loop's fd
+# readiness, so waiting costs no polling CPU:
+#
+#     gpio.setup(ALERT_PIN, GPIO.IN, GPIO.PUD_UP)
+#
+#     async for event in gpio.edge_events(ALERT_PIN, GPIO.FALLING):
+#         value, alert = adc.read_result()
+#         print(event.timestamp_ns, value)
+
+import asyncio
+import ctypes
+import fcntl
+import os
+import select
+from collections import namedtuple
+
+import Adafruit_GPIO.GPIO as GPIO
+
+GPIO_MAX_NAME_SIZE = 32
+GPIO_V2_LINES_MAX = 64
+GPIO_V2_LINE_NUM_ATTRS_MAX = 10
+
+# enum gpio_v2_line_flag
+GPIO_V2_LINE_FLAG_USED                 = 1 << 0
+GPIO_V2_LINE_FLAG_ACTIVE_LOW           = 1 << 1
+GPIO_V2_LINE_FLAG_INPUT                = 1 << 2
+GPIO_V2_LINE_FLAG_OUTPUT               = 1 << 3
+GPIO_V2_LINE_FLAG_EDGE_RISING          = 1 << 4
+GPIO_V2_LINE_FLAG_EDGE_FALLING         = 1 << 5
+GPIO_V2_LINE_FLAG_OPEN_DRAIN           = 1 << 6
+GPIO_V2_LINE_FLAG_OPEN_SOURCE          = 1 << 7
+GPIO_V2_LINE_FLAG_BIAS_PULL_UP         = 1 << 8
+GPIO_V2_LINE_FLAG_BIAS_PULL_DOWN       = 1 << 9
+GPIO_V2_LINE_FLAG_BIAS_DISABLED        = 1 << 10
+GPIO_V2_LINE_FLAG_EVENT_CLOCK_REALTIME = 1 << 11
+
+# enum gpio_v2_line_attr_id
+GPIO_V2_LINE_ATTR_ID_FLAGS         = 1
+GPIO_V2_LINE_ATTR_ID_OUTPUT_VALUES = 2
+GPIO_V2_LINE_ATTR_ID_DEBOUNCE      = 3
+
+class _LineAttributeValue(ctypes.Union):
+    _fields_ = [('flags',              ctypes.c_uint64),
+                ('values',             ctypes.c_uint64),
+                ('debounce_period_us', ctypes.c_uint32)]
+
+class LineAttribute(ctypes.Structure):
+    """struct gpio_v2_line_attribute"""
+    _anonymous_ = ('value',)
+    _fields_ = [('id',      ctypes.c_uint32),
+                ('padding', ctypes.c_uint32),
+                ('value',   _LineAttributeValue)]
+
+class LineConfigAttribute(ctypes.Structure):
+    """struct gpio_v2_line_config_attribute"""
+    _fields_ = [('attr', LineAttribute),
+                ('mask', ctypes.c_uint64)]
+
+class LineConfig(ctypes.Structure):
+    """struct gpio_v2_line_config"""
+    _fields_ = [('flags',     ctypes.c_uint64),
+                ('num_attrs', ctypes.c_uint32),
+                ('padding',   ctypes.c_uint32 * 5),
+                ('attrs',     LineConfigAttribute * GPIO_V2_LINE_NUM_ATTRS_MAX)]
+
+class LineRequest(ctypes.Structure):
+    """struct gpio_v2_line_request"""
+    _fields_ = [('offsets',           ctypes.c_uint32 * GPIO_V2_LINES_MAX),
+                ('consumer',          ctypes.c_char * GPIO_MAX_NAME_SIZE),
+                ('config',            LineConfig),
+                ('num_lines',         ctypes.c_uint32),
+                ('event_buffer_size', ctypes.c_uint32),
+                ('padding',           ctypes.c_uint32 * 5),
+                ('fd',                ctypes.c_int32)]
+
+class LineValues(ctypes.Structure):
+    """struct gpio_v2_line_values"""
+    _fields_ = [('bits', ctypes.c_uint64),
+                ('mask', ctypes.c_uint64)]
+
+class LineEvent(ctypes.Structure):
+    """struct gpio_v2_line_event"""
+    _fields_ = [('timestamp_ns', ctypes.c_uint64),
+                ('id',           ctypes.c_uint32),
+                ('offset',       ctypes.c_uint32),
+                ('seqno',        ctypes.c_uint32),
+                ('line_seqno',   ctypes.c_uint32),
+                ('padding',      ctypes.c_uint32 * 6)]
+
+# enum gpio_v2_line_event_id
+GPIO_V2_LINE_EVENT_RISING_EDGE  = 1
+GPIO_V2_LINE_EVENT_FALLING_EDGE = 2
+
+class ChipInfo(ctypes.Structure):
+    """struct gpiochip_info"""
+    _fields_ = [('name',  ctypes.c_char * GPIO_MAX_NAME_SIZE),
+                ('label', ctypes.c_char * GPIO_MAX_NAME_SIZE),
+                ('lines', ctypes.c_uint32)]
+
+def _IOR(type, nr, size):
+    return (2 << 30) | (size << 16) | (type << 8) | nr
+
+def _IOWR(type, nr, size):
+    return (3 << 30) | (size << 16) | (type << 8) | nr
+
+GPIO_GET_CHIPINFO_IOCTL       = _IOR(0xB4, 0x01, ctypes.sizeof(ChipInfo))
+GPIO_V2_GET_LINE_IOCTL        = _IOWR(0xB4, 0x07, ctypes.sizeof(LineRequest))
+GPIO_V2_LINE_SET_CONFIG_IOCTL = _IOWR(0xB4, 0x0D, ctypes.sizeof(LineConfig))
+GPIO_V2_LINE_GET_VALUES_IOCTL = _IOWR(0xB4, 0x0E, ctypes.sizeof(LineValues))
+GPIO_V2_LINE_SET_VALUES_IOCTL = _IOWR(0xB4, 0x0F, ctypes.sizeof(LineValues))
+
+class GPIOChip(object):
+    """An open /dev/gpiochipN.  ioctl() and close_line() take the chip's fd
+    or the fd of a line request."""
+
+    def __init__(self, path='/dev/gpiochip0'):
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CLOEXEC)
+
+    def ioctl(self, fd, request, arg):
+        fcntl.ioctl(fd, request, arg)
+
+    def read(self, fd, size):
+        return os.read(fd, size)
+
+    def close_line(self, fd):
+        os.close(fd)
+
+    def info(self):
+        info = ChipInfo()
+        self.ioctl(self.fd, GPIO_GET_CHIPINFO_IOCTL, info)
+        return info
+
+    def close(self):
+        os.close(self.fd)
+
+# An edge seen on pin, edge is GPIO.RISING or GPIO.FALLING.  timestamp_ns is
+# the kernel's CLOCK_MONOTONIC time of the interrupt (comparable with
+# time.monotonic_ns()), line_seqno counts events on the pin so gaps show
+# events lost to a full kernel buffer.
+EdgeEvent = namedtuple('EdgeEvent', ['pin', 'edge', 'timestamp_ns', 'seqno', 'line_seqno'])
+
+# Events read from the request fd at once
+_EVENT_BATCH = 16
+
+_EDGE_FLAGS = { GPIO.RISING:  GPIO_V2_LINE_FLAG_EDGE_RISING,
+                GPIO.FALLING: GPIO_V2_LINE_FLAG_EDGE_FALLING,
+                GPIO.BOTH:    GPIO_V2_LINE_FLAG_EDGE_RISING | GPIO_V2_LINE_FLAG_EDGE_FALLING }
+
+_EVENT_EDGES = { GPIO_V2_LINE_EVENT_RISING_EDGE:  GPIO.RISING,
+                 GPIO_V2_LINE_EVENT_FALLING_EDGE: GPIO.FALLING }
+
+_DIRECTION_FLAGS = { GPIO.OUT: GPIO_V2_LINE_FLAG_OUTPUT,
+                     GPIO.IN:  GPIO_V2_LINE_FLAG_INPUT }
+
+_BIAS_FLAGS = { GPIO.PUD_OFF:  GPIO_V2_LINE_FLAG_BIAS_DISABLED,
+                GPIO.PUD_UP:   GPIO_V2_LINE_FLAG_BIAS_PULL_UP,
+                GPIO.PUD_DOWN: GPIO_V2_LINE_FLAG_BIAS_PULL_DOWN }
+
+class CdevGPIO(GPIO.BaseGPIO):
+    """GPIO implementation on the Linux GPIO character device.  chip is a
+    device path or an object like GPIOChip (see fake_gpio.FakeGPIOChip).
+
+    Every pin set up is held in one line request.  Setting up a pin that is
+    not yet part of it releases and re-requests the lines (outputs keep
+    their values), so set up many pins with one setup_pins() call rather
+    than several setup() calls."""
+
+    def __init__(self, chip='/dev/gpiochip0', consumer='Adafruit_GPIO'):
+        if isinstance(chip, str):
+            chip = GPIOChip(chip)
+        self.chip = chip
+        self.consumer = consumer
+        # Line request fd, pins in request order and their position in it
+        self._fd = None
+        self._pins = []
+        self._index = {}
+        # pin: line flags, and the last value written to each output
+        self._flags = {}
+        self._outputs = {}
+        # pin: debounce period in microseconds
+        self._debounce = {}
+        # Edge event state: pins with an unconsumed event, callbacks and
+        # edge_events() queues by pin, and the loop reading the fd for them
+        self._detected = set()
+        self._callbacks = {}
+        self._queues = {}
+        self._loop = None
+
+    def setup(self, pin, mode, pull_up_down=GPIO.PUD_OFF):
+        """Set the input or output mode for a specified pin.  Mode should be
+        either OUT or IN.
+        """
+        self.setup_pins({pin: mode}, pull_up_down)
+
+    def setup_pins(self, pins, pull_up_down=GPIO.PUD_OFF):
+        """Setup multiple pins as inputs or outputs at once.  Pins should be a
+        dict of pin name to pin type (IN or OUT).  Bias (pull_up_down) applies
+        to the inputs.
+        """
+        for pin, mode in pins.items():
+            flags = _DIRECTION_FLAGS[mode]
+            if mode == GPIO.IN:
+                flags |= _BIAS_FLAGS[pull_up_down]
+            self._flags[pin] = flags
+            self._debounce.pop(pin, None)
+            if mode == GPIO.OUT:
+                self._outputs.setdefault(pin, GPIO.LOW)
+            else:
+                self._outputs.pop(pin, None)
+        self._reconfigure()
+
+    def output(self, pin, value):
+        """Set the specified pin the provided high/low value.  Value should be
+        either HIGH/LOW or a boolean (true = high).
+        """
+        self.output_pins({pin: value})
+
+    def output_pins(self, pins):
+        """Set multiple pins high or low at once with one ioctl.  Pins should
+        be a dict of pin name to pin value (HIGH/True for 1, LOW/False for 0).
+        """
+        values = LineValues()
+        for pin, value in pins.items():
+            if pin not in self._outputs:
+                raise ValueError('Pin {0} is not set up as an output.'.format(pin))
+            bit = 1 << self._index[pin]
+            values.mask |= bit
+            if value:
+                values.bits |= bit
+        self.chip.ioctl(self._fd, GPIO_V2_LINE_SET_VALUES_IOCTL, values)
+        for pin, value in pins.items():
+            self._outputs[pin] = bool(value)
+
+    def input(self, pin):
+        """Read the specified pin and return HIGH/true if the pin is pulled high,
+        or LOW/false if pulled low.
+        """
+        return self.input_pins([pin])[0]
+
+    def input_pins(self, pins):
+        """Read multiple pins with one ioctl and return list of pin values
+        GPIO.HIGH/True if the pin is pulled high, or GPIO.LOW/False if pulled low.
+        """
+        values = LineValues()
+        for pin in pins:
+            if pin not in self._index:
+                raise ValueError('Pin {0} is not set up.'.format(pin))
+            values.mask |= 1 << self._index[pin]
+        self.chip.ioctl(self._fd, GPIO_V2_LINE_GET_VALUES_IOCTL, values)
+        return [bool(values.bits >> self._index[pin] & 1) for pin in pins]
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=-1):
+        """Enable edge detection events for a particular GPIO channel.  Pin
+        should be type IN.  Edge must be RISING, FALLING or BOTH.  Callback is
+        called with the pin when events are read (by event_detected(),
+        wait_for_edge() or an edge_events() consumer), there is no callback
+        thread.  Bouncetime is the debounce period in ms, done by the kernel.
+        """
+        if not self._flags.get(pin, 0) & GPIO_V2_LINE_FLAG_INPUT:
+            raise ValueError('Pin {0} is not set up as an input.'.format(pin))
+        self._flags[pin] = self._flags[pin] & ~_EDGE_FLAGS[GPIO.BOTH] | _EDGE_FLAGS[edge]
+        if bouncetime > 0:
+            self._debounce[pin] = int(bouncetime * 1000)
+        else:
+            self._debounce.pop(pin, None)
+        if callback:
+            self.add_event_callback(pin, callback)
+        self._reconfigure()
+
+    def remove_event_detect(self, pin):
+        """Remove edge detection for a particular GPIO channel.  Pin should be
+        type IN.
+        """
+        self._flags[pin] &= ~_EDGE_FLAGS[GPIO.BOTH]
+        self._debounce.pop(pin, None)
+        self._callbacks.pop(pin, None)
+        self._detected.discard(pin)
+        self._reconfigure()
+
+    def add_event_callback(self, pin, callback):
+        """Add a callback for an event already defined using add_event_detect().
+        Pin should be type IN.
+        """
+        self._callbacks.setdefault(pin, []).append(callback)
+
+    def event_detected(self, pin):
+        """Returns True if an edge has occured on a given GPIO since the last
+        call.  You need to enable edge detection using add_event_detect()
+        first.  Pin should be type IN.
+        """
+        self.read_events()
+        if pin in self._detected:
+            self._detected.discard(pin)
+            return True
+        return False
+
+    def wait_for_edge(self, pin, edge, timeout=None):
+        """Wait for an edge and return its EdgeEvent, or None after timeout
+        seconds.  Pin should be type IN.  Edge must be RISING, FALLING or BOTH.
+        """
+        detecting = self._flags.get(pin, 0) & _EDGE_FLAGS[GPIO.BOTH]
+        if not detecting:
+            self.add_event_detect(pin, edge)
+        try:
+            while True:
+                readable, _, _ = select.select([self._fd], [], [], timeout)
+                if not readable:
+                    return None
+                for event in self.read_events():
+                    if event.pin == pin and (edge == GPIO.BOTH or event.edge == edge):
+                        self._detected.discard(pin)
+                        return event
+        finally:
+            if not detecting:
+                self.remove_event_detect(pin)
+
+    def read_events(self):
+        """Read the queued edge events without blocking.  Returns a list of
+        EdgeEvents after passing them to callbacks and edge_events()."""
+        events = []
+        if self._fd is None:
+            return events
+        size = ctypes.sizeof(LineEvent)
+        while True:
+            try:
+                data = self.chip.read(self._fd, size * _EVENT_BATCH)
+            except BlockingIOError:
+                break
+            for start in range(0, len(data) - size + 1, size):
+                raw = LineEvent.from_buffer_copy(data, start)
+                events.append(EdgeEvent(raw.offset, _EVENT_EDGES.get(raw.id), raw.timestamp_ns,
+                                        raw.seqno, raw.line_seqno))
+            if len(data) < size * _EVENT_BATCH:
+                break
+        for event in events:
+            self._detected.add(event.pin)
+            for callback in self._callbacks.get(event.pin, ()):
+                callback(event.pin)
+            for queue in self._queues.get(event.pin, ()):
+                if queue.full():
+                    # Keep the newest events, the consumer fell behind
+                    queue.get_nowait()
+                queue.put_nowait(event)
+        return events
+
+    async def edge_events(self, pin, edge=None, maxsize=1024):
+        """Async iterator of the EdgeEvents of pin, enabling edge detection
+        for edge first when given.  Events are read when the event loop sees
+        the request fd readable.  At most maxsize events wait for the
+        consumer, older ones are dropped after that (see
+        EdgeEvent.line_seqno).
+        """
+        if edge is not None:
+            self.add_event_detect(pin, edge)
+        elif not self._flags.get(pin, 0) & _EDGE_FLAGS[GPIO.BOTH]:
+            raise ValueError('Edge detection is not enabled for pin {0}.'.format(pin))
+        loop = asyncio.get_running_loop()
+        if self._loop is not None and self._loop is not loop:
+            raise RuntimeError('Edge events are already read by another event loop.')
+        queue = asyncio.Queue(maxsize)
+        self._queues.setdefault(pin, []).append(queue)
+        if self._loop is None:
+            self._loop = loop
+            loop.add_reader(self._fd, self.read_events)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._queues[pin].remove(queue)
+            if not self._queues[pin]:
+                del self._queues[pin]
+            if not self._queues and self._loop is not None:
+                if self._fd is not None:
+                    self._loop.remove_reader(self._fd)
+                self._loop = None
+
+    def cleanup(self, pin=None):
+        """Release the specified pin, or all pins if none is specified.
+        """
+        if pin is None:
+            self._flags.clear()
+            self._outputs.clear()
+            self._debounce.clear()
+            self._callbacks.clear()
+            self._detected.clear()
+        else:
+            self._flags.pop(pin, None)
+            self._outputs.pop(pin, None)
+            self._debounce.pop(pin, None)
+            self._callbacks.pop(pin, None)
+            self._detected.discard(pin)
+        self._request()
+
+    def _reconfigure(self):
+        if self._fd is not None and all(pin in self._index for pin in self._flags):
+            self.chip.ioctl(self._fd, GPIO_V2_LINE_SET_CONFIG_IOCTL, self._config())
+        else:
+            self._request()
+
+    def _config(self):
+        # Direction and bias as FLAGS attributes for each distinct set of
+        # flags, initial output levels as one OUTPUT_VALUES attribute.
+        config = LineConfig()
+        groups = {}
+        for pin in self._pins:
+            groups.setdefault(self._flags[pin], []).append(self._index[pin])
+        outputs = [self._index[pin] for pin in self._pins if pin in self._outputs]
+        debounce = {}
+        for pin, period in self._debounce.items():
+            debounce.setdefault(period, []).append(self._index[pin])
+        if len(groups) + len(debounce) + (1 if outputs else 0) > GPIO_V2_LINE_NUM_ATTRS_MAX:
+            raise ValueError('Too many different pin configurations.')
+        for flags, indexes in groups.items():
+            attr = config.attrs[config.num_attrs]
+            attr.attr.id = GPIO_V2_LINE_ATTR_ID_FLAGS
+            attr.attr.flags = flags
+            attr.mask = sum(1 << index for index in indexes)
+            config.num_attrs += 1
+        if outputs:
+            attr = config.attrs[config.num_attrs]
+            attr.attr.id = GPIO_V2_LINE_ATTR_ID_OUTPUT_VALUES
+            attr.attr.values = sum(1 << self._index[pin] for pin in self._pins
+                                   if self._outputs.get(pin))
+            attr.mask = sum(1 << index for index in outputs)
+            config.num_attrs += 1
+        for period, indexes in debounce.items():
+            attr = config.attrs[config.num_attrs]
+            attr.attr.id = GPIO_V2_LINE_ATTR_ID_DEBOUNCE
+            attr.attr.debounce_period_us = period
+            attr.mask = sum(1 << index for index in indexes)
+            config.num_attrs += 1
+        return config
+
+    def _request(self):
+        # (Re)request every configured line in one GPIO_V2_GET_LINE, moving
+        # the event loop reader to the new fd
+        if self._fd is not None:
+            if self._loop is not None:
+                self._loop.remove_reader(self._fd)
+            self.chip.close_line(self._fd)
+            self._fd = None
+        self._pins = sorted(self._flags)
+        self._index = dict((pin, index) for index, pin in enumerate(self._pins))
+        if not self._pins:
+            return
+        if len(self._pins) > GPIO_V2_LINES_MAX:
+            raise ValueError('At most {0} pins can be set up.'.format(GPIO_V2_LINES_MAX))
+        request = LineRequest()
+        for index, pin in enumerate(self._pins):
+            request.offsets[index] = pin
+        request.consumer = self.consumer.encode()[:GPIO_MAX_NAME_SIZE - 1]
+        request.config = self._config()
+        request.num_lines = len(self._pins)
+        self.chip.ioctl(self.chip.fd, GPIO_V2_GET_LINE_IOCTL, request)
+        self._fd = request.fd
+        os.set_blocking(self._fd, False)
+        if self._loop is not None:
+            self._loop.add_reader(self._fd, self.read_events)
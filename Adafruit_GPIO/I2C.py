@@ -19,11 +19,17 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
-import logging
+import ctypes
 import os
-import subprocess
+import sys
 
-import Adafruit_GPIO.Platform as Platform
+# Platform is imported only by the functions that detect the platform, so
+# drivers given an explicit bus number don't pay for detection imports.
+
+BCM2708_COMBINED_PARAMETER = '/sys/module/i2c_bcm2708/parameters/combined'
+
+# Most messages the kernel accepts in one I2C_RDWR ioctl
+I2C_RDWR_IOCTL_MAX_MSGS = 42
 
 
 def reverseByteOrder(data):
@@ -42,6 +48,7 @@ def get_default_bus():
     Raspberry Pi either bus 0 or 1 (based on the Pi revision) will be returned.
     For a Beaglebone Black the first user accessible bus, 1, will be returned.
     """
+    import Adafruit_GPIO.Platform as Platform
     plat = Platform.platform_detect()
     if plat == Platform.RASPBERRY_PI:
         if Platform.pi_revision() == 1:
@@ -72,18 +79,45 @@ def require_repeated_start():
     this function.  See this thread for more details:
       http://www.raspberrypi.org/forums/viewtopic.php?f=44&t=15840
     """
+    import Adafruit_GPIO.Platform as Platform
     plat = Platform.platform_detect()
-    if plat == Platform.RASPBERRY_PI and os.path.exists('/sys/module/i2c_bcm2708/parameters/combined'):
+    if plat == Platform.RASPBERRY_PI and os.path.exists(BCM2708_COMBINED_PARAMETER):
         # On the Raspberry Pi there is a bug where register reads don't send a
         # repeated start condition like the kernel smbus I2C driver functions
         # define.  As a workaround this bit in the BCM2708 driver sysfs tree can
-        # be changed to enable I2C repeated starts.
-        subprocess.check_call('chmod 666 /sys/module/i2c_bcm2708/parameters/combined', shell=True)
-        subprocess.check_call('echo -n 1 > /sys/module/i2c_bcm2708/parameters/combined', shell=True)
+        # be changed to enable I2C repeated starts.  Writing it needs root, so
+        # it is only written when not already set.
+        with open(BCM2708_COMBINED_PARAMETER) as parameter:
+            combined = parameter.read().strip()
+        if combined not in ('1', 'Y'):
+            with open(BCM2708_COMBINED_PARAMETER, 'w') as parameter:
+                parameter.write('1')
     # Other platforms are a no-op because they (presumably) have the correct
     # behavior and send repeated starts.
 
 
+def transfer(bus, *msgs):
+    """Return a function doing bus.i2c_rdwr(*msgs).  smbus2 builds the ioctl
+    argument, an array of copies of the messages, on every i2c_rdwr.  For an
+    smbus2 SMBus it is built once here and the ioctl made directly, so a
+    transfer of preallocated messages allocates nothing.  Other buses (fakes,
+    recorders, locked or resilient wrappers) get i2c_rdwr called."""
+    try:
+        from smbus2 import SMBus
+        from smbus2.smbus2 import I2C_RDWR, i2c_rdwr_ioctl_data
+    except ImportError:
+        SMBus = None
+    if SMBus is None or not isinstance(bus, SMBus):
+        i2c_rdwr = bus.i2c_rdwr
+        return lambda: i2c_rdwr(*msgs)
+    from fcntl import ioctl
+    data = i2c_rdwr_ioctl_data.create(*msgs)
+    def rdwr():
+        # Looked up on each transfer as the bus may have been reopened.
+        ioctl(bus.fd, I2C_RDWR, data)
+    return rdwr
+
+
 class Device(object):
     """Class for communicating with an I2C device using the adafruit-pureio pure
     python smbus library, or other smbus compatible I2C interface. Allows reading
@@ -99,8 +133,22 @@ class Device(object):
         else:
             # Otherwise use the provided class to create an smbus interface.
             self._bus = i2c_interface(busnum)
-        self._logger = logging.getLogger('Adafruit_I2C.Device.Bus.{0}.Address.{1:#0X}' \
-                                .format(busnum, address))
+        self._logger_name = 'Adafruit_I2C.Device.Bus.{0}.Address.{1:#0X}' \
+                                .format(busnum, address)
+        self._logger_instance = None
+        # Preallocated i2c_rdwr messages for readListInto, by register and length
+        self._messages = {}
+        # Message lists for readListsInto, by (register, length) pairs
+        self._batches = {}
+
+    @property
+    def _logger(self):
+        # Created on first use, so importing this module doesn't import
+        # logging.
+        if self._logger_instance is None:
+            import logging
+            self._logger_instance = logging.getLogger(self._logger_name)
+        return self._logger_instance
 
     def writeRaw8(self, value):
         """Write an 8-bit value on the bus (without register)."""
@@ -131,12 +179,78 @@ class Device(object):
 
     def readList(self, register, length):
         """Read a length number of bytes from the specified register.  Results
-        will be returned as a bytearray."""
-        results = self._bus.read_i2c_block_data(self._address, register, length)
+        will be returned as a bytearray.  When the bus supports i2c_rdwr
+        (smbus2) any length can be read, otherwise up to 32 bytes."""
+        if hasattr(self._bus, 'i2c_rdwr'):
+            results = bytearray(length)
+            self.readListInto(register, results)
+        else:
+            results = self._bus.read_i2c_block_data(self._address, register, length)
         self._logger.debug("Read the following from register 0x%02X: %s",
                      register, results)
         return results
 
+    def readListInto(self, register, buffer):
+        """Read len(buffer) bytes from the specified register into buffer, a
+        bytearray or other writable buffer.  When the bus supports i2c_rdwr
+        (smbus2) this is one combined write/read transaction through messages
+        created on first use, so repeated reads allocate nothing."""
+        if not hasattr(self._bus, 'i2c_rdwr'):
+            buffer[:] = bytes(self._bus.read_i2c_block_data(self._address, register, len(buffer)))
+            return
+        _, _, data, rdwr = self._read_messages(register, len(buffer))
+        rdwr()
+        buffer[:] = data
+
+    def readLists(self, reads):
+        """Read several registers given as (register, length) pairs, see
+        readListsInto.  Returns a list of bytearrays."""
+        buffers = [bytearray(length) for _, length in reads]
+        self.readListsInto([(register, buffer)
+                            for (register, _), buffer in zip(reads, buffers)])
+        return buffers
+
+    def readListsInto(self, reads):
+        """Read several registers given as (register, buffer) pairs, each as
+        readListInto would.  With i2c_rdwr the combined write/read messages of
+        up to 21 registers go to the kernel in one ioctl, so reading a
+        sensor's scattered registers costs one system call instead of one
+        per register."""
+        if not hasattr(self._bus, 'i2c_rdwr'):
+            for register, buffer in reads:
+                self.readListInto(register, buffer)
+            return
+        key = tuple((register, len(buffer)) for register, buffer in reads)
+        batch = self._batches.get(key)
+        if batch is None:
+            messages = [self._read_messages(register, length) for register, length in key]
+            requests = []
+            for write, read, _, _ in messages:
+                requests.extend((write, read))
+            batch = self._batches[key] = (
+                [requests[start:start + I2C_RDWR_IOCTL_MAX_MSGS]
+                 for start in range(0, len(requests), I2C_RDWR_IOCTL_MAX_MSGS)],
+                [data for _, _, data, _ in messages])
+        chunks, results = batch
+        for chunk in chunks:
+            self._bus.i2c_rdwr(*chunk)
+        for (_, buffer), data in zip(reads, results):
+            buffer[:] = data
+
+    def _read_messages(self, register, length):
+        """Combined write/read i2c_msgs for register, a view of the read
+        message's buffer and a function transferring them, created once per
+        register and length"""
+        messages = self._messages.get((register, length))
+        if messages is None:
+            from smbus2 import i2c_msg
+            write = i2c_msg.write(self._address, [register])
+            read = i2c_msg.read(self._address, length)
+            data = (ctypes.c_uint8 * length).from_address(ctypes.addressof(read.buf.contents))
+            messages = self._messages[(register, length)] = (
+                write, read, data, transfer(self._bus, write, read))
+        return messages
+
     def readRaw8(self):
         """Read an 8-bit value on the bus (without register)."""
         result = self._bus.read_byte(self._address) & 0xFF
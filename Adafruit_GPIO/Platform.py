@@ -18,6 +18,8 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import importlib.util
+import os
 import platform
 import re
 
@@ -28,9 +30,68 @@ BEAGLEBONE_BLACK = 2
 MINNOWBOARD      = 3
 JETSON_NANO       = 4
 
+_PLATFORM_NAMES = {
+    'UNKNOWN':          UNKNOWN,
+    'RASPBERRY_PI':     RASPBERRY_PI,
+    'BEAGLEBONE_BLACK': BEAGLEBONE_BLACK,
+    'MINNOWBOARD':      MINNOWBOARD,
+    'JETSON_NANO':      JETSON_NANO,
+}
+
+# Environment variables that skip detection, for containers and CI.
+# ADAFRUIT_GPIO_PLATFORM takes a constant name above (or its number) and
+# ADAFRUIT_GPIO_PI_REVISION takes 1 or 2.
+PLATFORM_ENV    = 'ADAFRUIT_GPIO_PLATFORM'
+PI_REVISION_ENV = 'ADAFRUIT_GPIO_PI_REVISION'
+
+# Detection results are cached for the life of the process.
+_cache = {}
+
+def set_platform(plat, revision=None):
+    """Override platform detection (and optionally the Pi revision) for the
+    rest of the process, for example from a configuration file."""
+    _cache['platform'] = plat
+    if revision is not None:
+        _cache['pi_revision'] = revision
+
+def clear_cache():
+    """Forget cached detection results and overrides so the next call detects
+    again."""
+    _cache.clear()
+
+def _parse_platform(value):
+    value = value.strip().upper()
+    if value in _PLATFORM_NAMES:
+        return _PLATFORM_NAMES[value]
+    if value.isdigit() and int(value) in _PLATFORM_NAMES.values():
+        return int(value)
+    raise ValueError('Unexpected {0} value {1}.'.format(PLATFORM_ENV, value))
+
+def _cpuinfo():
+    """Contents of /proc/cpuinfo, read once per process.  Empty when there is
+    no /proc/cpuinfo (not Linux)."""
+    if 'cpuinfo' not in _cache:
+        try:
+            with open('/proc/cpuinfo', 'r') as infile:
+                _cache['cpuinfo'] = infile.read()
+        except IOError:
+            _cache['cpuinfo'] = ''
+    return _cache['cpuinfo']
+
 def platform_detect():
     """Detect if running on the Raspberry Pi or Beaglebone Black and return the
-    platform type.  Will return RASPBERRY_PI, BEAGLEBONE_BLACK, or UNKNOWN."""
+    platform type.  Will return RASPBERRY_PI, BEAGLEBONE_BLACK, or UNKNOWN.
+    The result is cached, and can be overridden with set_platform() or the
+    ADAFRUIT_GPIO_PLATFORM environment variable."""
+    if 'platform' not in _cache:
+        override = os.environ.get(PLATFORM_ENV)
+        if override:
+            _cache['platform'] = _parse_platform(override)
+        else:
+            _cache['platform'] = _platform_detect()
+    return _cache['platform']
+
+def _platform_detect():
     # Handle Raspberry Pi
     pi = pi_version()
     if pi is not None:
@@ -50,13 +111,11 @@ def platform_detect():
         return JETSON_NANO
         
     # Handle Minnowboard
-    # Assumption is that mraa is installed
-    try: 
-        import mraa 
+    # Only import mraa when it is installed, importing it probes the hardware
+    if importlib.util.find_spec('mraa') is not None:
+        import mraa
         if mraa.getPlatformName()=='MinnowBoard MAX':
             return MINNOWBOARD
-    except ImportError:
-        pass
     
     # Couldn't figure out the platform, just return unknown.
     return UNKNOWN
@@ -64,21 +123,31 @@ def platform_detect():
 
 def pi_revision():
     """Detect the revision number of a Raspberry Pi, useful for changing
-    functionality like default I2C bus based on revision."""
+    functionality like default I2C bus based on revision.  The result is
+    cached, and can be overridden with the ADAFRUIT_GPIO_PI_REVISION
+    environment variable."""
+    if 'pi_revision' not in _cache:
+        override = os.environ.get(PI_REVISION_ENV)
+        if override:
+            _cache['pi_revision'] = int(override)
+        else:
+            _cache['pi_revision'] = _pi_revision()
+    return _cache['pi_revision']
+
+def _pi_revision():
     # Revision list available at: http://elinux.org/RPi_HardwareHistory#Board_Revision_History
-    with open('/proc/cpuinfo', 'r') as infile:
-        for line in infile:
-            # Match a line of the form "Revision : 0002" while ignoring extra
-            # info in front of the revsion (like 1000 when the Pi was over-volted).
-            match = re.match('Revision\s+:\s+.*(\w{4})$', line, flags=re.IGNORECASE)
-            if match and match.group(1) in ['0000', '0002', '0003']:
-                # Return revision 1 if revision ends with 0000, 0002 or 0003.
-                return 1
-            elif match:
-                # Assume revision 2 if revision ends with any other 4 chars.
-                return 2
-        # Couldn't find the revision, throw an exception.
-        raise RuntimeError('Could not determine Raspberry Pi revision.')
+    for line in _cpuinfo().splitlines():
+        # Match a line of the form "Revision : 0002" while ignoring extra
+        # info in front of the revsion (like 1000 when the Pi was over-volted).
+        match = re.match('Revision\s+:\s+.*(\w{4})$', line, flags=re.IGNORECASE)
+        if match and match.group(1) in ['0000', '0002', '0003']:
+            # Return revision 1 if revision ends with 0000, 0002 or 0003.
+            return 1
+        elif match:
+            # Assume revision 2 if revision ends with any other 4 chars.
+            return 2
+    # Couldn't find the revision, throw an exception.
+    raise RuntimeError('Could not determine Raspberry Pi revision.')
 
 
 def pi_version():
@@ -91,8 +160,7 @@ def pi_version():
     # 2709 is pi 2
     # 2835 is pi 3 on 4.9.x kernel
     # Anything else is not a pi.
-    with open('/proc/cpuinfo', 'r') as infile:
-        cpuinfo = infile.read()
+    cpuinfo = _cpuinfo()
     # Match a line like 'Hardware   : BCM2709'
     match = re.search('^Hardware\s+:\s+(\w+)$', cpuinfo,
                       flags=re.MULTILINE | re.IGNORECASE)
@@ -110,4 +178,17 @@ def pi_version():
         return 3
     else:
         # Something else, not a pi.
-        return None
\ No newline at end of file
+        return None
+
+
+if __name__ == '__main__':
+    # Startup cost of detection, uncached and then cached.
+    import timeit
+
+    clear_cache()
+    first = timeit.timeit(platform_detect, number=1)
+    cached = timeit.timeit(platform_detect, number=1000) / 1000
+
+    print('platform: {0}'.format(platform_detect()))
+    print('first detection:  {0:0.1f}µs'.format(first * 1e6))
+    print('cached detection: {0:0.3f}µs'.format(cached * 1e6))
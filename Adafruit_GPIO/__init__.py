@@ -1,3 +1,19 @@
 from __future__ import absolute_import
 
-from Adafruit_GPIO.GPIO import *
\ No newline at end of file
+# The GPIO names are re-exported lazily so importing a submodule such as
+# Adafruit_GPIO.I2C doesn't also import GPIO and platform detection.
+__all__ = ['OUT', 'IN', 'HIGH', 'LOW', 'RISING', 'FALLING', 'BOTH',
+           'PUD_OFF', 'PUD_DOWN', 'PUD_UP', 'BaseGPIO', 'RPiGPIOAdapter',
+           'AdafruitBBIOAdapter', 'AdafruitMinnowAdapter', 'BACKEND_ENV',
+           'get_platform_gpio']
+
+def __getattr__(name):
+    import Adafruit_GPIO.GPIO as GPIO
+    try:
+        return getattr(GPIO, name)
+    except AttributeError:
+        raise AttributeError("module 'Adafruit_GPIO' has no attribute {0!r}".format(name))
+
+def __dir__():
+    import Adafruit_GPIO.GPIO as GPIO
+    return sorted(set(globals()) | set(dir(GPIO)))
@@ -22,8 +22,11 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
-import logging
+import struct
 import time
+from collections import namedtuple
+
+import psychrometrics
 
 
 # BME280 default address.
@@ -87,8 +90,13 @@ BME280_REGISTER_CONTROL = 0xF4
 BME280_REGISTER_CONFIG = 0xF5
 BME280_REGISTER_DATA = 0xF7
 
+BME280Reading = namedtuple("BME280Reading", ["temperature", "pressure", "humidity"])
+
 
 class BME280:
+    # Values written by read_into, in order
+    FIELDS = ("temperature", "pressure", "humidity")
+
     def __init__(self,
                  t_mode=BME280_OSAMPLE_1,
                  p_mode=BME280_OSAMPLE_1,
@@ -98,8 +106,6 @@ class BME280:
                  address=BME280_I2CADDR,
                  i2c=None,
                  **kwargs):
-        self._logger = logging.getLogger('Adafruit_BMP.BMP085')
-
         # Check that t_mode is valid.
         if t_mode not in [BME280_OSAMPLE_1, BME280_OSAMPLE_2, BME280_OSAMPLE_4,
                         BME280_OSAMPLE_8, BME280_OSAMPLE_16]:
@@ -162,35 +168,27 @@ class BME280:
         self._device.write8(BME280_REGISTER_CONTROL, ((t_mode << 5) | (p_mode << 2) | 3))
         self.t_fine = 0.0
 
+        # Burst read buffer for read_into
+        self._data = bytearray(8)
+
     def _load_calibration(self):
         """Load BME280 calibration values for compensated temperature output"""
-        self.dig_T1 = self._device.readU16LE(BME280_REGISTER_DIG_T1)
-        self.dig_T2 = self._device.readS16LE(BME280_REGISTER_DIG_T2)
-        self.dig_T3 = self._device.readS16LE(BME280_REGISTER_DIG_T3)
-
-        self.dig_P1 = self._device.readU16LE(BME280_REGISTER_DIG_P1)
-        self.dig_P2 = self._device.readS16LE(BME280_REGISTER_DIG_P2)
-        self.dig_P3 = self._device.readS16LE(BME280_REGISTER_DIG_P3)
-        self.dig_P4 = self._device.readS16LE(BME280_REGISTER_DIG_P4)
-        self.dig_P5 = self._device.readS16LE(BME280_REGISTER_DIG_P5)
-        self.dig_P6 = self._device.readS16LE(BME280_REGISTER_DIG_P6)
-        self.dig_P7 = self._device.readS16LE(BME280_REGISTER_DIG_P7)
-        self.dig_P8 = self._device.readS16LE(BME280_REGISTER_DIG_P8)
-        self.dig_P9 = self._device.readS16LE(BME280_REGISTER_DIG_P9)
-
-        self.dig_H1 = self._device.readU8(BME280_REGISTER_DIG_H1)
-        self.dig_H2 = self._device.readS16LE(BME280_REGISTER_DIG_H2)
-        self.dig_H3 = self._device.readU8(BME280_REGISTER_DIG_H3)
-        self.dig_H6 = self._device.readS8(BME280_REGISTER_DIG_H7)
-
-        h4 = self._device.readS8(BME280_REGISTER_DIG_H4)
-        h4 = (h4 << 4)
-        self.dig_H4 = h4 | (self._device.readU8(BME280_REGISTER_DIG_H5) & 0x0F)
-
-        h5 = self._device.readS8(BME280_REGISTER_DIG_H6)
-        h5 = (h5 << 4)
-        self.dig_H5 = h5 | (
-        self._device.readU8(BME280_REGISTER_DIG_H5) >> 4 & 0x0F)
+        # One batched read of the three calibration blocks where the bus
+        # supports it, instead of a transaction per parameter
+        tp, h1, h = self._device.readLists([(BME280_REGISTER_DIG_T1, 24),
+                                            (BME280_REGISTER_DIG_H1, 1),
+                                            (BME280_REGISTER_DIG_H2, 7)])
+
+        (self.dig_T1, self.dig_T2, self.dig_T3,
+         self.dig_P1, self.dig_P2, self.dig_P3, self.dig_P4, self.dig_P5,
+         self.dig_P6, self.dig_P7, self.dig_P8, self.dig_P9) = struct.unpack("<HhhHhhhhhhhh", tp)
+
+        self.dig_H1 = h1[0]
+
+        self.dig_H2, self.dig_H3, h4, h45, h5, self.dig_H6 = struct.unpack("<hBbBbb", h)
+
+        self.dig_H4 = (h4 << 4) | (h45 & 0x0F)
+        self.dig_H5 = (h5 << 4) | (h45 >> 4 & 0x0F)
 
         '''
         print '0xE4 = {0:2x}'.format (self._device.readU8 (BME280_REGISTER_DIG_H4))
@@ -205,13 +203,16 @@ class BME280:
         print 'dig_H6 = {0:d}'.format (self.dig_H6)
         '''
 
+    def _wait_for_conversion(self):
+        while (self._device.readU8(BME280_REGISTER_STATUS) & 0x08):    # Wait for conversion to complete (TODO : add timeout)
+            time.sleep(0.002)
+
     def read_raw_temp(self):
         """Waits for reading to become available on device."""
         """Does a single burst read of all data values from device."""
         """Returns the raw (uncompensated) temperature from the sensor."""
 
-        while (self._device.readU8(BME280_REGISTER_STATUS) & 0x08):    # Wait for conversion to complete (TODO : add timeout)
-            time.sleep(0.002)
+        self._wait_for_conversion()
 
         self.BME280Data = self._device.readList(BME280_REGISTER_DATA, 8)
 
@@ -240,8 +241,11 @@ class BME280:
     def read_temperature(self):
         """Gets the compensated temperature in ℃"""
 
+        return self._compensate_temperature(self.read_raw_temp())
+
+    def _compensate_temperature(self, raw):
         # float in Python is double precision
-        UT = float(self.read_raw_temp())
+        UT = float(raw)
 
         var1 = (UT / 16384.0 - float(self.dig_T1) / 1024.0) * float(self.dig_T2)
         var2 = ((UT / 131072.0 - float(self.dig_T1) / 8192.0) * (
@@ -257,7 +261,10 @@ class BME280:
     def read_pressure(self):
         """Gets the compensated pressure in Pascals."""
 
-        adc = float(self.read_raw_pressure())
+        return self._compensate_pressure(self.read_raw_pressure())
+
+    def _compensate_pressure(self, raw):
+        adc = float(raw)
 
         var1 = float(self.t_fine) / 2.0 - 64000.0
         var2 = var1 * var1 * float(self.dig_P6) / 32768.0
@@ -278,7 +285,10 @@ class BME280:
         return p
 
     def read_humidity(self):
-        adc = float(self.read_raw_humidity())
+        return self._compensate_humidity(self.read_raw_humidity())
+
+    def _compensate_humidity(self, raw):
+        adc = float(raw)
         h = float(self.t_fine) - 76800.0
         h = (adc - (float(self.dig_H4) * 64.0 + float(self.dig_H5) / 16384.0 * h)) * (
         float(self.dig_H2) / 65536.0 * (1.0 + float(self.dig_H6) / 67108864.0 * h * (
@@ -305,16 +315,41 @@ class BME280:
         inches = pascals * 0.0002953
         return inches
 
+    def read_all(self):
+        """Return temperature in ℃, pressure in Pascals and humidity in %RH
+        from a single burst read"""
+        temperature = self.read_temperature()
+        pressure    = self.read_pressure()
+        humidity    = self.read_humidity()
+
+        return BME280Reading(temperature, pressure, humidity)
+
+    def read_into(self, buffer, offset=0):
+        """Read temperature in ℃, pressure in Pascals and humidity in %RH into
+        buffer[offset:offset + 3] (an array, NumPy row or memoryview) from a
+        single burst read without allocating containers.  Returns the number
+        of values written."""
+        data = self._data
+
+        self._wait_for_conversion()
+        self._device.readListInto(BME280_REGISTER_DATA, data)
+        self.BME280Data = data
+
+        buffer[offset]     = self._compensate_temperature(((data[3] << 16) | (data[4] << 8) | data[5]) >> 4)
+        buffer[offset + 1] = self._compensate_pressure(((data[0] << 16) | (data[1] << 8) | data[2]) >> 4)
+        buffer[offset + 2] = self._compensate_humidity((data[6] << 8) | data[7])
+
+        return 3
+
     def read_dewpoint(self):
-        """Return calculated dewpoint in ℃, only accurate at > 50% RH"""
+        """Return calculated dewpoint in ℃"""
         celsius = self.read_temperature()
         humidity = self.read_humidity()
-        dewpoint = celsius - ((100 - humidity) / 5)
 
-        return dewpoint
+        return psychrometrics.dew_point(celsius, humidity)
 
     def read_dewpoint_f(self):
-        """Return calculated dewpoint in ℉, only accurate at > 50% RH"""
+        """Return calculated dewpoint in ℉"""
 
         dewpoint_c = self.read_dewpoint()
         dewpoint_f = dewpoint_c * 1.8 + 32
@@ -325,9 +360,8 @@ if __name__ == '__main__':
     bme280 = BME280(address=0x76)
 
     while(True):
-        temp  = bme280.read_temperature()
-        pres  = bme280.read_pressure() / 1000
-        r_hum = bme280.read_humidity()
+        temp, pres, r_hum = bme280.read_all()
+        pres = pres / 1000
 
         print("{0:0.2f}℃ {1:0.2f}hPa {2:0.3f}%RH".format(temp, pres, r_hum))
 
@@ -29,6 +29,8 @@
 from smbus2 import SMBus, i2c_msg
 import time
 
+from i2c_views import message_view, transfer
+
 HM3301_DEFAULT_I2C_ADDR = 0x40
 HM3301_USE_I2C = 0x88
 HM3301_DATA_FRAME_SIZE = 29
@@ -37,6 +39,22 @@ class HM3301:
     class Error(Exception):
         pass
 
+    # Values written by read_into, in order
+    FIELDS = (
+        "PM_1_0_standard_particulate",
+        "PM_2_5_standard_particulate",
+        "PM_10_standard_particulate",
+        "PM_1_0_atmospheric_environment",
+        "PM_2_5_atmospheric_environment",
+        "PM_10_atmospheric_environment",
+        "particles_0_3",
+        "particles_0_5",
+        "particles_1_0",
+        "particles_2_5",
+        "particles_5_0",
+        "particles_10",
+    )
+
     def __init__(self, bus=1):
         self.sensor_number = 0
 
@@ -59,10 +77,18 @@ class HM3301:
         self.particles_5_0 = 0
         self.particles_10  = 0
 
-        self.bus = SMBus(bus)
+        # Accept a bus number or an smbus compatible bus object
+        if isinstance(bus, int):
+            bus = SMBus(bus)
+        self.bus = bus
         use_i2c = i2c_msg.write(HM3301_DEFAULT_I2C_ADDR, [HM3301_USE_I2C])
         self.bus.i2c_rdwr(use_i2c)
 
+        # Preallocated frame message for read_into
+        self._frame = i2c_msg.read(HM3301_DEFAULT_I2C_ADDR, HM3301_DATA_FRAME_SIZE)
+        self._frame_data = message_view(self._frame)
+        self._read_frame = transfer(self.bus, self._frame)
+
     def atmospheric_environment(self):
         return [
             self.PM_1_0_atmospheric_environment,
@@ -77,7 +103,7 @@ class HM3301:
 
         data = list(msg)
 
-        if not hm3301.check_crc(data):
+        if not self.check_crc(data):
             raise self.Error("CRC check failed")
 
         self.sensor_number = data[2] << 8 | data[3]
@@ -97,6 +123,22 @@ class HM3301:
         self.particles_5_0 = data[24] << 8 | data[25]
         self.particles_10 =  data[26] << 8 | data[27]
 
+    def read_into(self, buffer, offset=0):
+        """Read the FIELDS into buffer[offset:offset + 12] (an array, NumPy
+        row or memoryview) without allocating.  Returns the number of values
+        written."""
+        data = self._frame_data
+
+        self._read_frame()
+
+        if not self.check_crc(data):
+            raise self.Error("CRC check failed")
+
+        for i in range(12):
+            buffer[offset + i] = data[4 + 2 * i] << 8 | data[5 + 2 * i]
+
+        return 12
+
     def check_crc(self,data):
         sum = 0
 
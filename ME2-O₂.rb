@@ -4,6 +4,9 @@ class ME2_O₂
   BASELINE = 20.8
   PREHEAT_TIME = 60
 
+  # EWMA weight with the same lag as a 10 sample average
+  SMOOTHING = 2.0 / (10 + 1)
+
   attr_reader :calibration
 
   def initialize bus, pin, preheat: false
@@ -20,25 +23,19 @@ class ME2_O₂
   def calibrate
     total = 100.times.map do
       sleep 0.1
-      @pi.analog_read @pin
-    rescue Errno::EREMOTEIO
-      retry
+      @pi.analog_read_retrying @pin
     end.sum
 
     @calibration = total / 100.0 / BASELINE
   end
 
+  # Takes one sample, smoothed with the previous ones
   def read
-    total = 10.times.map do
-      sleep 0.1
-      @pi.analog_read @pin
-    rescue Errno::EREMOTEIO
-      retry
-    end.sum
+    value = @pi.analog_read_retrying @pin
 
-    average = total / 10.0
+    @average = @average ? @average + SMOOTHING * (value - @average) : value.to_f
 
-    average / @calibration
+    @average / @calibration
   end
 end
 
@@ -0,0 +1,97 @@
+import errno
+import time
+
+from grove_pi import GrovePi
+from resilience import RetryPolicy
+from running_stats import MovingAverage, sample_until_converged
+
+def _nack(error):
+    return isinstance(error, OSError) and error.errno == errno.EREMOTEIO
+
+class ME2_O2():
+    class Error(Exception):
+        pass
+
+    # O₂ percentage of clean air
+    BASELINE = 20.8
+    PREHEAT_TIME = 60
+
+    # Values written by read_into, in order
+    FIELDS = ("O2",)
+
+    RETRIES = 5
+
+    def __init__(self, bus, pin, preheat=False, window=10):
+        self._pin = pin
+
+        self._pi = GrovePi(bus)
+        self._pi.pin_mode(self._pin, GrovePi.INPUT)
+
+        # Retry the GrovePi's NACKs with jittered backoff rather than at
+        # once, each sensor counting its own retries
+        self.retry = RetryPolicy(attempts=self.RETRIES, retryable=_nack)
+
+        self._average = MovingAverage(window)
+
+        if preheat:
+            time.sleep(self.PREHEAT_TIME)
+
+        self.calibrate()
+
+    def calibrate(self,
+                  max_samples=100,
+                  min_samples=10,
+                  tolerance=0.002,
+                  interval=0.1):
+        """Calibrate against clean air.  Sampling stops as soon as the mean
+        analog reading is known to within tolerance."""
+        stats = sample_until_converged(self._analog_read,
+                                       max_samples=max_samples,
+                                       min_samples=min_samples,
+                                       tolerance=tolerance,
+                                       interval=interval)
+
+        self.calibration = stats.mean / self.BASELINE
+
+        return self.calibration
+
+    def read(self):
+        """Take one sample and return the O₂ percentage from the moving
+        average of readings"""
+        average = self._average.add(self._analog_read())
+
+        return average / self.calibration
+
+    def read_into(self, buffer, offset=0):
+        """Take one sample and write the O₂ percentage into buffer[offset].
+        Returns the number of values written."""
+        buffer[offset] = self.read()
+
+        return 1
+
+    def _analog_read(self):
+        try:
+            return self.retry.call(self._pi.analog_read, self._pin)
+        except OSError as e:
+            if e.errno != errno.EREMOTEIO:
+                raise
+
+            raise self.Error("No response from GrovePi after retrying") from e
+
+if __name__ == "__main__":
+    import sys
+    from smbus2 import SMBus
+
+    pin = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+
+    with SMBus(1) as bus:
+        sensor = ME2_O2(bus, pin)
+
+        print("calibration: {0}".format(sensor.calibration))
+
+        while(True):
+            oxygen = sensor.read()
+
+            print("O₂ {0:0.2f}%".format(oxygen))
+
+            time.sleep(1)
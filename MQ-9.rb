@@ -36,10 +36,7 @@ class MQ_9
   def R0 baseline: 10.8 # CO baseline at 1000ppm per datasheet
     total = 100.times.map do
       sleep 0.1
-      sensor.read samples: 1
-      @pi.analog_read @pin
-    rescue Errno::EREMOTEIO
-      retry
+      @pi.analog_read_retrying @pin
     end.sum
 
     average = total / 100.0
@@ -48,7 +45,7 @@ class MQ_9
 
     rs_air = (5 - volts) / volts
 
-    rs_air / 10.8
+    rs_air / baseline
   end
 
   def Rs_gas samples: 10
@@ -62,9 +59,7 @@ class MQ_9
   def read samples: 10
     total = samples.times.map do
       sleep 0.1 if samples > 1
-      @pi.analog_read @pin
-    rescue Errno::EREMOTEIO
-      retry
+      @pi.analog_read_retrying @pin
     end.sum
 
     total / samples.to_f
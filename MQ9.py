@@ -0,0 +1,128 @@
+import errno
+import math
+
+from grove_pi import GrovePi
+from resilience import RetryPolicy
+from running_stats import MovingAverage, sample_until_converged
+
+# WebPlotDigitizer and plot.ly say the CO roughly fits the equation:
+#
+#   Rs/Ro =
+#     0.7270731131275204 +
+#     1.697568399285764 **
+#     (-0.003147756584258994 * CO ppm)
+
+def _nack(error):
+    return isinstance(error, OSError) and error.errno == errno.EREMOTEIO
+
+class MQ9():
+    class Error(Exception):
+        pass
+
+    # CO baseline at 1000ppm per datasheet
+    BASELINE = 10.8
+
+    CO_MIN = 200
+    CO_MAX = 2000
+
+    # Values written by read_into, in order
+    FIELDS = ("CO",)
+
+    RETRIES = 5
+
+    def __init__(self, bus, pin, r0=None, window=10):
+        self._pin = pin
+        self.r0 = r0
+
+        self._pi = GrovePi(bus)
+        self._pi.pin_mode(self._pin, GrovePi.INPUT)
+
+        # Retry the GrovePi's NACKs with jittered backoff rather than at
+        # once, each sensor counting its own retries
+        self.retry = RetryPolicy(attempts=self.RETRIES, retryable=_nack)
+
+        self._average = MovingAverage(window)
+
+    def calibrate(self,
+                  baseline=BASELINE,
+                  max_samples=100,
+                  min_samples=10,
+                  tolerance=0.005,
+                  interval=0.1):
+        """Calculate R0 in clean air.  Sampling stops as soon as the mean
+        analog reading is known to within tolerance."""
+        stats = sample_until_converged(self._analog_read,
+                                       max_samples=max_samples,
+                                       min_samples=min_samples,
+                                       tolerance=tolerance,
+                                       interval=interval)
+
+        self.r0 = self._resistance(stats.mean) / baseline
+
+        return self.r0
+
+    def concentration_CO(self):
+        """CO concentration in ppm from the moving average of readings"""
+        if self.r0 is None:
+            raise self.Error("Sensor is not calibrated")
+
+        ratio = self.Rs_gas() / self.r0
+
+        if ratio <= 0.727:
+            return self.CO_MAX
+
+        concentration = -600.318 * math.log10(ratio - 0.727)
+
+        if concentration < self.CO_MIN:
+            return 0
+        if concentration > self.CO_MAX:
+            return self.CO_MAX
+
+        return concentration
+
+    def read_into(self, buffer, offset=0):
+        """Take one sample and write the CO concentration in ppm into
+        buffer[offset].  Returns the number of values written."""
+        buffer[offset] = self.concentration_CO()
+
+        return 1
+
+    def Rs_gas(self):
+        return self._resistance(self.read())
+
+    def read(self):
+        """Take one sample and return the moving average of analog readings"""
+        return self._average.add(self._analog_read())
+
+    def _analog_read(self):
+        try:
+            return self.retry.call(self._pi.analog_read, self._pin)
+        except OSError as e:
+            if e.errno != errno.EREMOTEIO:
+                raise
+
+            raise self.Error("No response from GrovePi after retrying") from e
+
+    def _resistance(self, value):
+        volts = value / 1024 * 5
+
+        if volts <= 0:
+            return math.inf
+
+        return (5 - volts) / volts
+
+if __name__ == "__main__":
+    import sys
+    import time
+    from smbus2 import SMBus
+
+    pin = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+
+    with SMBus(1) as bus:
+        # R0 calibrated for my sensor
+        sensor = MQ9(bus, pin, r0=0.7067229934368695)
+
+        while(True):
+            print("concentration CO: {0:4.0f}ppm".format(sensor.concentration_CO()))
+
+            time.sleep(1)
@@ -24,13 +24,14 @@
 
 import smbus2
 from smbus2 import SMBus, i2c_msg
-from collections import namedtuple
+from collections import deque, namedtuple
 from functools import partial
-from time import sleep, asctime, time
-import json
-from copy import copy
+from time import sleep, asctime, time, monotonic, time_ns
 import os.path
 
+import psychrometrics
+from i2c_views import message_view, transfer
+
 DEVICE_BUS = 1
 BASELINE_FILENAME = os.path.expanduser("~/.sgp30_config_data.txt")
 
@@ -75,13 +76,41 @@ class _cmds():
 
         return cls.SGP30Cmd(send, cmd.replylen, cmd.waittime)
 
+SGP30RawSample = namedtuple("SGP30RawSample", ["timestamp", "h2", "ethanol"])
+
 class SGP30():
+    class Error(Exception):
+        pass
+
+    # Values written by read_into, in order
+    FIELDS = ("eCO2", "tVOC")
+
     def __init__(self,
                  bus,
-                 device_address=0x58):
+                 device_address=0x58,
+                 humidity_refresh=60.0):
         self._bus = bus
         self._device_addr = device_address
 
+        # Feature set and serial never change so they are only read once
+        self._features = None
+        self._serial = None
+
+        # Last humidity compensation value sent and when, the SGP30 only
+        # accepts 1/256 g/m³ steps so unchanged values are not resent until
+        # humidity_refresh seconds pass.
+        self._humidity = None
+        self._humidity_written_at = None
+        self._humidity_refresh = humidity_refresh
+
+        # Preallocated MEASURE_IAQ messages for read_into
+        self._iaq_write = i2c_msg.write(self._device_addr, _cmds.MEASURE_IAQ.commands)
+        self._iaq_read = i2c_msg.read(self._device_addr, _cmds.MEASURE_IAQ.replylen)
+        self._iaq_data = message_view(self._iaq_read)
+        self._iaq_command = transfer(self._bus, self._iaq_write)
+        self._iaq_reply = transfer(self._bus, self._iaq_read)
+        self._iaq_wait = _cmds.MEASURE_IAQ.waittime / 1000.0
+
         self.iaq_init()
 
         if self.read_features() >= 0x22:
@@ -91,8 +120,13 @@ class SGP30():
     def iaq_init(self):
         self._read_write(_cmds.IAQ_INIT)
 
+        self._humidity = None
+
     def read_features(self):
-        return self._read_write(_cmds.GET_FEATURE_SET)[0]
+        if self._features is None:
+            self._features = self._read_write(_cmds.GET_FEATURE_SET)[0]
+
+        return self._features
 
     def read_iaq_baseline(self):
         return self._read_write(_cmds.GET_IAQ_BASELINE)
@@ -103,15 +137,54 @@ class SGP30():
     def read_measurements(self):
         return self._read_write(_cmds.MEASURE_IAQ)
 
+    def read_into(self, buffer, offset=0):
+        """Measure eCO₂ and tVOC into buffer[offset:offset + 2] (an array,
+        NumPy row or memoryview) without allocating.  Returns the number of
+        values written."""
+        data = self._iaq_data
+
+        self._iaq_command()
+        sleep(self._iaq_wait)
+        self._iaq_reply()
+
+        if _crc8(data[0], data[1]) != data[2] or _crc8(data[3], data[4]) != data[5]:
+            raise self.Error("CRC check failed")
+
+        buffer[offset]     = data[0] << 8 | data[1]
+        buffer[offset + 1] = data[3] << 8 | data[4]
+
+        return 2
+
+    def read_raw(self):
+        """Returns the raw H2 and ethanol signals"""
+        return self._read_write(_cmds.MEASURE_RAW)
+
     def read_serial(self):
-        return self._read_write(_cmds.GET_SERIAL_ID)
+        if self._serial is None:
+            self._serial = self._read_write(_cmds.GET_SERIAL_ID)
+
+        return list(self._serial)
+
+    def write_absolute_humidity(self, absolute_humidity, force=False):
+        """Set humidity compensation in g/m³.  The value is only sent when it
+        differs from the last one at the sensor's resolution or the refresh
+        interval has passed.  Returns True if the sensor was written."""
+        a_hum = psychrometrics.sgp30_humidity(absolute_humidity)
+        now = monotonic()
 
-    def write_absolute_humidity(self, absolute_humidity):
-        a_hum = [int(absolute_humidity * 256)]
-        a_hum_with_crc = self._generate_crc(a_hum)
+        if not force and a_hum == self._humidity and \
+           now - self._humidity_written_at < self._humidity_refresh:
+            return False
+
+        a_hum_with_crc = self._generate_crc([a_hum])
 
         self._read_write(_cmds.new_SET_ABSOLUTE_HUMIDITY(a_hum_with_crc))
 
+        self._humidity = a_hum
+        self._humidity_written_at = now
+
+        return True
+
     def write_iaq_baseline(self, baseline):
         baseline_with_crc = self._generate_crc(baseline)
 
@@ -136,23 +209,42 @@ class SGP30():
         return data_with_crc
 
     def _read_write(self, cmd):
+        self._write_command(cmd)
+
+        if cmd.replylen > 0:
+            sleep(cmd.waittime/1000.0)
+
+            return self._read_reply(cmd)
+
+    async def _read_write_async(self, cmd):
+        """_read_write that awaits the command's conversion time instead of
+        blocking"""
+        import asyncio
+
+        self._write_command(cmd)
+
+        if cmd.replylen > 0:
+            await asyncio.sleep(cmd.waittime/1000.0)
+
+            return self._read_reply(cmd)
+
+    def _write_command(self, cmd):
         write = i2c_msg.write(self._device_addr, cmd.commands)
+        self._bus.i2c_rdwr(write)
 
-        if cmd.replylen <= 0 :
-           self._bus.i2c_rdwr(write)
-        else:
-            read = i2c_msg.read(self._device_addr, cmd.replylen)
-            self._bus.i2c_rdwr(write) 
+    def _read_reply(self, cmd):
+        read = i2c_msg.read(self._device_addr, cmd.replylen)
+        self._bus.i2c_rdwr(read)
+        r = list(read)
 
-            sleep(cmd.waittime/1000.0)
+        crc_ok, a = self._validate_crc(r)
 
-            self._bus.i2c_rdwr(read)
-            r = list(read)
+        if not crc_ok:
+            raise self.Error("CRC check failed")
 
-            crc_ok, a = self._validate_crc(r)
-            answer = [i<<8 | j for i, j in a]
+        answer = [i<<8 | j for i, j in a]
 
-            return answer
+        return answer
 
     def _validate_crc(s, r):
         a = list(zip(r[0::3], r[1::3]))
@@ -160,6 +252,93 @@ class SGP30():
 
         return crc, a
 
+class SGP30RawStream():
+    """Streams MEASURE_RAW readings back-to-back, as fast as the 25 ms
+    conversion allows, while still issuing the MEASURE_IAQ every iaq_interval
+    seconds that the SGP30 baseline algorithm requires.  The most recent
+    buffer_size samples are kept in samples, the most recent eCO₂ and tVOC
+    in measurements."""
+
+    def __init__(self, sgp30, buffer_size=1024, iaq_interval=1.0):
+        self._sgp30 = sgp30
+        self._iaq_interval = iaq_interval
+        self._next_iaq = None
+
+        self.samples = deque(maxlen=buffer_size)
+        self.measurements = None
+
+    def _iaq_due(self):
+        now = monotonic()
+
+        if self._next_iaq is not None and now < self._next_iaq:
+            return False
+
+        # Stay on the 1 Hz grid unless we fell more than a period behind
+        if self._next_iaq is None or now - self._next_iaq >= self._iaq_interval:
+            self._next_iaq = now + self._iaq_interval
+        else:
+            self._next_iaq += self._iaq_interval
+
+        return True
+
+    def _record(self, raw):
+        sample = SGP30RawSample(time_ns(), *raw)
+        self.samples.append(sample)
+
+        return sample
+
+    def poll(self):
+        """Perform the next measurement.  Returns the raw sample, or None if
+        the MEASURE_IAQ was due instead."""
+        if self._iaq_due():
+            self.measurements = self._sgp30.read_measurements()
+            return None
+
+        return self._record(self._sgp30.read_raw())
+
+    async def poll_async(self):
+        if self._iaq_due():
+            self.measurements = await self._sgp30._read_write_async(_cmds.MEASURE_IAQ)
+            return None
+
+        return self._record(await self._sgp30._read_write_async(_cmds.MEASURE_RAW))
+
+    def __iter__(self):
+        while True:
+            sample = self.poll()
+
+            if sample is not None:
+                yield sample
+
+    async def __aiter__(self):
+        while True:
+            sample = await self.poll_async()
+
+            if sample is not None:
+                yield sample
+
+def _crc8_table():
+    table = []
+
+    for byte in range(256):
+        crc = byte
+
+        for bit in range(0, 8):
+            if crc & 0x80:
+                crc = ( crc << 1 ) ^ 0x31
+            else:
+                crc = ( crc << 1 )
+
+        table.append(crc & 0xFF)
+
+    return tuple(table)
+
+_CRC8_TABLE = _crc8_table()
+
+def _crc8(msb, lsb):
+    """Crc8().hash([msb, lsb]) by table lookup"""
+    return _CRC8_TABLE[_CRC8_TABLE[0xFF ^ msb] ^ lsb]
+
 class Crc8:
     def __init__(s):
         s.crc = 255
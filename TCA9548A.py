@@ -0,0 +1,142 @@
+import errno
+
+from smbus2 import SMBus
+
+TCA9548A_DEFAULT_I2C_ADDR = 0x70
+TCA9548A_CHANNELS = 8
+
+class TCA9548A():
+    """TCA9548A 8 channel I2C multiplexer.
+
+    channel() returns an smbus compatible bus for one downstream channel so
+    drivers with fixed addresses can share a bus:
+
+        mux = TCA9548A(SMBus(1))
+        sgp30 = SGP30(mux.channel(0))
+        bme280 = BME280(address=0x76, busnum=1,
+                        i2c_interface=lambda busnum: mux.channel(1))
+
+    The currently selected channel is remembered so consecutive transactions
+    on the same channel do not rewrite the control register."""
+
+    class Error(Exception):
+        pass
+
+    def __init__(self, bus, address=TCA9548A_DEFAULT_I2C_ADDR):
+        self._bus = bus
+        self._address = address
+        self._channels = {}
+
+        # None when the control register contents are unknown
+        self.selected = None
+        self.selects = 0
+
+    def channel(self, channel):
+        if channel < 0 or channel >= TCA9548A_CHANNELS:
+            raise self.Error("Invalid channel {0}, must be between 0 and {1}".format(channel, TCA9548A_CHANNELS - 1))
+
+        if channel not in self._channels:
+            self._channels[channel] = TCA9548AChannel(self, channel)
+
+        return self._channels[channel]
+
+    def select(self, channel):
+        """Route the bus to channel, skipping the write when it already is"""
+        if channel == self.selected:
+            return
+
+        self.selected = None
+        self._bus.write_byte(self._address, 1 << channel)
+        self.selected = channel
+        self.selects += 1
+
+    def disable(self):
+        """Disconnect all downstream channels"""
+        self.selected = None
+        self._bus.write_byte(self._address, 0)
+
+    def invalidate(self):
+        """Forget the selected channel, for example after a bus reset"""
+        self.selected = None
+
+    def run_grouped(self, reads):
+        """Run (channel_bus, function) pairs grouped by channel, starting with
+        the selected channel, so each channel is selected at most once per
+        call.  Order within a channel is kept.  Returns the function results
+        in the order given."""
+        reads = list(reads)
+        selected = self.selected
+
+        def channel_order(index):
+            channel = reads[index][0].channel
+            return (channel != selected, channel, index)
+
+        results = [None] * len(reads)
+
+        for index in sorted(range(len(reads)), key=channel_order):
+            _, function = reads[index]
+            results[index] = function()
+
+        return results
+
+class TCA9548AChannel():
+    """One downstream channel of a TCA9548A.  Any method of the upstream bus
+    (i2c_rdwr, read_i2c_block_data, write_byte_data, ...) may be called and
+    selects the channel first."""
+
+    def __init__(self, mux, channel):
+        self._mux = mux
+        self.channel = channel
+
+    def __getattr__(self, name):
+        method = getattr(self._mux._bus, name)
+
+        if not callable(method):
+            return method
+
+        mux = self._mux
+        channel = self.channel
+
+        def on_channel(*args, **kwargs):
+            mux.select(channel)
+
+            try:
+                return method(*args, **kwargs)
+            except OSError as e:
+                # A NACK comes from the downstream device, anything else may
+                # have left the mux in an unknown state
+                if e.errno != errno.EREMOTEIO:
+                    mux.invalidate()
+                raise
+
+        setattr(self, name, on_channel)
+
+        return on_channel
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+if __name__ == "__main__":
+    with SMBus(1) as bus:
+        mux = TCA9548A(bus)
+
+        for channel in range(TCA9548A_CHANNELS):
+            found = []
+
+            for address in range(0x03, 0x78):
+                if address == mux._address:
+                    continue
+
+                try:
+                    mux.channel(channel).read_byte(address)
+                    found.append("0x{0:02x}".format(address))
+                except OSError:
+                    pass
+
+            print("channel {0}: {1}".format(channel, " ".join(found)))
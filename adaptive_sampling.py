@@ -0,0 +1,208 @@
+"""Sample sensors faster while their readings change and slower while quiet.
+
+Each field of a sensor has an AdaptiveChannel that tracks the rate of change
+and the (exponentially weighted) standard deviation of its value.  When
+either exceeds its threshold the channel drops to the sensor's minimum
+interval, otherwise the interval backs off exponentially toward the maximum.
+A sensor is read at the shortest interval any of its fields asks for.
+
+    scheduler = AdaptiveScheduler()
+    scheduler.add("bme280", lambda: bme280.read_all()._asdict(),
+                  {"temperature": 0.05, "pressure": 5.0, "humidity": 0.2},
+                  chip="bme280")
+    scheduler.add("gas", lambda: {"value": adc.read_result()[0]},
+                  {"value": 20}, chip="adc121c021")
+    scheduler.run(print)
+
+Thresholds are rates of change per second.  Interval limits default to
+LIMITS for the sensor's chip, given as chip or taken from the driver class
+when read is a bound method of it.  SGP30 is always read at the 1 Hz its
+baseline algorithm requires, whatever the sensor is named.  A read that
+raises is counted in errors() and retried after a backed off interval."""
+
+import heapq
+import math
+import time
+from collections import namedtuple
+
+SensorLimits = namedtuple("SensorLimits", ["min_interval", "max_interval"])
+
+# Fastest useful interval and slowest allowed interval in seconds
+LIMITS = {
+    "bme280":     SensorLimits(0.1, 60.0),
+    "sgp30":      SensorLimits(1.0, 1.0),
+    "hm3301":     SensorLimits(1.0, 60.0),
+    "adc121c021": SensorLimits(0.01, 60.0),
+}
+
+DEFAULT_LIMITS = SensorLimits(1.0, 60.0)
+
+class AdaptiveChannel():
+    def __init__(self,
+                 min_interval,
+                 max_interval,
+                 rate_threshold,
+                 stddev_threshold=None,
+                 backoff=2.0,
+                 alpha=0.3):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.rate_threshold = rate_threshold
+        self.stddev_threshold = stddev_threshold
+        self.backoff = backoff
+        self.alpha = alpha
+
+        self.interval = min_interval
+
+        self._timestamp = None
+        self._value = None
+        self._mean = None
+        self._variance = 0.0
+
+    def update(self, timestamp, value):
+        """Add a value read at timestamp (seconds) and return the interval
+        until this channel wants the next one"""
+        active = False
+
+        if self._timestamp is not None and timestamp > self._timestamp:
+            rate = abs(value - self._value) / (timestamp - self._timestamp)
+            active = rate > self.rate_threshold
+
+        if self._mean is None:
+            self._mean = value
+        else:
+            delta = value - self._mean
+            self._mean += self.alpha * delta
+            self._variance = (1 - self.alpha) * (self._variance + self.alpha * delta * delta)
+
+        if self.stddev_threshold is not None and \
+           math.sqrt(self._variance) > self.stddev_threshold:
+            active = True
+
+        self._timestamp = timestamp
+        self._value = value
+
+        if active:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+
+        return self.interval
+
+def _chip(read):
+    """LIMITS key of the driver read is a bound method of, or None"""
+    driver = getattr(read, "__self__", None)
+
+    if driver is None:
+        return None
+
+    return type(driver).__name__.lower()
+
+class _Sensor():
+    def __init__(self, name, read, channels, limits, backoff):
+        self.name = name
+        self.read = read
+        self.channels = channels
+        self.limits = limits
+        self.backoff = backoff
+        self.interval = limits.min_interval
+        self.samples = 0
+        self.errors = 0
+        self.last_error = None
+
+class AdaptiveScheduler():
+    """Reads sensors when their adaptive interval is due, see the module
+    documentation"""
+
+    def __init__(self, clock=time.monotonic, sleep=time.sleep):
+        self._clock = clock
+        self._sleep = sleep
+        self._sensors = {}
+        self._queue = []
+
+    def add(self, name, read, thresholds, limits=None, stddev_thresholds=None, backoff=2.0,
+            chip=None):
+        """Read read() (a dict of field values) at an adaptive rate.
+        thresholds maps fields to their rate of change threshold, fields
+        without one are passed through without affecting the rate."""
+        if limits is None:
+            limits = LIMITS.get(chip or _chip(read), DEFAULT_LIMITS)
+        limits = SensorLimits(*limits)
+
+        stddev_thresholds = stddev_thresholds or {}
+
+        channels = {
+            field: AdaptiveChannel(limits.min_interval, limits.max_interval, threshold,
+                                   stddev_thresholds.get(field), backoff)
+            for field, threshold in thresholds.items()
+        }
+
+        self._sensors[name] = _Sensor(name, read, channels, limits, backoff)
+
+        heapq.heappush(self._queue, (self._clock(), name))
+
+    def interval(self, name):
+        return self._sensors[name].interval
+
+    def samples(self, name):
+        return self._sensors[name].samples
+
+    def errors(self, name):
+        return self._sensors[name].errors
+
+    def next_due(self):
+        """Clock time the next sensor is due, or None without sensors"""
+        if not self._queue:
+            return None
+
+        return self._queue[0][0]
+
+    def run_pending(self):
+        """Read every sensor that is due.  Returns (name, timestamp, values)
+        for each reading taken."""
+        readings = []
+        now = self._clock()
+
+        while self._queue and self._queue[0][0] <= now:
+            due, name = heapq.heappop(self._queue)
+            sensor = self._sensors[name]
+
+            timestamp = self._clock()
+
+            try:
+                values = sensor.read()
+            except Exception as e:
+                # Keep the sensor scheduled, backing off while it fails
+                sensor.errors += 1
+                sensor.last_error = e
+                sensor.interval = min(sensor.interval * sensor.backoff, sensor.limits.max_interval)
+                heapq.heappush(self._queue, (max(due + sensor.interval, now), name))
+                continue
+
+            sensor.samples += 1
+
+            interval = sensor.limits.max_interval
+            for field, channel in sensor.channels.items():
+                if field in values:
+                    interval = min(interval, channel.update(timestamp, values[field]))
+            sensor.interval = interval
+
+            # Schedule from the due time so intervals don't drift, unless
+            # we have fallen behind
+            heapq.heappush(self._queue, (max(due + interval, now), name))
+
+            readings.append((name, timestamp, values))
+
+        return readings
+
+    def run(self, callback):
+        """Read sensors forever, calling callback(name, timestamp, values)
+        for each reading"""
+        while True:
+            for reading in self.run_pending():
+                callback(*reading)
+
+            delay = self.next_due() - self._clock()
+
+            if delay > 0:
+                self._sleep(delay)
@@ -0,0 +1,525 @@
+"""Read the sensors listed in a TOML configuration file.
+
+    python air_quality.py --config air_quality.toml read      # one reading
+    python air_quality.py --config air_quality.toml run       # every interval
+
+or air-quality --config air_quality.toml read, and so on, once installed
+with pip.
+
+The configuration lists the sensors, the buses they are on and where
+readings go:
+
+    interval = 1.0
+
+    [[sensors]]
+    chip = "bme280"
+    bus = 1
+    address = 0x76
+
+    [[sensors]]
+    chip = "sgp30"
+    bus = 1
+
+    [[outputs]]
+    type = "print"
+
+    [[outputs]]
+    type = "jsonl"
+    path = "/var/lib/air_quality/readings.jsonl"
+    batch_size = 60         # optional, samples per write, default 1
+    batch_interval = 60.0   # optional, most seconds a sample waits, default 1.0
+    queue = 3600            # optional, samples queued, default 1024
+    policy = "drop-oldest"  # optional, or "drop-newest" or "block"
+
+    [[outputs]]
+    type = "influx"         # InfluxDB line protocol, or "csv"
+    path = "/var/lib/air_quality/readings.lp"
+    measurement = "air_quality"
+    tags = { host = "pi-zero" }
+
+    [[filters]]             # optional smoothing, see filters.py
+    sensor = "sgp30"
+    field = "tVOC"
+    type = "ewma"           # alpha or time_constant in seconds; or
+    alpha = 0.2             # "median" with window; or "kalman" with
+                            # process_variance and measurement_variance
+
+    [[deadband]]            # optional report by exception, see deadband.py
+    sensor = "bme280"
+    field = "pressure"
+    absolute = 10.0         # absolute and/or relative width
+    relative = 0.001
+    heartbeat = 300         # optional, seconds between reports of a quiet field
+
+    [resilience]            # optional, these are the defaults
+    attempts = 3
+    retry_budget = 0.25
+    failure_threshold = 5
+    reset_timeout = 5.0
+    reopen_bus = false
+
+Sensors take an optional name (default the chip) and address (default the
+chip's first address in discovery.CHIPS).  Each driver is wrapped in a
+resilience.ResilientDevice configured by [resilience], so a failing sensor
+is retried briefly and then skipped until it recovers.  Outputs are
+pipeline sinks, written from their own threads so a slow disk doesn't delay
+sampling.  A csv output has a column for each field of each sensor unless
+it lists "name.field" columns.  Only the driver modules of the configured
+chips are imported, and only when they are created, so one-shot reads from
+cron and service restarts start quickly.  Measure that with:
+
+    python air_quality.py --config air_quality.toml importtime --budget-ms 50
+
+which runs the imports of a read under python -X importtime and fails when
+they take longer than the budget."""
+
+import sys
+
+DEFAULT_CONFIG = "air_quality.toml"
+
+# Parsed configurations are cached in $XDG_CACHE_HOME/air_quality, a file
+# per configuration path
+CONFIG_CACHE_DIRECTORY = "air_quality"
+
+# chip: driver module, for importtime without opening buses
+DRIVER_MODULES = {
+    "bme280":     "BME280",
+    "sgp30":      "SGP30",
+    "hm3301":     "HM3301",
+    "adc121c021": "ADC1201C021",
+}
+
+class ConfigError(Exception):
+    pass
+
+def _parse(path):
+    try:
+        import tomllib
+    except ImportError:
+        import tomli as tomllib
+
+    try:
+        with open(path, "rb") as io:
+            return tomllib.load(io)
+    except tomllib.TOMLDecodeError as e:
+        raise ConfigError("Unable to read {0}: {1}".format(path, e))
+
+def _cache_filename(path, directory=None):
+    """Cache file of the configuration at path, named after its absolute
+    path so every configuration has its own"""
+    import os
+
+    if directory is None:
+        cache = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+        directory = os.path.join(cache, CONFIG_CACHE_DIRECTORY)
+
+    name = os.path.abspath(path).replace("%", "%25").replace(os.sep, "%2F")
+
+    return os.path.join(directory, name + ".marshal")
+
+def _cached_parse(path, cache_directory=None):
+    """Parsed configuration from the marshal cache when the file is
+    unchanged.  Importing tomllib costs more than the rest of a read's
+    imports, marshal is built in."""
+    import marshal
+    import os
+
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        raise ConfigError("Unable to read {0}: {1}".format(path, e))
+
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    cache_filename = _cache_filename(path, cache_directory)
+
+    try:
+        with open(cache_filename, "rb") as io:
+            cached_key, config = marshal.load(io)
+
+        if tuple(cached_key) == key:
+            return config
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    config = _parse(path)
+
+    # Written to a temporary file and renamed, so a concurrent read sees the
+    # old cache or the new one and never a partial file
+    temporary = "{0}.{1}.tmp".format(cache_filename, os.getpid())
+
+    try:
+        os.makedirs(os.path.dirname(cache_filename), exist_ok=True)
+
+        with open(temporary, "wb") as io:
+            marshal.dump((key, config), io)
+
+        os.replace(temporary, cache_filename)
+    except (OSError, ValueError):
+        # Unwritable, or the configuration holds TOML dates
+        try:
+            os.unlink(temporary)
+        except OSError:
+            pass
+
+    return config
+
+def load_config(path, cache=True):
+    """Read and check the configuration file at path"""
+    from pipeline import DROP_OLDEST, POLICIES
+
+    config = _cached_parse(path) if cache else _parse(path)
+
+    sensors = config.setdefault("sensors", [])
+    names = set()
+
+    for sensor in sensors:
+        chip = sensor.get("chip")
+
+        if chip not in DRIVER_MODULES:
+            raise ConfigError("Unknown chip {0!r}, expected one of {1}".format(
+                chip, ", ".join(sorted(DRIVER_MODULES))))
+
+        sensor.setdefault("name", chip)
+        sensor.setdefault("bus", 1)
+
+        if sensor["name"] in names:
+            raise ConfigError("Duplicate sensor name {0!r}".format(sensor["name"]))
+        names.add(sensor["name"])
+
+    outputs = config.setdefault("outputs", [{"type": "print"}])
+
+    for output in outputs:
+        if output.get("type") not in OUTPUTS:
+            raise ConfigError("Unknown output type {0!r}, expected one of {1}".format(
+                output.get("type"), ", ".join(sorted(OUTPUTS))))
+
+        if output.get("policy", DROP_OLDEST) not in POLICIES:
+            raise ConfigError("Unknown output policy {0!r}, expected one of {1}".format(
+                output["policy"], ", ".join(POLICIES)))
+
+    for smoothing in config.setdefault("filters", []):
+        if smoothing.get("sensor") not in names:
+            raise ConfigError("Unknown filter sensor {0!r}".format(smoothing.get("sensor")))
+
+        if smoothing.get("type") not in FILTERS:
+            raise ConfigError("Unknown filter type {0!r}, expected one of {1}".format(
+                smoothing.get("type"), ", ".join(sorted(FILTERS))))
+
+        if smoothing["type"] == "ewma" and ("alpha" in smoothing) == ("time_constant" in smoothing):
+            raise ConfigError("EWMA filter for {0}.{1} needs either alpha or time_constant".format(
+                smoothing["sensor"], smoothing.get("field")))
+
+    for deadband in config.setdefault("deadband", []):
+        if deadband.get("sensor") not in names:
+            raise ConfigError("Unknown deadband sensor {0!r}".format(deadband.get("sensor")))
+
+        if "absolute" not in deadband and "relative" not in deadband:
+            raise ConfigError("Deadband for {0}.{1} needs an absolute or relative width".format(
+                deadband["sensor"], deadband.get("field")))
+
+    config.setdefault("interval", 1.0)
+
+    return config
+
+def _print_output(output, devices):
+    import time
+
+    def write(samples):
+        lines = []
+
+        for timestamp, readings in samples:
+            line = [time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(timestamp / 1e9))]
+
+            for name, values in readings.items():
+                for field, value in values.items():
+                    line.append("{0}.{1}={2:g}".format(name, field, value))
+
+            lines.append(" ".join(line) + "\n")
+
+        sys.stdout.write("".join(lines))
+        sys.stdout.flush()
+
+    return write
+
+def _jsonl_output(output, devices):
+    from writers import JSONLinesWriter
+
+    return JSONLinesWriter(open(output["path"], "a"))
+
+def _csv_output(output, devices):
+    from writers import CSVWriter
+
+    columns = output.get("columns")
+    if columns is None:
+        columns = ["{0}.{1}".format(name, field)
+                   for name, driver in devices.items() for field in driver.FIELDS]
+
+    return CSVWriter(open(output["path"], "a", newline=""), columns)
+
+def _influx_output(output, devices):
+    from writers import InfluxWriter
+
+    return InfluxWriter(open(output["path"], "a"),
+                        output.get("measurement", "air_quality"),
+                        output.get("tags"))
+
+# output type: factory(output config, name: driver) returning write(samples),
+# a pipeline sink taking a list of pipeline.Samples
+OUTPUTS = {
+    "print":  _print_output,
+    "jsonl":  _jsonl_output,
+    "csv":    _csv_output,
+    "influx": _influx_output,
+}
+
+def create_drivers(config, open_bus=None):
+    """Open the configured buses and create the configured drivers.
+    Returns a dict of name to driver."""
+    import discovery
+
+    if open_bus is None:
+        from smbus2 import SMBus as open_bus
+
+    buses = {}
+    drivers = {}
+
+    for sensor in config["sensors"]:
+        busnum = sensor["bus"]
+
+        if busnum not in buses:
+            buses[busnum] = open_bus(busnum)
+
+        address = sensor.get("address", discovery.CHIPS[sensor["chip"]][0][0])
+        device = {"chip": sensor["chip"], "address": address}
+
+        driver = discovery.driver(buses[busnum], busnum, device)
+
+        drivers[sensor["name"]] = _resilient(config, sensor["name"], driver, buses[busnum], busnum)
+
+    return drivers
+
+def _resilient(config, name, driver, bus, busnum):
+    from resilience import CircuitBreaker, ResilientDevice, RetryPolicy, reopen_bus
+
+    options = config.get("resilience", {})
+
+    device = ResilientDevice(driver, name,
+                             breaker=CircuitBreaker(options.get("failure_threshold", 5),
+                                                    options.get("reset_timeout", 5.0)))
+
+    device.retry = RetryPolicy(options.get("attempts", 3),
+                               budget=options.get("retry_budget", 0.25),
+                               retryable=device.retryable)
+
+    if options.get("reopen_bus", False):
+        device.recover = reopen_bus(bus, busnum)
+
+    return device
+
+def _compensation(config):
+    """Hook writing the first BME280's absolute humidity to the first SGP30,
+    or None without both"""
+    chips = {}
+    for sensor in config["sensors"]:
+        chips.setdefault(sensor["chip"], sensor["name"])
+
+    if "bme280" not in chips or "sgp30" not in chips:
+        return None
+
+    from daemon import humidity_compensation
+
+    return humidity_compensation(chips["bme280"], chips["sgp30"])
+
+def _median_filter(options):
+    from filters import RunningMedian
+    return RunningMedian(options["window"])
+
+def _ewma_filter(options):
+    from filters import EWMA
+    return EWMA(options.get("alpha"), options.get("time_constant"))
+
+def _kalman_filter(options):
+    from filters import Kalman
+    return Kalman(options["process_variance"], options["measurement_variance"])
+
+# filter type: factory(filter config)
+FILTERS = {
+    "median": _median_filter,
+    "ewma":   _ewma_filter,
+    "kalman": _kalman_filter,
+}
+
+def create_daemon(config, open_bus=None):
+    """Daemon sampling the configured sensors"""
+    from daemon import Daemon
+
+    daemon = Daemon(create_drivers(config, open_bus), interval=config["interval"])
+
+    compensate = _compensation(config)
+    if compensate is not None:
+        daemon.hooks.append(compensate)
+
+    return daemon
+
+def create_pipeline(config, devices):
+    """Pipeline smoothing the configured fields and reporting the configured
+    deadband fields by exception into the configured outputs.  devices are
+    the daemon's, outputs use their FIELDS."""
+    from pipeline import DROP_OLDEST, Pipeline, SinkWorker, Smooth
+
+    transforms = []
+
+    if config["filters"]:
+        from filters import FilterStage
+
+        stages = {}
+        for smoothing in config["filters"]:
+            stage = stages.setdefault(smoothing["sensor"], FilterStage({}))
+            stage.filters[smoothing["field"]] = FILTERS[smoothing["type"]](smoothing)
+
+        transforms.append(Smooth(stages))
+
+    if config["deadband"]:
+        from deadband import Deadband, ReportByException
+        from pipeline import ReportChanges
+
+        deadbands = {}
+        for deadband in config["deadband"]:
+            fields = deadbands.setdefault(deadband["sensor"], {})
+            fields[deadband["field"]] = Deadband(deadband.get("absolute"),
+                                                 deadband.get("relative"),
+                                                 deadband.get("heartbeat"))
+
+        transforms.append(ReportChanges({sensor: ReportByException(fields)
+                                         for sensor, fields in deadbands.items()}))
+
+    sinks = [SinkWorker(OUTPUTS[output["type"]](output, devices),
+                        name=output["type"],
+                        maxsize=output.get("queue", 1024),
+                        batch_size=output.get("batch_size", 1),
+                        batch_interval=output.get("batch_interval", 1.0),
+                        policy=output.get("policy", DROP_OLDEST))
+             for output in config["outputs"]]
+
+    return Pipeline(transforms, sinks)
+
+def import_drivers(config):
+    """Import what a read of config imports, without opening buses"""
+    import discovery
+    import daemon
+    import pipeline
+    import resilience
+
+    for sensor in config["sensors"]:
+        __import__(DRIVER_MODULES[sensor["chip"]])
+
+    if _compensation(config) is not None:
+        import psychrometrics
+
+    if config["filters"]:
+        import filters
+
+    if config["deadband"]:
+        import deadband
+
+    if any(output["type"] != "print" for output in config["outputs"]):
+        import writers
+
+def _import_times(command):
+    """Total and per top level module import microseconds of running
+    command under -X importtime, leaving out interpreter startup imports"""
+    import os
+    import subprocess
+
+    directory = os.path.dirname(os.path.abspath(__file__))
+
+    def imports(code):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=directory,
+                                stderr=subprocess.PIPE, universal_newlines=True, check=True)
+        times = {}
+
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:"):
+                continue
+
+            _, cumulative, name = line[len("import time:"):].split("|")
+
+            # Nested imports are indented past the separating space
+            if not cumulative.strip().isdigit() or name[1:].startswith(" "):
+                continue
+
+            times[name.strip()] = int(cumulative)
+
+        return times
+
+    startup = imports("pass")
+    measured = imports(command)
+
+    top = {name: cumulative for name, cumulative in measured.items() if name not in startup}
+
+    return sum(top.values()), top
+
+def _read_imports(config_path):
+    """Command importing what a read of the configuration imports"""
+    import os
+
+    return "import air_quality; air_quality.import_drivers(air_quality.load_config({0!r}))".format(
+        os.path.abspath(config_path))
+
+def importtime(config_path, budget_ms=None):
+    total, top = _import_times(_read_imports(config_path))
+
+    for name, cumulative in sorted(top.items(), key=lambda item: -item[1]):
+        print("{0:>8.1f}ms {1}".format(cumulative / 1000, name))
+
+    print("{0:>8.1f}ms total".format(total / 1000))
+
+    if budget_ms is not None and total / 1000 > budget_ms:
+        print("Imports exceed the budget of {0}ms".format(budget_ms))
+        return 1
+
+    return 0
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--config", default=DEFAULT_CONFIG)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("read", help="take one reading and exit")
+
+    run = commands.add_parser("run", help="read every interval")
+    run.add_argument("--count", type=int, help="stop after this many readings")
+
+    imports = commands.add_parser("importtime", help="measure the imports of a read")
+    imports.add_argument("--budget-ms", type=float)
+
+    args = parser.parse_args(argv)
+
+    try:
+        config = load_config(args.config)
+    except ConfigError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    if args.command == "importtime":
+        return importtime(args.config, args.budget_ms)
+
+    daemon = create_daemon(config)
+    pipeline = create_pipeline(config, daemon.devices)
+    pipeline.attach(daemon)
+
+    with pipeline:
+        if args.command == "read":
+            daemon.sample()
+        else:
+            try:
+                daemon.run(args.count)
+            except KeyboardInterrupt:
+                pass
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
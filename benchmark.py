@@ -0,0 +1,241 @@
+"""Driver benchmarks against the in-process FakeBus.
+
+Each case reports per-sample wall time, bus transactions, bytes transferred
+and bytes allocated (the tracemalloc peak during one sample).  Results can
+be saved as a JSON baseline and later runs fail when a case exceeds its
+baseline wall time or allocations by more than --margin, or uses more
+transactions or bytes than recorded:
+
+    python benchmark.py --save
+    python benchmark.py            # exits 1 on a regression
+
+Fixed conversion waits in the drivers (SGP30's sleep) are skipped since the
+fake devices answer immediately.
+
+Wall time and allocations include FakeBus's emulation of the transfers, its
+i2c_rdwr in particular is slower than its SMBus block reads and allocates
+the bytes it copies.  The read_into cases allocate nothing in the drivers
+themselves, on an smbus2 SMBus their transfers go through
+Adafruit_GPIO.I2C.transfer's prebuilt ioctl arguments."""
+
+import json
+import sys
+import time
+import tracemalloc
+from unittest import mock
+
+from fake_bus import FakeBus
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+
+def _no_sleep(seconds):
+    # A plain function, a MagicMock would record every call
+    pass
+
+def _bme280_driver(bus):
+    from BME280 import BME280
+
+    return BME280(address=0x76, busnum=1, i2c_interface=lambda busnum: bus)
+
+def _sgp30_driver(bus):
+    from SGP30 import SGP30
+
+    return SGP30(bus)
+
+def _hm3301_driver(bus):
+    from HM3301 import HM3301
+
+    return HM3301(bus)
+
+def _adc121c021_driver(bus):
+    from ADC1201C021 import ADC121C021
+
+    return ADC121C021(bus)
+
+def _method(factory, name):
+    """Case calling driver.name()"""
+    return lambda bus: getattr(factory(bus), name)
+
+def _read_into(factory):
+    """Case sampling driver.read_into into a reused array"""
+    def case(bus):
+        from array import array
+
+        driver = factory(bus)
+        buffer = array("d", [0.0] * len(driver.FIELDS))
+
+        return lambda: driver.read_into(buffer)
+
+    return case
+
+def _writer(name):
+    """Case writing a BME280 and SGP30 reading with writers.name, to
+    /dev/null with the default flush thresholds"""
+    def case(bus):
+        import os
+        import writers
+
+        readings = {
+            "bme280": {"temperature": 21.345678, "pressure": 100653.25, "humidity": 48.123456},
+            "sgp30":  {"eCO2": 412.0, "tVOC": 17.0},
+        }
+
+        io = open(os.devnull, "w")
+        if name == "CSVWriter":
+            writer = writers.CSVWriter(io, ["{0}.{1}".format(source, field)
+                                            for source, values in readings.items()
+                                            for field in values])
+        else:
+            writer = getattr(writers, name)(io)
+        timestamp = [time.time_ns()]
+
+        def sample():
+            timestamp[0] += 1000000000
+            writer.write(timestamp[0], readings)
+
+        return sample
+
+    return case
+
+def _crc8(bus):
+    from SGP30 import Crc8
+
+    return lambda: Crc8().hash([0xBE, 0xEF])
+
+CASES = {
+    "bme280.read_all":           _method(_bme280_driver, "read_all"),
+    "sgp30.read_measurements":   _method(_sgp30_driver, "read_measurements"),
+    "sgp30.crc8":                _crc8,
+    "hm3301.read_data":          _method(_hm3301_driver, "read_data"),
+    "adc121c021.read_result":    _method(_adc121c021_driver, "read_result"),
+    "bme280.read_into":          _read_into(_bme280_driver),
+    "sgp30.read_into":           _read_into(_sgp30_driver),
+    "hm3301.read_into":          _read_into(_hm3301_driver),
+    "adc121c021.read_into":      _read_into(_adc121c021_driver),
+    "writers.jsonl":             _writer("JSONLinesWriter"),
+    "writers.csv":               _writer("CSVWriter"),
+    "writers.influx":            _writer("InfluxWriter"),
+}
+
+def run_case(name, iterations=10000, repeat=5, allocation_iterations=100):
+    """Returns the per-sample results of case name.  Wall time is the best
+    of repeat rounds of iterations samples to reduce scheduling noise."""
+    bus = FakeBus.with_devices()
+
+    with mock.patch("time.sleep", _no_sleep), mock.patch("SGP30.sleep", _no_sleep, create=True):
+        sample = CASES[name](bus)
+
+        # Warm up caches and lazily created state
+        for _ in range(10):
+            sample()
+
+        transactions = bus.transactions
+        transferred = bus.bytes
+
+        elapsed = None
+        for _ in range(repeat):
+            started = time.perf_counter_ns()
+            for _ in range(iterations):
+                sample()
+            round_elapsed = time.perf_counter_ns() - started
+
+            if elapsed is None or round_elapsed < elapsed:
+                elapsed = round_elapsed
+
+        transactions = (bus.transactions - transactions) / (iterations * repeat)
+        transferred = (bus.bytes - transferred) / (iterations * repeat)
+
+        allocated = 0
+        tracemalloc.start()
+        try:
+            for _ in range(allocation_iterations):
+                current, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                sample()
+                _, peak = tracemalloc.get_traced_memory()
+                allocated += peak - current
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "wall_ns":      elapsed / iterations,
+        "transactions": transactions,
+        "bytes":        transferred,
+        "alloc_bytes":  allocated / allocation_iterations,
+    }
+
+def check(results, baseline, margin):
+    """Returns a list of budget violations of results against baseline"""
+    failures = []
+
+    for name, result in results.items():
+        budget = baseline.get(name)
+
+        if budget is None:
+            continue
+
+        for key in ("wall_ns", "alloc_bytes"):
+            limit = budget[key] * (1 + margin)
+            if result[key] > limit:
+                failures.append("{0} {1} {2:0.0f} exceeds budget {3:0.0f}".format(name, key, result[key], limit))
+
+        for key in ("transactions", "bytes"):
+            if result[key] > budget[key]:
+                failures.append("{0} {1} {2:g} exceeds budget {3:g}".format(name, key, result[key], budget[key]))
+
+    return failures
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark drivers against a fake bus")
+    parser.add_argument("cases", nargs="*", help="cases to run (default all)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="save results as the baseline")
+    parser.add_argument("--margin", type=float, default=0.25,
+                        help="allowed fraction over baseline wall time and allocations")
+    parser.add_argument("--iterations", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    names = args.cases or list(CASES)
+    results = {}
+
+    print("{0:<26} {1:>10} {2:>6} {3:>6} {4:>8}".format("case", "µs/sample", "xfers", "bytes", "alloc B"))
+
+    for name in names:
+        result = run_case(name, args.iterations)
+        results[name] = result
+
+        print("{0:<26} {1:>10.2f} {2:>6g} {3:>6g} {4:>8.0f}".format(
+            name, result["wall_ns"] / 1000, result["transactions"], result["bytes"], result["alloc_bytes"]))
+
+    if args.save:
+        try:
+            with open(args.baseline) as io:
+                baseline = json.load(io)
+        except FileNotFoundError:
+            baseline = {}
+
+        baseline.update(results)
+
+        with open(args.baseline, "w") as io:
+            json.dump(baseline, io, indent=2, sort_keys=True)
+
+        return 0
+
+    try:
+        with open(args.baseline) as io:
+            baseline = json.load(io)
+    except FileNotFoundError:
+        print("No baseline {0}, run with --save to create one".format(args.baseline))
+        return 0
+
+    failures = check(results, baseline, args.margin)
+
+    for failure in failures:
+        print(failure)
+
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
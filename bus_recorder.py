@@ -0,0 +1,316 @@
+"""Record and replay I2C bus transactions.
+
+RecordingBus wraps an smbus compatible bus (smbus2.SMBus, a TCA9548A
+channel, ...) and logs every transaction to a compact binary file.
+ReplayBus reads such a file and answers the same transactions from it
+without hardware, as fast as possible, so driver CPU cost can be measured
+and driver outputs compared across versions:
+
+    with open("sgp30.rec", "wb") as log:
+        sgp30 = SGP30(RecordingBus(SMBus(1), log))
+        ...
+
+    with open("sgp30.rec", "rb") as log:
+        sgp30 = SGP30(ReplayBus(log))
+        ...
+
+BME280 takes the bus through Adafruit_GPIO.I2C:
+
+    BME280(busnum=1, i2c_interface=lambda busnum: RecordingBus(SMBus(busnum), log))
+
+Each entry is an ENTRY header (operation, address, register, duration in ns,
+request length, response length) followed by the request and response
+bytes.  For i2c_rdwr the register holds the message count, the request holds
+each message's flags, length and written data and the response holds the
+data read.  Failed transactions set ERROR in the operation and store the
+errno as the response."""
+
+import ctypes
+import os
+import struct
+import time
+
+ENTRY = struct.Struct("<BBhIHH")
+_MESSAGE = struct.Struct("<HH")
+_ERRNO = struct.Struct("<H")
+
+I2C_M_RD = 0x0001
+
+WRITE_QUICK          = 1
+READ_BYTE            = 2
+WRITE_BYTE           = 3
+READ_BYTE_DATA       = 4
+WRITE_BYTE_DATA      = 5
+READ_WORD_DATA       = 6
+WRITE_WORD_DATA      = 7
+READ_I2C_BLOCK_DATA  = 8
+WRITE_I2C_BLOCK_DATA = 9
+I2C_RDWR             = 10
+
+ERROR = 0x80
+
+OPERATION_NAMES = {
+    WRITE_QUICK:          "write_quick",
+    READ_BYTE:            "read_byte",
+    WRITE_BYTE:           "write_byte",
+    READ_BYTE_DATA:       "read_byte_data",
+    WRITE_BYTE_DATA:      "write_byte_data",
+    READ_WORD_DATA:       "read_word_data",
+    WRITE_WORD_DATA:      "write_word_data",
+    READ_I2C_BLOCK_DATA:  "read_i2c_block_data",
+    WRITE_I2C_BLOCK_DATA: "write_i2c_block_data",
+    I2C_RDWR:             "i2c_rdwr",
+}
+
+def _messages_request(msgs):
+    request = bytearray()
+
+    for msg in msgs:
+        request += _MESSAGE.pack(msg.flags, msg.len)
+
+        if not msg.flags & I2C_M_RD:
+            request += bytes(msg)
+
+    return bytes(request)
+
+def _messages_response(msgs):
+    response = bytearray()
+
+    for msg in msgs:
+        if msg.flags & I2C_M_RD:
+            response += bytes(msg)
+
+    return bytes(response)
+
+def read_entries(log):
+    """Yield (operation, address, register, duration, request, response) for
+    each entry in a recording"""
+    while True:
+        header = log.read(ENTRY.size)
+
+        if len(header) < ENTRY.size:
+            return
+
+        operation, address, register, duration, request_length, response_length = ENTRY.unpack(header)
+        request = log.read(request_length)
+        response = log.read(response_length)
+
+        yield operation, address, register, duration, request, response
+
+class RecordingBus():
+    """smbus compatible bus that logs every transaction to the binary file
+    log before returning the result"""
+
+    def __init__(self, bus, log):
+        self._bus = bus
+        self._log = log
+
+        self.transactions = 0
+
+    def _record(self, operation, address, register, started, request, response):
+        duration = min(time.perf_counter_ns() - started, 0xFFFFFFFF)
+
+        self._log.write(ENTRY.pack(operation, address, register, duration,
+                                   len(request), len(response)))
+        self._log.write(request)
+        self._log.write(response)
+
+        self.transactions += 1
+
+    def _call(self, operation, address, register, request, method, *args):
+        started = time.perf_counter_ns()
+
+        try:
+            result = method(*args)
+        except OSError as e:
+            self._record(operation | ERROR, address, register, started, request,
+                         _ERRNO.pack(e.errno or 0))
+            raise
+
+        return started, result
+
+    def write_quick(self, i2c_addr, force=None):
+        started, _ = self._call(WRITE_QUICK, i2c_addr, -1, b"", self._bus.write_quick, i2c_addr)
+        self._record(WRITE_QUICK, i2c_addr, -1, started, b"", b"")
+
+    def read_byte(self, i2c_addr, force=None):
+        started, value = self._call(READ_BYTE, i2c_addr, -1, b"", self._bus.read_byte, i2c_addr)
+        self._record(READ_BYTE, i2c_addr, -1, started, b"", bytes([value & 0xFF]))
+        return value
+
+    def write_byte(self, i2c_addr, value, force=None):
+        request = bytes([value & 0xFF])
+        started, _ = self._call(WRITE_BYTE, i2c_addr, -1, request, self._bus.write_byte, i2c_addr, value)
+        self._record(WRITE_BYTE, i2c_addr, -1, started, request, b"")
+
+    def read_byte_data(self, i2c_addr, register, force=None):
+        started, value = self._call(READ_BYTE_DATA, i2c_addr, register, b"",
+                                    self._bus.read_byte_data, i2c_addr, register)
+        self._record(READ_BYTE_DATA, i2c_addr, register, started, b"", bytes([value & 0xFF]))
+        return value
+
+    def write_byte_data(self, i2c_addr, register, value, force=None):
+        request = bytes([value & 0xFF])
+        started, _ = self._call(WRITE_BYTE_DATA, i2c_addr, register, request,
+                                self._bus.write_byte_data, i2c_addr, register, value)
+        self._record(WRITE_BYTE_DATA, i2c_addr, register, started, request, b"")
+
+    def read_word_data(self, i2c_addr, register, force=None):
+        started, value = self._call(READ_WORD_DATA, i2c_addr, register, b"",
+                                    self._bus.read_word_data, i2c_addr, register)
+        self._record(READ_WORD_DATA, i2c_addr, register, started, b"",
+                     (value & 0xFFFF).to_bytes(2, "little"))
+        return value
+
+    def write_word_data(self, i2c_addr, register, value, force=None):
+        request = (value & 0xFFFF).to_bytes(2, "little")
+        started, _ = self._call(WRITE_WORD_DATA, i2c_addr, register, request,
+                                self._bus.write_word_data, i2c_addr, register, value)
+        self._record(WRITE_WORD_DATA, i2c_addr, register, started, request, b"")
+
+    def read_i2c_block_data(self, i2c_addr, register, length, force=None):
+        request = bytes([length])
+        started, data = self._call(READ_I2C_BLOCK_DATA, i2c_addr, register, request,
+                                   self._bus.read_i2c_block_data, i2c_addr, register, length)
+        self._record(READ_I2C_BLOCK_DATA, i2c_addr, register, started, request, bytes(data))
+        return data
+
+    def write_i2c_block_data(self, i2c_addr, register, data, force=None):
+        request = bytes(data)
+        started, _ = self._call(WRITE_I2C_BLOCK_DATA, i2c_addr, register, request,
+                                self._bus.write_i2c_block_data, i2c_addr, register, data)
+        self._record(WRITE_I2C_BLOCK_DATA, i2c_addr, register, started, request, b"")
+
+    def i2c_rdwr(self, *i2c_msgs):
+        address = i2c_msgs[0].addr if i2c_msgs else 0
+        request = _messages_request(i2c_msgs)
+        started, _ = self._call(I2C_RDWR, address, len(i2c_msgs), request,
+                                self._bus.i2c_rdwr, *i2c_msgs)
+        self._record(I2C_RDWR, address, len(i2c_msgs), started, request,
+                     _messages_response(i2c_msgs))
+
+    def close(self):
+        self._bus.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+class ReplayBus():
+    """smbus compatible bus answering transactions from a recording made by
+    RecordingBus.  Each transaction must match the next recorded one,
+    otherwise ReplayBus.Mismatch is raised.  With realtime the recorded
+    duration of each transaction is slept."""
+
+    class Mismatch(Exception):
+        pass
+
+    def __init__(self, log, realtime=False):
+        self._entries = list(read_entries(log))
+        self._position = 0
+        self._realtime = realtime
+
+    def rewind(self):
+        self._position = 0
+
+    def remaining(self):
+        return len(self._entries) - self._position
+
+    def _next(self, operation, address, register, request):
+        if self._position >= len(self._entries):
+            raise self.Mismatch("Recording exhausted at {0} 0x{1:02x}".format(
+                OPERATION_NAMES[operation], address))
+
+        entry = self._entries[self._position]
+        recorded, recorded_address, recorded_register, duration, recorded_request, response = entry
+
+        if (recorded & ~ERROR, recorded_address, recorded_register, recorded_request) != \
+           (operation, address, register, request):
+            raise self.Mismatch("Entry {0}: expected {1} 0x{2:02x} register {3} {4}, got {5} 0x{6:02x} register {7} {8}".format(
+                self._position,
+                OPERATION_NAMES.get(recorded & ~ERROR), recorded_address, recorded_register, recorded_request.hex(),
+                OPERATION_NAMES[operation], address, register, request.hex()))
+
+        self._position += 1
+
+        if self._realtime:
+            time.sleep(duration / 1e9)
+
+        if recorded & ERROR:
+            code = _ERRNO.unpack(response)[0]
+            raise OSError(code, os.strerror(code))
+
+        return response
+
+    def write_quick(self, i2c_addr, force=None):
+        self._next(WRITE_QUICK, i2c_addr, -1, b"")
+
+    def read_byte(self, i2c_addr, force=None):
+        return self._next(READ_BYTE, i2c_addr, -1, b"")[0]
+
+    def write_byte(self, i2c_addr, value, force=None):
+        self._next(WRITE_BYTE, i2c_addr, -1, bytes([value & 0xFF]))
+
+    def read_byte_data(self, i2c_addr, register, force=None):
+        return self._next(READ_BYTE_DATA, i2c_addr, register, b"")[0]
+
+    def write_byte_data(self, i2c_addr, register, value, force=None):
+        self._next(WRITE_BYTE_DATA, i2c_addr, register, bytes([value & 0xFF]))
+
+    def read_word_data(self, i2c_addr, register, force=None):
+        return int.from_bytes(self._next(READ_WORD_DATA, i2c_addr, register, b""), "little")
+
+    def write_word_data(self, i2c_addr, register, value, force=None):
+        self._next(WRITE_WORD_DATA, i2c_addr, register, (value & 0xFFFF).to_bytes(2, "little"))
+
+    def read_i2c_block_data(self, i2c_addr, register, length, force=None):
+        return list(self._next(READ_I2C_BLOCK_DATA, i2c_addr, register, bytes([length])))
+
+    def write_i2c_block_data(self, i2c_addr, register, data, force=None):
+        self._next(WRITE_I2C_BLOCK_DATA, i2c_addr, register, bytes(data))
+
+    def i2c_rdwr(self, *i2c_msgs):
+        address = i2c_msgs[0].addr if i2c_msgs else 0
+        response = self._next(I2C_RDWR, address, len(i2c_msgs), _messages_request(i2c_msgs))
+
+        offset = 0
+        for msg in i2c_msgs:
+            if msg.flags & I2C_M_RD:
+                ctypes.memmove(msg.buf, response[offset:offset + msg.len], msg.len)
+                offset += msg.len
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+if __name__ == "__main__":
+    # Summarize a recording
+    import sys
+    from collections import Counter
+
+    counts = Counter()
+    errors = Counter()
+    bus_time = 0
+    transferred = 0
+
+    with open(sys.argv[1], "rb") as log:
+        for operation, address, register, duration, request, response in read_entries(log):
+            name = OPERATION_NAMES.get(operation & ~ERROR, "unknown")
+            counts[(address, name)] += 1
+            if operation & ERROR:
+                errors[(address, name)] += 1
+            bus_time += duration
+            transferred += len(request) + len(response)
+
+    for (address, name), count in sorted(counts.items()):
+        print("0x{0:02x} {1:<20} {2:>8} {3:>4} errors".format(address, name, count, errors[(address, name)]))
+
+    print("{0} transactions, {1} bytes, {2:0.3f}s on the bus".format(
+        sum(counts.values()), transferred, bus_time / 1e9))
@@ -0,0 +1,299 @@
+"""Sample each I2C bus from its own process.
+
+Blocking ioctls and the GIL serialize every bus when sampled from one
+process.  BusSampler runs one worker process per bus.  Workers publish
+readings into a SharedTable, a fixed layout table in
+multiprocessing.shared_memory that any process can read without pickling or
+IPC round-trips:
+
+    def open_bme280(busnum):
+        return BME280(address=0x76, busnum=busnum)
+
+    def read_bme280(bme280):
+        return bme280.read_all()
+
+    def open_adc(busnum):
+        return ADC121C021(SMBus(busnum))
+
+    def read_adc(adc):
+        return adc.read_result()
+
+    sampler = BusSampler()
+    sampler.add(1, "bme280", open_bme280, read_bme280, fields=3)
+    sampler.add(0, "adc", open_adc, read_adc, fields=2)
+    sampler.start()
+
+    timestamp, (temp, pres, r_hum) = sampler.read("bme280")
+
+Open and read functions run in the worker process so they must be
+picklable (module level functions) when the spawn start method is used."""
+
+import logging
+import math
+import multiprocessing
+import os
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+_Device = namedtuple("_Device", ["name", "row", "open", "read", "fields"])
+
+# CPython has no memory fence.  Acquiring and releasing a lock are atomic
+# operations with full barriers, on the Pi's weakly ordered ARM cores too.
+# The lock is private to each process, so a process dying can't block
+# another, and a forked child gets a new one in case a thread held it.
+_FENCE = threading.Lock()
+
+def _fence():
+    with _FENCE:
+        pass
+
+def _new_fence():
+    global _FENCE
+    _FENCE = threading.Lock()
+
+os.register_at_fork(after_in_child=_new_fence)
+
+class SharedTable():
+    """Table of rows of float64 values in shared memory.  Each row has one
+    writer, a sequence number makes reads consistent without locks (a
+    seqlock): the writer makes the sequence odd while a row is being written
+    and readers retry when the sequence is odd or changed during a read.
+    Fences order the sequence and value accesses, so a reader never sees a
+    row's new sequence number before its values.  A writer that dies
+    mid-write leaves the sequence odd, its replacement carries on from it."""
+
+    class Error(Exception):
+        pass
+
+    def __init__(self, rows, fields, name=None, create=True):
+        self.rows = rows
+        self.fields = fields
+
+        self._header = struct.Struct("<Q")
+        self._row = struct.Struct("<Qq{0}d".format(fields))
+        self._body = struct.Struct("<q{0}d".format(fields))
+
+        size = max(self._row.size * rows, 1)
+
+        if create:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self._shm = _attach_shared_memory(name)
+
+        self._buf = self._shm.buf
+        self.name = self._shm.name
+
+        if create:
+            self._buf[:size] = bytes(size)
+
+    @classmethod
+    def attach(cls, name, rows, fields):
+        """Open an existing table created by another process"""
+        return cls(rows, fields, name=name, create=False)
+
+    def write(self, row, timestamp, values):
+        """Store timestamp (integer ns) and values in row.  Only one process
+        may write a given row.  Rows with fewer values are padded with NaN."""
+        values = tuple(values)
+
+        if len(values) > self.fields:
+            raise self.Error("Row has {0} fields, got {1} values".format(self.fields, len(values)))
+
+        if len(values) < self.fields:
+            values += (math.nan,) * (self.fields - len(values))
+
+        offset = row * self._row.size
+        sequence = self._header.unpack_from(self._buf, offset)[0]
+
+        # The next odd number, also after a dead writer left it odd
+        sequence += 1 + (sequence & 1)
+
+        self._header.pack_into(self._buf, offset, sequence)
+        _fence()
+        self._body.pack_into(self._buf, offset + self._header.size, timestamp, *values)
+        _fence()
+        self._header.pack_into(self._buf, offset, sequence + 1)
+
+    def read(self, row, retries=100):
+        """Returns (timestamp, values) for row, or None if it has never been
+        written"""
+        offset = row * self._row.size
+        body = offset + self._header.size
+
+        for _ in range(retries):
+            before = self._header.unpack_from(self._buf, offset)[0]
+
+            if before & 1:
+                # Let the writer finish, on a single core Pi Zero it can't
+                # while this spins
+                time.sleep(0)
+                continue
+
+            _fence()
+            timestamp, *values = self._body.unpack_from(self._buf, body)
+            _fence()
+
+            if self._header.unpack_from(self._buf, offset)[0] == before:
+                if before == 0:
+                    return None
+
+                return timestamp, tuple(values)
+
+            time.sleep(0)
+
+        raise self.Error("Row {0} is being written too often to read".format(row))
+
+    def close(self):
+        self._buf = None
+        self._shm.close()
+
+    def unlink(self):
+        self._shm.unlink()
+
+def _attach_shared_memory(name):
+    """Open the shared memory segment name without tracking it in this
+    process's resource_tracker, as track=False does from Python 3.13.  The
+    creator tracks the segment.  Before 3.13 attaching registers it too: a
+    process with its own tracker unlinks the segment (or warns about a leak)
+    when it exits, and a worker sharing the creator's tracker can't
+    unregister it without dropping the creator's registration as well, so
+    registration is skipped instead."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+
+    from multiprocessing import resource_tracker
+
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+def _worker(busnum, devices, table_name, rows, fields, interval, stop):
+    logger = logging.getLogger("bus_sampler.bus.{0}".format(busnum))
+    table = SharedTable.attach(table_name, rows, fields)
+
+    opened = [(device, device.open(busnum)) for device in devices]
+
+    next_sample = time.monotonic()
+
+    try:
+        while not stop.is_set():
+            for device, driver in opened:
+                try:
+                    values = device.read(driver)
+                except OSError as e:
+                    logger.warning("Reading %s failed: %s", device.name, e)
+                    continue
+
+                table.write(device.row, time.time_ns(), values)
+
+            next_sample += interval
+            delay = next_sample - time.monotonic()
+
+            if delay > 0:
+                stop.wait(delay)
+            else:
+                next_sample = time.monotonic()
+    finally:
+        table.close()
+
+class BusSampler():
+    """Supervisor running one sampling process per bus, see the module
+    documentation"""
+
+    def __init__(self, interval=1.0, context=None):
+        self._interval = interval
+        self._context = context or multiprocessing.get_context()
+        self._buses = {}
+        self._devices = {}
+        self._fields = 0
+        self._processes = {}
+        self._stop = None
+        self.table = None
+
+    def add(self, busnum, name, open, read, fields):
+        """Sample read(open(busnum)) on busnum, publishing fields values under
+        name"""
+        if self.table is not None:
+            raise RuntimeError("Devices can't be added after start()")
+
+        if name in self._devices:
+            raise ValueError("Duplicate device name {0}".format(name))
+
+        device = _Device(name, len(self._devices), open, read, fields)
+
+        self._devices[name] = device
+        self._fields = max(self._fields, fields)
+        self._buses.setdefault(busnum, []).append(device)
+
+    def start(self):
+        self.table = SharedTable(len(self._devices), self._fields)
+        self._stop = self._context.Event()
+
+        for busnum in self._buses:
+            self._start_worker(busnum)
+
+    def _start_worker(self, busnum):
+        process = self._context.Process(
+            target=_worker,
+            args=(busnum, self._buses[busnum], self.table.name, self.table.rows,
+                  self.table.fields, self._interval, self._stop),
+            name="bus_sampler.bus.{0}".format(busnum),
+            daemon=True)
+        process.start()
+
+        self._processes[busnum] = process
+
+    def supervise(self):
+        """Restart workers that have died, returns the restarted bus numbers"""
+        restarted = []
+
+        for busnum, process in list(self._processes.items()):
+            if not process.is_alive() and not self._stop.is_set():
+                self._start_worker(busnum)
+                restarted.append(busnum)
+
+        return restarted
+
+    def read(self, name):
+        """Latest (timestamp, values) for device name, or None"""
+        device = self._devices[name]
+        reading = self.table.read(device.row)
+
+        if reading is None:
+            return None
+
+        timestamp, values = reading
+
+        return timestamp, values[:device.fields]
+
+    def stop(self, timeout=5.0):
+        if self._stop is not None:
+            self._stop.set()
+
+        for process in self._processes.values():
+            process.join(timeout)
+
+            if process.is_alive():
+                process.terminate()
+
+        self._processes = {}
+
+        if self.table is not None:
+            self.table.close()
+            self.table.unlink()
+            self.table = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,342 @@
+"""Fleet ingest of readings over TCP or UDP.
+
+Nodes batch readings with BatchClient and send them as length prefixed
+binary frames.  Collector accepts frames from many nodes and appends the
+decoded records to a RecordFile.
+
+A frame is a FRAME_HEADER (magic, version, node id, record count, payload
+length) followed by count RECORDs of (timestamp ns, channel, value).  Channel
+numbers are assigned by the fleet configuration.  Decoding is done with NumPy
+when it is installed so there is no per-field Python work, and with
+struct.iter_unpack otherwise.
+
+Run a collector with:
+
+    python collector.py serve --port 7531 --output readings.bin
+
+and measure sustained ingest on localhost with:
+
+    python collector.py load --seconds 10"""
+
+import asyncio
+import socket
+import struct
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAGIC = b"AQ"
+VERSION = 1
+
+DEFAULT_PORT = 7531
+
+FRAME_HEADER = struct.Struct("<2sBxHII")  # magic, version, node, count, length
+RECORD = struct.Struct("<qHd")            # timestamp ns, channel, value
+STORED_RECORD = struct.Struct("<HqHd")    # node, timestamp ns, channel, value
+
+# Largest batch that fits in one UDP datagram
+MAX_UDP_RECORDS = (65507 - FRAME_HEADER.size) // RECORD.size
+
+if np is not None:
+    RECORD_DTYPE = np.dtype([("timestamp", "<i8"), ("channel", "<u2"), ("value", "<f8")])
+    STORED_DTYPE = np.dtype([("node", "<u2"), ("timestamp", "<i8"), ("channel", "<u2"), ("value", "<f8")])
+
+class FrameError(Exception):
+    pass
+
+def encode_frame(node, records):
+    """Frame (timestamp ns, channel, value) tuples from node"""
+    records = list(records)
+    payload = bytearray(RECORD.size * len(records))
+
+    for index, record in enumerate(records):
+        RECORD.pack_into(payload, index * RECORD.size, *record)
+
+    return FRAME_HEADER.pack(MAGIC, VERSION, node, len(records), len(payload)) + payload
+
+def decode_header(header):
+    """Returns (node, count, payload length) from a frame header"""
+    magic, version, node, count, length = FRAME_HEADER.unpack(header)
+
+    if magic != MAGIC or version != VERSION:
+        raise FrameError("Unexpected frame magic {0!r} version {1}".format(magic, version))
+
+    if length != count * RECORD.size:
+        raise FrameError("Frame of {0} records has {1} payload bytes".format(count, length))
+
+    return node, count, length
+
+def decode_frame(frame):
+    """Returns (node, records) from a complete frame, records is a NumPy
+    structured array when NumPy is installed or a list of tuples otherwise"""
+    node, count, length = decode_header(frame[:FRAME_HEADER.size])
+    payload = frame[FRAME_HEADER.size:]
+
+    if len(payload) != length:
+        raise FrameError("Frame has {0} payload bytes, expected {1}".format(len(payload), length))
+
+    return node, decode_records(payload)
+
+def decode_records(payload):
+    if np is not None:
+        return np.frombuffer(payload, dtype=RECORD_DTYPE)
+
+    return list(RECORD.iter_unpack(payload))
+
+class RecordFile():
+    """Append-only file of STORED_RECORDs"""
+
+    def __init__(self, path):
+        self._file = open(path, "ab")
+        self.records = 0
+
+    def write(self, node, records):
+        count = len(records)
+
+        if np is not None:
+            stored = np.empty(count, dtype=STORED_DTYPE)
+            stored["node"] = node
+            stored["timestamp"] = records["timestamp"]
+            stored["channel"] = records["channel"]
+            stored["value"] = records["value"]
+            self._file.write(stored.tobytes())
+        else:
+            stored = bytearray(STORED_RECORD.size * count)
+            pack_into = STORED_RECORD.pack_into
+            size = STORED_RECORD.size
+
+            for index, (timestamp, channel, value) in enumerate(records):
+                pack_into(stored, index * size, node, timestamp, channel, value)
+
+            self._file.write(stored)
+
+        self.records += count
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+class Collector():
+    """Receives frames from nodes over TCP and UDP and writes them to
+    storage, anything with a write(node, records) method"""
+
+    def __init__(self, storage, host="0.0.0.0", port=DEFAULT_PORT):
+        self._storage = storage
+        self._host = host
+        self._port = port
+        self._server = None
+        self._transport = None
+
+        self.frames = 0
+        self.records = 0
+        self.errors = 0
+
+    async def start(self, tcp=True, udp=True):
+        loop = asyncio.get_running_loop()
+
+        if tcp:
+            self._server = await asyncio.start_server(self._handle_stream, self._host, self._port)
+
+        if udp:
+            self._transport, _ = await loop.create_datagram_endpoint(
+                lambda: _DatagramProtocol(self), local_addr=(self._host, self._port))
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+        if self._transport is not None:
+            self._transport.close()
+
+    def _store(self, node, records):
+        self._storage.write(node, records)
+        self.frames += 1
+        self.records += len(records)
+
+    async def _handle_stream(self, reader, writer):
+        try:
+            while True:
+                header = await reader.readexactly(FRAME_HEADER.size)
+                node, count, length = decode_header(header)
+                payload = await reader.readexactly(length)
+
+                self._store(node, decode_records(payload))
+        except asyncio.IncompleteReadError:
+            pass
+        except FrameError:
+            # The stream can't be resynchronized after a bad frame
+            self.errors += 1
+        finally:
+            writer.close()
+
+    def _handle_datagram(self, data):
+        try:
+            node, records = decode_frame(data)
+        except (FrameError, struct.error):
+            self.errors += 1
+            return
+
+        self._store(node, records)
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, collector):
+        self._collector = collector
+
+    def datagram_received(self, data, addr):
+        self._collector._handle_datagram(data)
+
+class BatchClient():
+    """Node side batching of readings.  Readings are packed as they are added
+    and sent as one frame when batch_size readings are waiting or
+    flush_interval seconds have passed since the last send."""
+
+    def __init__(self,
+                 node,
+                 host="localhost",
+                 port=DEFAULT_PORT,
+                 udp=False,
+                 batch_size=512,
+                 flush_interval=1.0):
+        if udp and batch_size > MAX_UDP_RECORDS:
+            raise ValueError("UDP batch_size must be at most {0}".format(MAX_UDP_RECORDS))
+
+        self._node = node
+        self._address = (host, port)
+        self._udp = udp
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+
+        self._frame = bytearray(FRAME_HEADER.size + RECORD.size * batch_size)
+        self._count = 0
+        self._flushed_at = time.monotonic()
+
+        if udp:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        else:
+            self._socket = socket.create_connection(self._address)
+
+    def add(self, timestamp, channel, value):
+        RECORD.pack_into(self._frame, FRAME_HEADER.size + self._count * RECORD.size,
+                         timestamp, channel, value)
+        self._count += 1
+
+        if self._count >= self._batch_size or \
+           time.monotonic() - self._flushed_at >= self._flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._flushed_at = time.monotonic()
+
+        if self._count == 0:
+            return
+
+        length = self._count * RECORD.size
+        FRAME_HEADER.pack_into(self._frame, 0, MAGIC, VERSION, self._node, self._count, length)
+        frame = memoryview(self._frame)[:FRAME_HEADER.size + length]
+
+        if self._udp:
+            self._socket.sendto(frame, self._address)
+        else:
+            self._socket.sendall(frame)
+
+        self._count = 0
+
+    def close(self):
+        self.flush()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+def _load_client(port, seconds, nodes, batch_size):
+    """Load generator process, sends pre-built frames from several nodes as
+    fast as the collector accepts them"""
+    frames = [encode_frame(node, [(time.time_ns(), channel % 16, float(channel))
+                                  for channel in range(batch_size)])
+              for node in range(nodes)]
+
+    sock = socket.create_connection(("localhost", port))
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+        for frame in frames:
+            sock.sendall(frame)
+
+    sock.close()
+
+async def _load(seconds, nodes, batch_size, output):
+    import multiprocessing
+
+    storage = RecordFile(output)
+    collector = Collector(storage, host="localhost", port=0)
+    await collector.start(udp=False)
+    port = collector._server.sockets[0].getsockname()[1]
+
+    client = multiprocessing.Process(target=_load_client, args=(port, seconds, nodes, batch_size))
+    started = time.monotonic()
+    cpu_started = time.process_time()
+    client.start()
+
+    while client.is_alive():
+        await asyncio.sleep(0.1)
+
+    # Let the collector drain what the client sent
+    await asyncio.sleep(0.5)
+
+    elapsed = time.monotonic() - started
+    cpu = time.process_time() - cpu_started
+
+    collector.close()
+    storage.close()
+
+    print("{0} records in {1} frames, {2} errors".format(collector.records, collector.frames, collector.errors))
+    print("{0:0.0f} records/s wall, {1:0.0f} records/s per collector CPU second".format(
+        collector.records / elapsed, collector.records / cpu))
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="collect readings")
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve.add_argument("--output", default="readings.bin")
+
+    load = commands.add_parser("load", help="measure ingest rate on localhost")
+    load.add_argument("--seconds", type=float, default=10)
+    load.add_argument("--nodes", type=int, default=32)
+    load.add_argument("--batch-size", type=int, default=512)
+    load.add_argument("--output", default="/dev/null")
+
+    args = parser.parse_args()
+
+    if args.command == "load":
+        asyncio.run(_load(args.seconds, args.nodes, args.batch_size, args.output))
+        return
+
+    async def serve_forever():
+        storage = RecordFile(args.output)
+        collector = Collector(storage, host=args.host, port=args.port)
+        await collector.start()
+
+        try:
+            while True:
+                await asyncio.sleep(1)
+                storage.flush()
+        finally:
+            collector.close()
+            storage.close()
+
+    asyncio.run(serve_forever())
+
+if __name__ == "__main__":
+    main()
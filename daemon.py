@@ -0,0 +1,235 @@
+"""Long-running sampling with bounded memory.
+
+Daemon reads every driver with read_into (see the drivers' FIELDS) into
+buffers allocated once at startup, and keeps the recent history of each
+device in a RingBuffer of fixed capacity, so the steady state loop allocates
+nothing that outlives an iteration.  After the drivers are set up the heap is
+collected and frozen with gc.freeze() so the collector doesn't keep walking
+(and copy-on-write touching) objects that live for the whole run:
+
+    daemon = Daemon({"bme280": bme280, "sgp30": sgp30}, interval=1.0, history=3600)
+    daemon.hooks.append(lambda daemon, timestamp: print(daemon.history["bme280"].latest()))
+    daemon.run()
+
+A Pi Zero node runs it with:
+
+    python daemon.py [busnum]
+
+soak.py checks that a long run on a FakeBus keeps RSS and traced memory
+flat."""
+
+import gc
+import math
+import time
+from array import array
+
+class RingBuffer():
+    """The most recent capacity rows of width values and their timestamps,
+    stored in preallocated arrays"""
+
+    def __init__(self, capacity, width):
+        self.capacity = capacity
+        self.width = width
+
+        self.timestamps = array("q", [0] * capacity)
+        self.values = array("d", [math.nan] * (capacity * width))
+
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp, row):
+        """Copy the first width values of row (any sequence) into the
+        buffer, overwriting the oldest row when it is full"""
+        index = self._next
+        start = index * self.width
+
+        self.timestamps[index] = timestamp
+
+        if isinstance(row, array) and row.typecode == "d" and len(row) == self.width:
+            self.values[start:start + self.width] = row
+        else:
+            for field in range(self.width):
+                self.values[start + field] = row[field]
+
+        self._next = (index + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def _index(self, age):
+        if not 0 <= age < self._count:
+            raise IndexError("RingBuffer holds {0} rows".format(self._count))
+
+        return (self._next - 1 - age) % self.capacity
+
+    def row(self, age=0):
+        """(timestamp, values) of the row appended age rows ago"""
+        index = self._index(age)
+        start = index * self.width
+
+        return self.timestamps[index], tuple(self.values[start:start + self.width])
+
+    def latest(self):
+        return self.row(0)
+
+    def timestamp(self, age=0):
+        return self.timestamps[self._index(age)]
+
+    def value(self, field, age=0):
+        return self.values[self._index(age) * self.width + field]
+
+    def mean(self, field):
+        """Mean of column field over the held rows"""
+        if not self._count:
+            return math.nan
+
+        return math.fsum(self.value(field, age) for age in range(self._count)) / self._count
+
+    def clear(self):
+        self._next = 0
+        self._count = 0
+
+class Daemon():
+    """Samples drivers every interval seconds, see the module documentation"""
+
+    def __init__(self,
+                 devices,
+                 interval=1.0,
+                 history=3600,
+                 clock=time.monotonic,
+                 sleep=time.sleep,
+                 time_ns=time.time_ns):
+        self.devices = devices
+        self.interval = interval
+
+        self._clock = clock
+        self._sleep = sleep
+        self._time_ns = time_ns
+
+        self.buffers = {}
+        self.history = {}
+        self.errors = {}
+        self._errors = {}
+
+        for name, driver in devices.items():
+            self.buffers[name] = array("d", [math.nan] * len(driver.FIELDS))
+            self.history[name] = RingBuffer(history, len(driver.FIELDS))
+            self.errors[name] = 0
+            self._errors[name] = (OSError, getattr(driver, "Error", OSError))
+
+        # Called with (daemon, timestamp) after each sample
+        self.hooks = []
+        self.hook_errors = 0
+        self.last_hook_error = None
+
+        self.samples = 0
+        self.frozen = False
+
+    def freeze(self):
+        """Collect garbage and move everything allocated so far into the
+        permanent generation"""
+        gc.collect()
+        gc.freeze()
+        self.frozen = True
+
+    def sample(self):
+        """Read every device once.  A device that fails keeps its previous
+        buffer contents and adds nothing to its history.  Hooks that raise
+        are counted in hook_errors."""
+        timestamp = self._time_ns()
+
+        for name, driver in self.devices.items():
+            buffer = self.buffers[name]
+
+            try:
+                driver.read_into(buffer)
+            except self._errors[name]:
+                self.errors[name] += 1
+                continue
+
+            self.history[name].append(timestamp, buffer)
+
+        self.samples += 1
+
+        for hook in self.hooks:
+            try:
+                hook(self, timestamp)
+            except Exception as e:
+                # Like a failed read, a failed hook is counted and the next
+                # sample goes ahead
+                self.hook_errors += 1
+                self.last_hook_error = e
+
+    def run(self, iterations=None):
+        """Sample every interval seconds, forever or for iterations samples"""
+        if not self.frozen:
+            self.freeze()
+
+        due = self._clock()
+        remaining = iterations
+
+        while remaining is None or remaining > 0:
+            self.sample()
+
+            if remaining is not None:
+                remaining -= 1
+
+            # Stay on the interval grid unless we fell a period behind
+            due += self.interval
+            delay = due - self._clock()
+
+            if delay > 0:
+                self._sleep(delay)
+            elif delay < -self.interval:
+                due = self._clock()
+
+def _print_sample(daemon, timestamp):
+    line = [time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(timestamp / 1e9))]
+
+    for name, buffer in daemon.buffers.items():
+        for field, value in zip(daemon.devices[name].FIELDS, buffer):
+            line.append("{0}.{1}={2:g}".format(name, field, value))
+
+    print(" ".join(line), flush=True)
+
+def humidity_compensation(bme280="bme280", sgp30="sgp30"):
+    """Hook writing the absolute humidity read by the BME280 named bme280 to
+    the SGP30 named sgp30 after each sample"""
+    def compensate(daemon, timestamp):
+        import psychrometrics
+
+        # Only compensate with this sample's reading, a failed read leaves
+        # the buffer holding an older one or NaN
+        history = daemon.history[bme280]
+        if not len(history) or history.timestamp() != timestamp:
+            return
+
+        temperature, _, humidity = daemon.buffers[bme280]
+
+        daemon.devices[sgp30].write_absolute_humidity(
+            psychrometrics.absolute_humidity(temperature, humidity))
+
+    return compensate
+
+if __name__ == "__main__":
+    import signal
+    import sys
+    import discovery
+    from smbus2 import SMBus
+
+    signal.signal(signal.SIGTERM, lambda signal, frame: sys.exit(0))
+
+    busnum = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    bus = SMBus(busnum)
+
+    daemon = Daemon(discovery.bind(bus, busnum, discovery.inventory(bus, busnum)))
+
+    if "bme280" in daemon.devices and "sgp30" in daemon.devices:
+        daemon.hooks.append(humidity_compensation())
+    daemon.hooks.append(_print_sample)
+
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,113 @@
+"""Report-by-exception filtering of readings.
+
+A field is only passed on when it moves outside its deadband around the last
+value passed on, or when its heartbeat interval has elapsed so consumers can
+tell a quiet sensor from a dead one:
+
+    report = ReportByException({
+        "pressure":    Deadband(absolute=10.0, heartbeat=300),
+        "temperature": Deadband(absolute=0.05, heartbeat=300),
+        "PM_2_5":      Deadband(relative=0.05, absolute=1, heartbeat=300),  # 5%, at least 1
+    })
+
+    changed = report.filter(time.monotonic(), reading)
+
+    if changed:
+        write(changed)
+
+Fields without a Deadband are always passed on."""
+
+import math
+
+class Deadband():
+    """A value is outside the deadband when it differs from the reference by
+    more than absolute, or by more than relative times the reference.  With
+    both the band is the wider of the two, so absolute is a floor under a
+    relative band that would otherwise shrink to nothing near zero."""
+
+    def __init__(self, absolute=None, relative=None, heartbeat=None):
+        if absolute is None and relative is None:
+            raise ValueError("Deadband needs an absolute or relative width")
+
+        self.absolute = absolute
+        self.relative = relative
+        self.heartbeat = heartbeat
+
+    def width(self, reference):
+        """Half width of the band around reference"""
+        width = 0.0
+
+        if self.absolute is not None:
+            width = self.absolute
+
+        if self.relative is not None:
+            width = max(width, abs(reference) * self.relative)
+
+        return width
+
+    def exceeded(self, reference, value):
+        # A read failing (NaN) or recovering is a change, NaN compares
+        # within no band
+        if math.isnan(reference) or math.isnan(value):
+            return math.isnan(reference) != math.isnan(value)
+
+        return abs(value - reference) > self.width(reference)
+
+class ReportByException():
+    def __init__(self, deadbands):
+        self._deadbands = deadbands
+
+        # field: (value, timestamp) last passed on
+        self._reported = {}
+
+        self.received = 0
+        self.emitted = 0
+
+    def filter(self, timestamp, values):
+        """Returns the fields of values (a dict) that should be reported at
+        timestamp (seconds)"""
+        changed = {}
+
+        for field, value in values.items():
+            self.received += 1
+
+            deadband = self._deadbands.get(field)
+            last = self._reported.get(field)
+
+            if deadband is not None and last is not None:
+                reference, reported_at = last
+
+                heartbeat_due = deadband.heartbeat is not None and \
+                    timestamp - reported_at >= deadband.heartbeat
+
+                if not heartbeat_due and not deadband.exceeded(reference, value):
+                    continue
+
+            self._reported[field] = (value, timestamp)
+            changed[field] = value
+            self.emitted += 1
+
+        return changed
+
+    def reset(self, field=None):
+        """Forget the last reported value of field, or of every field, so it
+        is reported next time"""
+        if field is None:
+            self._reported.clear()
+        else:
+            self._reported.pop(field, None)
+
+    def compression_ratio(self):
+        """Fields received per field reported"""
+        if self.emitted == 0:
+            return 0.0
+
+        return self.received / self.emitted
+
+    def statistics(self):
+        return {
+            "received":          self.received,
+            "emitted":           self.emitted,
+            "suppressed":        self.received - self.emitted,
+            "compression_ratio": self.compression_ratio(),
+        }
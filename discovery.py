@@ -0,0 +1,212 @@
+"""Find the sensors on an I2C bus and create their drivers.
+
+Only the addresses the supported chips can use are probed, and each chip is
+identified by its ID register or serial number rather than by responding at
+all.  The inventory is cached on disk.  On the next start each cached device
+is checked with one cheap identification read, and the bus is only probed
+again when something has changed:
+
+    with SMBus(1) as bus:
+        devices = bind(bus, 1, inventory(bus, 1))
+
+        bme280 = devices["bme280"]
+        sgp30 = devices["sgp30"]
+
+When a chip type appears more than once the later ones are named with their
+address, for example "bme280_0x77"."""
+
+import os.path
+
+from smbus2 import i2c_msg
+
+INVENTORY_FILENAME = os.path.expanduser("~/.air_quality_inventory_{0}.json")
+
+BME280_CHIP_ID = 0x60
+
+def identify_bme280(bus, address):
+    """Returns the chip ID if address is a BME280"""
+    chip_id = bus.read_byte_data(address, 0xD0)
+
+    return chip_id if chip_id == BME280_CHIP_ID else None
+
+def identify_sgp30(bus, address):
+    """Returns the serial number if address is an SGP30"""
+    from time import sleep
+    from SGP30 import Crc8, _cmds
+
+    cmd = _cmds.GET_SERIAL_ID
+
+    bus.i2c_rdwr(i2c_msg.write(address, cmd.commands))
+    sleep(cmd.waittime / 1000.0)
+    read = i2c_msg.read(address, cmd.replylen)
+    bus.i2c_rdwr(read)
+    data = list(read)
+
+    serial = 0
+    for i in range(0, cmd.replylen, 3):
+        if Crc8().hash(data[i:i + 2]) != data[i + 2]:
+            return None
+
+        serial = serial << 16 | data[i] << 8 | data[i + 1]
+
+    return serial
+
+def identify_hm3301(bus, address):
+    """Returns the sensor number if address is an HM3301"""
+    from HM3301 import HM3301_USE_I2C
+
+    bus.i2c_rdwr(i2c_msg.write(address, [HM3301_USE_I2C]))
+    read = i2c_msg.read(address, 29)
+    bus.i2c_rdwr(read)
+    data = list(read)
+
+    if sum(data[:28]) & 0xFF != data[28] or not any(data[:28]):
+        return None
+
+    return data[2] << 8 | data[3]
+
+# Power-on value of the ADC121C021's over-range alert limit register, the
+# drivers never change it
+ADC121C021_ALERT_LIMIT_OVER = 0x0FFF
+
+def identify_adc121c021(bus, address):
+    """Returns the over-range alert limit if address is an ADC121C021: the
+    result, alert status and config registers read with their reserved bits
+    clear and the alert limit registers hold their power-on values.  Reserved
+    bits alone would match any device reading zeros, such as an EEPROM."""
+    result, _ = bus.read_i2c_block_data(address, 0x00, 2)
+    alert_status = bus.read_byte_data(address, 0x01)
+    config = bus.read_byte_data(address, 0x02)
+    under = bus.read_i2c_block_data(address, 0x03, 2)
+    over = bus.read_i2c_block_data(address, 0x04, 2)
+
+    if result & 0x70 or alert_status & 0xFC or config & 0x02:
+        return None
+
+    if under != [0x00, 0x00] or over[0] << 8 | over[1] != ADC121C021_ALERT_LIMIT_OVER:
+        return None
+
+    return ADC121C021_ALERT_LIMIT_OVER
+
+def _bme280_driver(bus, busnum, address):
+    from BME280 import BME280
+
+    return BME280(address=address, busnum=busnum, i2c_interface=lambda busnum: bus)
+
+def _sgp30_driver(bus, busnum, address):
+    from SGP30 import SGP30
+
+    return SGP30(bus, device_address=address)
+
+def _hm3301_driver(bus, busnum, address):
+    from HM3301 import HM3301
+
+    return HM3301(bus)
+
+def _adc121c021_driver(bus, busnum, address):
+    from ADC1201C021 import ADC121C021
+
+    return ADC121C021(bus, address=address)
+
+# chip: (addresses to probe, identify, driver factory), in probing order.  The
+# SGP30 is identified before the ADC121C021 since both may use 0x58.
+CHIPS = {
+    "bme280":     ([0x76, 0x77], identify_bme280, _bme280_driver),
+    "sgp30":      ([0x58], identify_sgp30, _sgp30_driver),
+    "hm3301":     ([0x40], identify_hm3301, _hm3301_driver),
+    "adc121c021": ([0x50, 0x51, 0x52, 0x54, 0x55, 0x56, 0x58, 0x59, 0x5A],
+                   identify_adc121c021, _adc121c021_driver),
+}
+
+def identify(bus, chip, address):
+    """Returns the chip's identification at address, or None when it is
+    absent or a different chip"""
+    try:
+        return CHIPS[chip][1](bus, address)
+    except OSError:
+        return None
+
+def scan(bus):
+    """Probe the addresses of every known chip.  Returns the inventory, a
+    list of {"chip", "address", "id"} dicts."""
+    found = []
+    claimed = set()
+
+    for chip, (addresses, _, _) in CHIPS.items():
+        for address in addresses:
+            if address in claimed:
+                continue
+
+            chip_id = identify(bus, chip, address)
+
+            if chip_id is not None:
+                found.append({"chip": chip, "address": address, "id": chip_id})
+                claimed.add(address)
+
+    return found
+
+def validate(bus, found):
+    """True when every device in an inventory still identifies the same"""
+    return all(identify(bus, device["chip"], device["address"]) == device["id"]
+               for device in found)
+
+def inventory(bus, busnum, filename=None, rescan=False):
+    """The inventory of busnum, from the cache when it still validates or
+    from a scan (which is then cached)"""
+    import json
+
+    if filename is None:
+        filename = INVENTORY_FILENAME.format(busnum)
+
+    if not rescan:
+        try:
+            with open(filename) as io:
+                cached = json.load(io)
+        except (IOError, ValueError):
+            cached = None
+
+        if cached and validate(bus, cached):
+            return cached
+
+    found = scan(bus)
+
+    try:
+        with open(filename, "w") as io:
+            json.dump(found, io)
+    except IOError:
+        pass
+
+    return found
+
+def named(found):
+    """Returns (name, device) pairs for an inventory"""
+    names = set()
+    pairs = []
+
+    for device in found:
+        chip = device["chip"]
+        name = chip if chip not in names else "{0}_0x{1:02x}".format(chip, device["address"])
+
+        names.add(name)
+        pairs.append((name, device))
+
+    return pairs
+
+def driver(bus, busnum, device):
+    """Create the driver for one device of an inventory"""
+    return CHIPS[device["chip"]][2](bus, busnum, device["address"])
+
+def bind(bus, busnum, found):
+    """Create a driver for each device in an inventory, returns a dict of
+    name to driver"""
+    return {name: driver(bus, busnum, device) for name, device in named(found)}
+
+if __name__ == "__main__":
+    import sys
+    from smbus2 import SMBus
+
+    busnum = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+
+    with SMBus(busnum) as bus:
+        for device in inventory(bus, busnum, rescan="--rescan" in sys.argv):
+            print("0x{0:02x} {1} {2}".format(device["address"], device["chip"], device["id"]))
@@ -0,0 +1,250 @@
+"""In-process fake I2C bus with simulated BME280, SGP30, HM3301 and
+ADC121C021 devices.
+
+FakeBus is smbus compatible (including i2c_rdwr with smbus2 i2c_msg) and
+counts transactions and bytes transferred so drivers can be benchmarked and
+soak tested without hardware:
+
+    bus = FakeBus.with_devices()
+    sgp30 = SGP30(bus)
+    bme280 = BME280(address=0x76, busnum=1, i2c_interface=lambda busnum: bus)"""
+
+import ctypes
+import struct
+from abc import ABC, abstractmethod
+
+I2C_M_RD = 0x0001
+
+def _sgp30_crc(msb, lsb):
+    crc = 0xFF
+
+    for byte in (msb, lsb):
+        crc ^= byte
+
+        for _ in range(8):
+            if crc & 0x80:
+                crc = ((crc << 1) ^ 0x31) & 0xFF
+            else:
+                crc = (crc << 1) & 0xFF
+
+    return crc
+
+class FakeDevice(ABC):
+    """A device on a FakeBus.  register is None for plain I2C reads and
+    writes (i2c_rdwr, read_byte, write_byte)."""
+
+    @abstractmethod
+    def read(self, register, length):
+        """Returns length bytes read from register"""
+
+    @abstractmethod
+    def write(self, register, data):
+        """Writes the bytes data to register"""
+
+class FakeBME280(FakeDevice):
+    """BME280 register map with the datasheet's example calibration"""
+
+    # dig_T1..T3, dig_P1..P9
+    CALIBRATION_TP = struct.pack("<HhhHhhhhhhhh",
+                                 27504, 26435, -1000,
+                                 36477, -10685, 3024, 2855, 140, -7, 15500, -14600, 6000)
+
+    def __init__(self, raw_temperature=519888, raw_pressure=415148, raw_humidity=30000):
+        self.registers = bytearray(256)
+
+        self.registers[0x88:0x88 + len(self.CALIBRATION_TP)] = self.CALIBRATION_TP
+        self.registers[0xA1] = 75                               # dig_H1
+        self.registers[0xE1:0xE3] = struct.pack("<h", 362)      # dig_H2
+        self.registers[0xE3] = 0                                # dig_H3
+        self.registers[0xE4:0xE7] = bytes([0x14, 0x04, 0x00])   # dig_H4 324, dig_H5 0
+        self.registers[0xE7] = 30                               # dig_H6
+        self.registers[0xD0] = 0x60                             # chip ID
+
+        # Register address set by a plain write, for combined write/read
+        self.pointer = 0
+
+        self.set_raw(raw_temperature, raw_pressure, raw_humidity)
+
+    def set_raw(self, temperature, pressure, humidity):
+        self.registers[0xF7:0xFF] = bytes([
+            pressure >> 12 & 0xFF, pressure >> 4 & 0xFF, (pressure & 0x0F) << 4,
+            temperature >> 12 & 0xFF, temperature >> 4 & 0xFF, (temperature & 0x0F) << 4,
+            humidity >> 8 & 0xFF, humidity & 0xFF,
+        ])
+
+    def read(self, register, length):
+        if register is None:
+            register = self.pointer
+        return bytes(self.registers[register:register + length])
+
+    def write(self, register, data):
+        if register is None:
+            register, data = data[0], data[1:]
+            self.pointer = register
+
+        # Only the control and configuration registers are writable
+        if register not in (0xE0, 0xF2, 0xF4, 0xF5):
+            return
+
+        self.registers[register:register + len(data)] = data
+
+class FakeSGP30(FakeDevice):
+    """SGP30 answering commands with CRC protected words"""
+
+    def __init__(self, eCO2=400, tVOC=0, h2=13000, ethanol=18000,
+                 features=0x0022, serial=(0x0000, 0x0123, 0x4567)):
+        self.responses = {
+            0x2008: [eCO2, tVOC],
+            0x2015: [0x8000, 0x8000],
+            0x2032: [0xD400],
+            0x202F: [features],
+            0x2050: [h2, ethanol],
+            0x20B3: [0x8000],
+            0x3682: list(serial),
+        }
+        self.humidity = None
+        self._reply = b""
+
+    def read(self, register, length):
+        reply, self._reply = self._reply, b""
+        return reply[:length].ljust(length, b"\xff")
+
+    def write(self, register, data):
+        command = data[0] << 8 | data[1]
+
+        if command == 0x2061:
+            self.humidity = data[2] << 8 | data[3]
+
+        reply = bytearray()
+
+        for word in self.responses.get(command, []):
+            msb, lsb = word >> 8, word & 0xFF
+            reply += bytes([msb, lsb, _sgp30_crc(msb, lsb)])
+
+        self._reply = bytes(reply)
+
+class FakeHM3301(FakeDevice):
+    """HM3301 returning a fixed checksummed 29 byte frame"""
+
+    def __init__(self, standard=(5, 8, 10), atmospheric=(5, 8, 10),
+                 particles=(900, 270, 50, 4, 1, 0)):
+        words = [0, 1] + list(standard) + list(atmospheric) + list(particles)
+        frame = bytearray(struct.pack(">14H", *words))
+        frame.append(sum(frame) & 0xFF)
+
+        self.frame = bytes(frame)
+
+    def read(self, register, length):
+        return self.frame[:length]
+
+    def write(self, register, data):
+        pass
+
+class FakeADC121C021(FakeDevice):
+    def __init__(self, value=0x0800):
+        # Conversion result, config and the alert limits' power-on values
+        self.registers = {0x00: value, 0x02: 0, 0x03: 0x0000, 0x04: 0x0FFF}
+        self.pointer = 0
+
+    def read(self, register, length):
+        if register is None:
+            register = self.pointer
+        value = self.registers.get(register, 0)
+        return bytes([value >> 8 & 0xFF, value & 0xFF])[:length]
+
+    def write(self, register, data):
+        if register is None:
+            register, data = data[0], data[1:]
+            self.pointer = register
+
+        if data:
+            self.registers[register] = data[0]
+
+class FakeBus():
+    """smbus compatible bus routing transactions to FakeDevices by address.
+    Transactions to missing addresses raise EREMOTEIO like a NACK."""
+
+    def __init__(self):
+        self.devices = {}
+        self.transactions = 0
+        self.bytes = 0
+
+    @classmethod
+    def with_devices(cls):
+        """A bus with each simulated device at its default address (BME280 at
+        0x76)"""
+        bus = cls()
+        bus.add(0x76, FakeBME280())
+        bus.add(0x58, FakeSGP30())
+        bus.add(0x40, FakeHM3301())
+        bus.add(0x50, FakeADC121C021())
+        return bus
+
+    def add(self, address, device):
+        self.devices[address] = device
+
+    def _device(self, address, transaction=True):
+        if transaction:
+            self.transactions += 1
+
+        try:
+            return self.devices[address]
+        except KeyError:
+            raise OSError(121, "Remote I/O error") from None
+
+    def _read(self, address, register, length, transaction=True):
+        data = self._device(address, transaction).read(register, length)
+        self.bytes += len(data)
+        return data
+
+    def _write(self, address, register, data, transaction=True):
+        self._device(address, transaction).write(register, bytes(data))
+        self.bytes += len(data)
+
+    def write_quick(self, i2c_addr, force=None):
+        self._device(i2c_addr)
+
+    def read_byte(self, i2c_addr, force=None):
+        return self._read(i2c_addr, None, 1)[0]
+
+    def write_byte(self, i2c_addr, value, force=None):
+        self._write(i2c_addr, None, [value])
+
+    def read_byte_data(self, i2c_addr, register, force=None):
+        return self._read(i2c_addr, register, 1)[0]
+
+    def write_byte_data(self, i2c_addr, register, value, force=None):
+        self._write(i2c_addr, register, [value])
+
+    def read_word_data(self, i2c_addr, register, force=None):
+        return int.from_bytes(self._read(i2c_addr, register, 2), "little")
+
+    def write_word_data(self, i2c_addr, register, value, force=None):
+        self._write(i2c_addr, register, value.to_bytes(2, "little"))
+
+    def read_i2c_block_data(self, i2c_addr, register, length, force=None):
+        return list(self._read(i2c_addr, register, length))
+
+    def write_i2c_block_data(self, i2c_addr, register, data, force=None):
+        self._write(i2c_addr, register, data)
+
+    def i2c_rdwr(self, *i2c_msgs):
+        # One transaction however many messages, they are joined by repeated
+        # starts
+        self.transactions += 1
+
+        for msg in i2c_msgs:
+            if msg.flags & I2C_M_RD:
+                data = self._read(msg.addr, None, msg.len, False)
+                ctypes.memmove(msg.buf, data, len(data))
+            else:
+                self._write(msg.addr, None, ctypes.string_at(msg.buf, msg.len), False)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
@@ -0,0 +1,174 @@
+"""In-process GPIO chip for exercising Adafruit_GPIO.GPIOCdev without
+hardware.
+
+FakeGPIOChip answers the character device ioctls CdevGPIO makes on the same
+ctypes structures the kernel would receive, so the request encoding is
+exercised too.  Inputs are driven with set_input() and every ioctl is
+counted.  Line requests are pipes, edges on lines with edge detection
+enabled write LineEvents to them, so event loops can wait on the fds as on
+the real device:
+
+    chip = FakeGPIOChip()
+    gpio = CdevGPIO(chip)
+    gpio.setup_pins({17: GPIO.OUT, 27: GPIO.OUT, 22: GPIO.IN})
+    gpio.output_pins({17: True, 27: False})
+
+    chip.values[17]  # True
+    chip.ioctls      # 2"""
+
+import errno
+import os
+import time
+
+from Adafruit_GPIO.GPIOCdev import (
+    GPIO_GET_CHIPINFO_IOCTL,
+    GPIO_V2_GET_LINE_IOCTL,
+    GPIO_V2_LINE_ATTR_ID_FLAGS,
+    GPIO_V2_LINE_ATTR_ID_OUTPUT_VALUES,
+    GPIO_V2_LINE_EVENT_FALLING_EDGE,
+    GPIO_V2_LINE_EVENT_RISING_EDGE,
+    GPIO_V2_LINE_FLAG_EDGE_FALLING,
+    GPIO_V2_LINE_FLAG_EDGE_RISING,
+    GPIO_V2_LINE_FLAG_INPUT,
+    GPIO_V2_LINE_FLAG_OUTPUT,
+    GPIO_V2_LINE_GET_VALUES_IOCTL,
+    GPIO_V2_LINE_SET_CONFIG_IOCTL,
+    GPIO_V2_LINE_SET_VALUES_IOCTL,
+    LineEvent,
+)
+
+class FakeGPIOChip():
+    def __init__(self, lines=54, name="gpiochip0", label="fake"):
+        self.name = name
+        self.label = label
+        self.fd = 3
+
+        self.values = [False] * lines
+        self.flags = [0] * lines
+        self.consumers = [None] * lines
+
+        # request fd: line offsets, and the write end of its pipe
+        self.requests = {}
+        self._writers = {}
+
+        self._seqno = {}
+        self.line_seqno = [0] * lines
+
+        self.ioctls = 0
+
+    def set_input(self, offset, value, timestamp_ns=None):
+        """Drive an input line as the outside world would, queueing an edge
+        event when the line detects the change"""
+        value = bool(value)
+        previous = self.values[offset]
+        self.values[offset] = value
+
+        if value == previous or not self.flags[offset] & GPIO_V2_LINE_FLAG_INPUT:
+            return
+
+        if value and self.flags[offset] & GPIO_V2_LINE_FLAG_EDGE_RISING:
+            event_id = GPIO_V2_LINE_EVENT_RISING_EDGE
+        elif not value and self.flags[offset] & GPIO_V2_LINE_FLAG_EDGE_FALLING:
+            event_id = GPIO_V2_LINE_EVENT_FALLING_EDGE
+        else:
+            return
+
+        for fd, offsets in self.requests.items():
+            if offset in offsets:
+                self._seqno[fd] += 1
+                self.line_seqno[offset] += 1
+
+                event = LineEvent()
+                event.timestamp_ns = time.monotonic_ns() if timestamp_ns is None else timestamp_ns
+                event.id = event_id
+                event.offset = offset
+                event.seqno = self._seqno[fd]
+                event.line_seqno = self.line_seqno[offset]
+
+                os.write(self._writers[fd], bytes(event))
+
+    def ioctl(self, fd, request, arg):
+        self.ioctls += 1
+
+        if request == GPIO_GET_CHIPINFO_IOCTL and fd == self.fd:
+            arg.name = self.name.encode()
+            arg.label = self.label.encode()
+            arg.lines = len(self.values)
+        elif request == GPIO_V2_GET_LINE_IOCTL and fd == self.fd:
+            self._get_line(arg)
+        elif request == GPIO_V2_LINE_SET_CONFIG_IOCTL and fd in self.requests:
+            self._configure(self.requests[fd], arg)
+        elif request == GPIO_V2_LINE_GET_VALUES_IOCTL and fd in self.requests:
+            arg.bits = 0
+            for index, offset in enumerate(self.requests[fd]):
+                if arg.mask >> index & 1 and self.values[offset]:
+                    arg.bits |= 1 << index
+        elif request == GPIO_V2_LINE_SET_VALUES_IOCTL and fd in self.requests:
+            for index, offset in enumerate(self.requests[fd]):
+                if arg.mask >> index & 1:
+                    if not self.flags[offset] & GPIO_V2_LINE_FLAG_OUTPUT:
+                        raise OSError(errno.EPERM, os.strerror(errno.EPERM))
+                    self.values[offset] = bool(arg.bits >> index & 1)
+        else:
+            raise OSError(errno.EINVAL, os.strerror(errno.EINVAL))
+
+    def _get_line(self, request):
+        offsets = list(request.offsets[:request.num_lines])
+
+        for offset in offsets:
+            if offset >= len(self.values):
+                raise OSError(errno.EINVAL, os.strerror(errno.EINVAL))
+            if self.consumers[offset] is not None:
+                raise OSError(errno.EBUSY, os.strerror(errno.EBUSY))
+
+        fd, writer = os.pipe()
+
+        self.requests[fd] = offsets
+        self._writers[fd] = writer
+        self._seqno[fd] = 0
+        for offset in offsets:
+            self.consumers[offset] = request.consumer.decode()
+
+        self._configure(offsets, request.config)
+        request.fd = fd
+
+    def _configure(self, offsets, config):
+        attrs = config.attrs[:config.num_attrs]
+
+        for index, offset in enumerate(offsets):
+            flags = config.flags
+            value = None
+
+            for attr in attrs:
+                if not attr.mask >> index & 1:
+                    continue
+
+                if attr.attr.id == GPIO_V2_LINE_ATTR_ID_FLAGS:
+                    flags = attr.attr.flags
+                elif attr.attr.id == GPIO_V2_LINE_ATTR_ID_OUTPUT_VALUES:
+                    value = bool(attr.attr.values >> index & 1)
+
+            if flags & GPIO_V2_LINE_FLAG_INPUT and flags & GPIO_V2_LINE_FLAG_OUTPUT:
+                raise OSError(errno.EINVAL, os.strerror(errno.EINVAL))
+
+            self.flags[offset] = flags
+
+            if flags & GPIO_V2_LINE_FLAG_OUTPUT and value is not None:
+                self.values[offset] = value
+
+    def read(self, fd, size):
+        return os.read(fd, size)
+
+    def close_line(self, fd):
+        for offset in self.requests.pop(fd):
+            self.consumers[offset] = None
+            self.flags[offset] = 0
+            self.line_seqno[offset] = 0
+
+        os.close(self._writers.pop(fd))
+        os.close(fd)
+        del self._seqno[fd]
+
+    def close(self):
+        for fd in list(self.requests):
+            self.close_line(fd)
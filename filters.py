@@ -0,0 +1,281 @@
+"""Streaming smoothing filters for noisy channels.
+
+Each filter takes one value per add() and returns the smoothed value, so a
+noisy sensor (ADC121C021 gas readings, SGP30 tVOC, HM3301 counts) is
+smoothed across successive readings instead of by taking extra samples per
+reading:
+
+    tvoc = EWMA(alpha=0.2)
+    pm = RunningMedian(5)
+
+    smoothed = tvoc.add(tVOC)
+
+FilterStage applies filters to the fields of reading dicts.  NaN values
+(failed reads) are skipped by the streaming filters.  Every add() takes an
+optional timestamp, which only an EWMA with a time_constant uses.
+
+Each filter has a NumPy batch equivalent producing the same output for a
+whole column, for backfilling stored readings: running_median(), ewma() and
+kalman()."""
+
+import bisect
+import math
+from array import array
+
+class RunningMedian():
+    """Median of the last window values.  The window is kept in arrival
+    order in a ring of doubles and sorted in a second array, each add() is a
+    binary search plus a memmove of the sorted array to evict and insert."""
+
+    def __init__(self, window):
+        if window < 1:
+            raise ValueError("Unexpected window value {0}".format(window))
+
+        self.window = window
+
+        self._ring = array("d", bytes(8 * window))
+        self._next = 0
+        self._sorted = array("d")
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def add(self, value, timestamp=None):
+        if math.isnan(value):
+            return self.value()
+
+        ordered = self._sorted
+
+        if len(ordered) == self.window:
+            del ordered[bisect.bisect_left(ordered, self._ring[self._next])]
+
+        self._ring[self._next] = value
+        self._next = (self._next + 1) % self.window
+        bisect.insort(ordered, value)
+
+        return self.value()
+
+    def value(self):
+        ordered = self._sorted
+        count = len(ordered)
+
+        if not count:
+            return None
+
+        middle = count // 2
+
+        if count % 2:
+            return ordered[middle]
+
+        return (ordered[middle - 1] + ordered[middle]) / 2
+
+    def reset(self):
+        self._next = 0
+        del self._sorted[:]
+
+class EWMA():
+    """Exponentially weighted moving average.  With a time_constant (in the
+    units of the timestamps given to add) the weight of each value depends
+    on the time since the last one, for irregularly sampled channels,
+    otherwise every value is weighted by alpha."""
+
+    def __init__(self, alpha=None, time_constant=None):
+        if (alpha is None) == (time_constant is None):
+            raise ValueError("EWMA needs either alpha or time_constant")
+
+        if alpha is not None and not 0 < alpha <= 1:
+            raise ValueError("Unexpected alpha value {0}".format(alpha))
+
+        self.alpha = alpha
+        self.time_constant = time_constant
+
+        self._value = None
+        self._timestamp = None
+
+    def add(self, value, timestamp=None):
+        if self.time_constant is not None and timestamp is None:
+            raise ValueError("EWMA with a time_constant needs timestamps")
+
+        if math.isnan(value):
+            return self._value
+
+        if self._value is None:
+            self._value = value
+        else:
+            if self.time_constant is None:
+                alpha = self.alpha
+            else:
+                alpha = 1 - math.exp(-(timestamp - self._timestamp) / self.time_constant)
+
+            self._value += alpha * (value - self._value)
+
+        self._timestamp = timestamp
+
+        return self._value
+
+    def value(self):
+        return self._value
+
+    def reset(self):
+        self._value = None
+        self._timestamp = None
+
+class Kalman():
+    """One dimensional Kalman filter for a slowly varying level observed
+    with noise: process_variance is how much the true value drifts between
+    samples, measurement_variance the sensor's noise.  The gain settles to a
+    constant, after which this is an EWMA whose alpha follows from the two
+    variances."""
+
+    def __init__(self, process_variance, measurement_variance, initial_variance=None):
+        self.process_variance = process_variance
+        self.measurement_variance = measurement_variance
+        self.initial_variance = measurement_variance if initial_variance is None else initial_variance
+
+        self._value = None
+        self.variance = self.initial_variance
+
+    def add(self, value, timestamp=None):
+        if math.isnan(value):
+            return self._value
+
+        if self._value is None:
+            self._value = value
+            self.variance = self.initial_variance
+            return self._value
+
+        predicted = self.variance + self.process_variance
+        gain = predicted / (predicted + self.measurement_variance)
+
+        self._value += gain * (value - self._value)
+        self.variance = (1 - gain) * predicted
+
+        return self._value
+
+    def value(self):
+        return self._value
+
+    def reset(self):
+        self._value = None
+        self.variance = self.initial_variance
+
+class FilterStage():
+    """Smooths the fields of reading dicts with a filter per field, fields
+    without a filter pass through:
+
+        stage = FilterStage({"tVOC": EWMA(0.2), "PM_2_5_standard_particulate": RunningMedian(5)})
+        smoothed = stage.apply(reading, timestamp)"""
+
+    def __init__(self, filters):
+        self.filters = filters
+
+    def apply(self, values, timestamp=None):
+        filtered = dict(values)
+
+        for field, value in values.items():
+            stream = self.filters.get(field)
+
+            if stream is not None:
+                filtered[field] = stream.add(value, timestamp)
+
+        return filtered
+
+    def reset(self):
+        for stream in self.filters.values():
+            stream.reset()
+
+# NumPy batch versions, for finite values
+
+def running_median(values, window):
+    """running_median(values, window)[i] is RunningMedian(window) after
+    values[i]"""
+    import numpy as np
+
+    values = np.asarray(values, dtype=float)
+    result = np.empty_like(values)
+
+    head = min(window - 1, len(values))
+    for index in range(head):
+        result[index] = np.median(values[:index + 1])
+
+    if len(values) >= window:
+        windows = np.lib.stride_tricks.sliding_window_view(values, window)
+        result[window - 1:] = np.median(windows, axis=1)
+
+    return result
+
+def _ewma_from(values, alpha, previous):
+    """EWMA of values continuing from previous, without a Python loop per
+    value.  Within a block y[k] = w^(k+1) y[-1] + alpha w^k sum(x[j] w^-j),
+    blocks are short enough that w^-j stays well inside float range."""
+    import numpy as np
+
+    result = np.empty_like(values)
+
+    if alpha >= 1:
+        result[:] = values
+        return result
+
+    w = 1 - alpha
+    block = max(1, min(1024, int(200 / -math.log10(w))))
+
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        powers = w ** np.arange(len(chunk))
+
+        weighted = np.cumsum(chunk / powers)
+        result[start:start + len(chunk)] = w * powers * previous + alpha * powers * weighted
+
+        previous = result[start + len(chunk) - 1]
+
+    return result
+
+def ewma(values, alpha):
+    """ewma(values, alpha)[i] is EWMA(alpha) after values[i]"""
+    import numpy as np
+
+    values = np.asarray(values, dtype=float)
+
+    if len(values) == 0:
+        return values.copy()
+
+    result = np.empty_like(values)
+    result[0] = values[0]
+    result[1:] = _ewma_from(values[1:], alpha, values[0])
+
+    return result
+
+def kalman(values, process_variance, measurement_variance, initial_variance=None, tolerance=1e-15):
+    """kalman(values, ...)[i] is Kalman(...) after values[i].  The gain
+    doesn't depend on the values, so once it has settled the rest of the
+    column is an EWMA with the settled gain."""
+    import numpy as np
+
+    values = np.asarray(values, dtype=float)
+    result = np.empty_like(values)
+
+    if len(values) == 0:
+        return result
+
+    stream = Kalman(process_variance, measurement_variance, initial_variance)
+    stream.add(values[0])
+    result[0] = values[0]
+
+    gain = None
+    index = 1
+
+    while index < len(values):
+        predicted = stream.variance + process_variance
+        next_gain = predicted / (predicted + measurement_variance)
+
+        if gain is not None and abs(next_gain - gain) < tolerance:
+            break
+
+        gain = next_gain
+        result[index] = stream.add(values[index])
+        index += 1
+
+    if index < len(values):
+        result[index:] = _ewma_from(values[index:], next_gain, result[index - 1])
+
+    return result
@@ -0,0 +1,46 @@
+from smbus2 import SMBus, i2c_msg
+
+class GrovePi():
+    ANALOG_READ           = 0x03
+    ANALOG_WRITE          = 0x04
+    PIN_MODE              = 0x05
+    READ_FIRMWARE_VERSION = 0x08
+
+    INPUT  = 0
+    OUTPUT = 1
+
+    def __init__(self, bus, address=0x04):
+        self._bus = bus
+        self._address = address
+
+    def analog_read(self, pin):
+        self._write([self.ANALOG_READ, pin, 0, 0])
+        _, msb, lsb = self._read(3)
+
+        return msb << 8 | lsb
+
+    def firmware_version(self):
+        self._write([self.READ_FIRMWARE_VERSION, 0, 0, 0])
+
+        return self._read(4)[1:]
+
+    def pin_mode(self, pin, mode):
+        if mode not in [self.INPUT, self.OUTPUT]:
+            raise ValueError("Invalid pin mode {0}".format(mode))
+
+        self._write([self.PIN_MODE, pin, mode, 0])
+
+    def _read(self, length):
+        read = i2c_msg.read(self._address, length)
+        self._bus.i2c_rdwr(read)
+
+        return list(read)
+
+    def _write(self, data):
+        self._bus.i2c_rdwr(i2c_msg.write(self._address, data))
+
+if __name__ == "__main__":
+    with SMBus(1) as bus:
+        grove_pi = GrovePi(bus)
+
+        print(grove_pi.firmware_version())
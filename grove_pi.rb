@@ -6,6 +6,8 @@ class GrovePi
   PIN_MODE              = 0x05
   READ_FIRMWARE_VERSION = 0x08
 
+  RETRIES = 5
+
   def initialize bus, address = 0x04
     @dev = I2C::Dev.new bus, address
   end
@@ -17,6 +19,24 @@ class GrovePi
     result.unpack("xS>").first
   end
 
+  ##
+  # analog_read that retries a NACK (EREMOTEIO) up to +retries+ times with
+  # jittered exponential backoff instead of forever
+
+  def analog_read_retrying pin, retries: RETRIES
+    attempts = 0
+
+    begin
+      analog_read pin
+    rescue Errno::EREMOTEIO
+      attempts += 1
+      raise if attempts > retries
+
+      sleep rand * [0.005 * 2**attempts, 0.1].min
+      retry
+    end
+  end
+
   def firmware_version
     version = @dev.read READ_FIRMWARE_VERSION, 4
 
@@ -0,0 +1,13 @@
+"""Allocation free access to smbus2 i2c_msg data."""
+
+import ctypes
+
+# transfer(bus, *msgs) lives with Device, which uses it for register reads
+from Adafruit_GPIO.I2C import transfer
+
+def message_view(msg):
+    """A ctypes uint8 array over the data buffer of an smbus2 i2c_msg.
+    Indexing it returns ints without the bytes objects and lists that
+    iterating the message creates, so create messages once and decode
+    through their view for every transaction."""
+    return (ctypes.c_uint8 * msg.len).from_address(ctypes.addressof(msg.buf.contents))
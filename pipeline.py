@@ -0,0 +1,298 @@
+"""Source, transform and sink stages for samples.
+
+Drivers are the sources, read on the sampling cadence by a Daemon.  Each
+sample becomes a Sample of every reading that succeeded, which transforms
+(derived values, smoothing, report by exception) rewrite or drop on the
+sampling thread.  Sinks receive the samples in batches from their own
+thread through a bounded queue, so a slow disk or network sink never delays
+sampling:
+
+    pipeline = Pipeline(
+        transforms=[AbsoluteHumidity("bme280"),
+                    Smooth({"sgp30": FilterStage({"tVOC": EWMA(0.2)})})],
+        sinks=[SinkWorker(write_jsonl, batch_size=60, batch_interval=60.0)])
+
+    pipeline.attach(daemon)
+
+    with pipeline:
+        daemon.run()
+
+A sink is a callable taking a list of Samples.  When a sink stalls its queue
+fills and the worker's policy decides: DROP_OLDEST (the default) discards
+the oldest queued sample, DROP_NEWEST discards the new one and BLOCK waits
+up to block_timeout for space before dropping.  Dropped samples are counted
+in statistics()."""
+
+import threading
+from collections import deque, namedtuple
+
+# timestamp in ns, readings is source name: {field: value}
+Sample = namedtuple("Sample", ["timestamp", "readings"])
+
+DROP_OLDEST = "drop-oldest"
+DROP_NEWEST = "drop-newest"
+BLOCK = "block"
+
+POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+class SinkWorker():
+    """Feeds sink batches of up to batch_size samples from a queue of up to
+    maxsize samples.  A partial batch is written once batch_interval seconds
+    pass without the batch filling."""
+
+    def __init__(self,
+                 sink,
+                 name=None,
+                 maxsize=1024,
+                 batch_size=64,
+                 batch_interval=1.0,
+                 policy=DROP_OLDEST,
+                 block_timeout=0.1):
+        if policy not in POLICIES:
+            raise ValueError("Unknown policy {0!r}, expected one of {1}".format(
+                policy, ", ".join(POLICIES)))
+
+        self.sink = sink
+        self.name = name or getattr(sink, "__name__", type(sink).__name__)
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+        self.received = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_error = None
+
+    def __len__(self):
+        return len(self._queue)
+
+    def put(self, sample):
+        """Queue sample, returns False when it or an older sample was dropped"""
+        queue = self._queue
+        accepted = True
+
+        with self._condition:
+            self.received += 1
+
+            if len(queue) >= self.maxsize:
+                if self.policy == BLOCK:
+                    self._condition.wait_for(lambda: len(queue) < self.maxsize or self._closed,
+                                             self.block_timeout)
+
+                if len(queue) >= self.maxsize:
+                    self.dropped += 1
+
+                    if self.policy != DROP_OLDEST:
+                        return False
+
+                    queue.popleft()
+                    accepted = False
+
+            queue.append(sample)
+
+            if len(queue) >= self.batch_size:
+                self._condition.notify_all()
+
+        return accepted
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sink-{0}".format(self.name),
+                                            daemon=True)
+            self._thread.start()
+
+    def close(self, timeout=None):
+        """Write what is queued and stop the worker thread, or write it on
+        this thread when the worker was never started"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+        if self._thread is None:
+            while self._queue:
+                with self._condition:
+                    batch = self._take()
+
+                self._write(batch)
+        else:
+            self._thread.join(timeout)
+
+    def _take(self):
+        queue = self._queue
+        batch = [queue.popleft() for _ in range(min(len(queue), self.batch_size))]
+
+        # Make room for a producer blocked by BLOCK
+        self._condition.notify_all()
+
+        return batch
+
+    def _run(self):
+        queue = self._queue
+
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: len(queue) >= self.batch_size or self._closed,
+                                         self.batch_interval)
+
+                if self._closed and not queue:
+                    return
+
+                batch = self._take()
+
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        try:
+            self.sink(batch)
+        except Exception as e:
+            # The samples are lost but the worker keeps going, the next
+            # batch may succeed
+            self.errors += 1
+            self.last_error = e
+            return
+
+        self.written += len(batch)
+        self.batches += 1
+
+    def statistics(self):
+        return {
+            "queued":   len(self._queue),
+            "received": self.received,
+            "dropped":  self.dropped,
+            "written":  self.written,
+            "batches":  self.batches,
+            "errors":   self.errors,
+        }
+
+class Pipeline():
+    """Passes samples through transforms, in order, to every sink.  A
+    transform is a callable taking a Sample and returning a Sample or None
+    to drop it.  Sinks that aren't SinkWorkers get one with the defaults."""
+
+    def __init__(self, transforms=(), sinks=()):
+        self.transforms = list(transforms)
+        self.sinks = [sink if isinstance(sink, SinkWorker) else SinkWorker(sink)
+                      for sink in sinks]
+
+        self.samples = 0
+        self.filtered = 0
+
+    def attach(self, daemon):
+        """Push a Sample of the readings that succeeded after each of
+        daemon's samples"""
+        daemon.hooks.append(self.hook)
+
+    def hook(self, daemon, timestamp):
+        readings = {}
+
+        for name, driver in daemon.devices.items():
+            history = daemon.history[name]
+
+            # A failed read adds no row, so its latest row is older
+            if len(history) and history.timestamp() == timestamp:
+                readings[name] = dict(zip(driver.FIELDS, daemon.buffers[name]))
+
+        self.push(Sample(timestamp, readings))
+
+    def push(self, sample):
+        self.samples += 1
+
+        for transform in self.transforms:
+            sample = transform(sample)
+
+            if sample is None:
+                self.filtered += 1
+                return
+
+        for sink in self.sinks:
+            sink.put(sample)
+
+    def start(self):
+        for sink in self.sinks:
+            sink.start()
+
+    def close(self, timeout=None):
+        for sink in self.sinks:
+            sink.close(timeout)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def statistics(self):
+        return {sink.name: sink.statistics() for sink in self.sinks}
+
+# Transforms
+
+class AbsoluteHumidity():
+    """Adds absolute_humidity in g/m³ to source's readings (a BME280)"""
+
+    def __init__(self, source="bme280"):
+        self.source = source
+
+    def __call__(self, sample):
+        import psychrometrics
+
+        reading = sample.readings.get(self.source)
+
+        if reading is not None:
+            reading["absolute_humidity"] = psychrometrics.absolute_humidity(
+                reading["temperature"], reading["humidity"])
+
+        return sample
+
+class Smooth():
+    """Smooths readings with a filters.FilterStage per source, timestamped
+    in seconds"""
+
+    def __init__(self, stages):
+        self.stages = stages
+
+    def __call__(self, sample):
+        readings = dict(sample.readings)
+        seconds = sample.timestamp / 1e9
+
+        for source, stage in self.stages.items():
+            if source in readings:
+                readings[source] = stage.apply(readings[source], seconds)
+
+        return sample._replace(readings=readings)
+
+class ReportChanges():
+    """Keeps only the fields a deadband.ReportByException per source passes
+    on, dropping samples where nothing changed.  Sources without one pass
+    through."""
+
+    def __init__(self, reports):
+        self.reports = reports
+
+    def __call__(self, sample):
+        seconds = sample.timestamp / 1e9
+        readings = {}
+
+        for source, values in sample.readings.items():
+            report = self.reports.get(source)
+
+            if report is not None:
+                values = report.filter(seconds, values)
+
+            if values:
+                readings[source] = values
+
+        if not readings:
+            return None
+
+        return sample._replace(readings=readings)
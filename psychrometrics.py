@@ -0,0 +1,128 @@
+"""Humidity calculations from temperature (℃) and relative humidity (%RH).
+
+Every function accepts either plain floats or NumPy arrays, so the same code
+compensates a single live reading or backfills a column of stored readings.
+NumPy is only needed when arrays are passed in, and is only imported then
+so scalar users start quickly."""
+
+import math
+
+# Magnus coefficients over water, matching the absolute humidity formula at
+# https://carnotcycle.wordpress.com/2012/08/04/how-to-convert-relative-humidity-to-absolute-humidity/
+MAGNUS_A = 6.112  # hPa
+MAGNUS_B = 17.67
+MAGNUS_C = 243.5  # ℃
+
+WATER_MOLAR_MASS = 18.01534  # g/mol
+GAS_CONSTANT     = 8.31447215  # J/(mol·K)
+
+# Relative humidity is clamped to this to keep the dew point finite at 0%RH
+MIN_RELATIVE_HUMIDITY = 0.01
+
+def _is_scalar(value):
+    return isinstance(value, (int, float))
+
+def _numpy():
+    import numpy
+
+    return numpy
+
+def _exp(value):
+    if _is_scalar(value):
+        return math.exp(value)
+
+    return _numpy().exp(value)
+
+def _log(value):
+    if _is_scalar(value):
+        return math.log(value)
+
+    return _numpy().log(value)
+
+def _sqrt(value):
+    if _is_scalar(value):
+        return math.sqrt(value)
+
+    return _numpy().sqrt(value)
+
+def _maximum(value, minimum):
+    if _is_scalar(value):
+        return max(value, minimum)
+
+    return _numpy().maximum(value, minimum)
+
+def _where(condition, true, false):
+    if _is_scalar(condition) or isinstance(condition, bool):
+        return true if condition else false
+
+    return _numpy().where(condition, true, false)
+
+def saturation_vapor_pressure(temperature):
+    """Saturation vapor pressure of water in hPa"""
+    t = temperature
+
+    return MAGNUS_A * _exp((MAGNUS_B * t) / (t + MAGNUS_C))
+
+def absolute_humidity(temperature, relative_humidity):
+    """Absolute humidity in g/m³"""
+    t = temperature
+
+    vapor_pressure = saturation_vapor_pressure(t) * relative_humidity
+
+    return (vapor_pressure * WATER_MOLAR_MASS) / ((273.15 + t) * GAS_CONSTANT)
+
+def dew_point(temperature, relative_humidity):
+    """Dew point in ℃ using the Magnus formula"""
+    t = temperature
+    r_hum = _maximum(relative_humidity, MIN_RELATIVE_HUMIDITY)
+
+    gamma = _log(r_hum / 100.0) + (MAGNUS_B * t) / (MAGNUS_C + t)
+
+    return (MAGNUS_C * gamma) / (MAGNUS_B - gamma)
+
+def heat_index(temperature, relative_humidity):
+    """Apparent temperature in ℃ using the US National Weather Service
+    regression (https://www.wpc.ncep.noaa.gov/html/heatindex_equation.shtml)"""
+    f = temperature * 1.8 + 32
+    r = relative_humidity
+
+    simple = 0.5 * (f + 61.0 + ((f - 68.0) * 1.2) + (r * 0.094))
+
+    full = (-42.379
+            + 2.04901523 * f
+            + 10.14333127 * r
+            - 0.22475541 * f * r
+            - 0.00683783 * f * f
+            - 0.05481717 * r * r
+            + 0.00122874 * f * f * r
+            + 0.00085282 * f * r * r
+            - 0.00000199 * f * f * r * r)
+
+    dry = (13.0 - r) / 4.0 * _sqrt(_maximum(17.0 - abs(f - 95.0), 0.0) / 17.0)
+    full = _where((r < 13) & (f >= 80) & (f <= 112), full - dry, full)
+
+    humid = (r - 85.0) / 10.0 * ((87.0 - f) / 5.0)
+    full = _where((r > 85) & (f >= 80) & (f <= 87), full + humid, full)
+
+    index_f = _where((simple + f) / 2.0 < 80.0, simple, full)
+
+    return (index_f - 32) / 1.8
+
+def sgp30_humidity(absolute_humidity):
+    """Absolute humidity in g/m³ encoded as the SGP30's unsigned 8.8 fixed
+    point compensation value.  Values are clamped to 0-0xFFFF."""
+    if _is_scalar(absolute_humidity):
+        return min(max(int(round(absolute_humidity * 256)), 0), 0xFFFF)
+
+    np = _numpy()
+    encoded = np.rint(np.asarray(absolute_humidity) * 256)
+
+    return np.clip(encoded, 0, 0xFFFF).astype(np.uint16)
+
+def derive(temperature, relative_humidity):
+    """All derived humidity values for one snapshot (or arrays of snapshots)"""
+    return {
+        "absolute_humidity": absolute_humidity(temperature, relative_humidity),
+        "dew_point":         dew_point(temperature, relative_humidity),
+        "heat_index":        heat_index(temperature, relative_humidity),
+    }
@@ -0,0 +1,410 @@
+"""Stored readings with time-range aggregate queries.
+
+Each series, a (node, channel) pair as used by collector.py, is kept in its
+own file of (timestamp ns, value) SAMPLEs in time order.  The file is split
+into blocks of BLOCK_SAMPLES and a sparse index holds each block's first and
+last timestamp and the count, min, max and sum of its values.  A range
+aggregate uses the summaries of the blocks that lie entirely inside the range
+and only reads raw samples from the (at most two) blocks at its ends, so a
+query over a year of 1 Hz data reads a few thousand samples instead of 31
+million:
+
+    store = ReadingStore("readings")
+    store.append(node, channel, [(timestamp, value), ...])
+
+    store.aggregate(node, channel, start, end).max
+    for start, summary in store.aggregate_by(node, channel, start, end, DAY):
+        print(start, summary.mean)
+
+Timestamps are integer nanoseconds, ranges include start and exclude end.
+A collector RecordFile can be loaded with import_record_file() or:
+
+    python readings_store.py import readings.bin readings
+    python readings_store.py query readings 1 3 --days 30"""
+
+import bisect
+import math
+import os
+import struct
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SAMPLE = struct.Struct("<qd")             # timestamp ns, value
+BLOCK_SUMMARY = struct.Struct("<qqIddd")  # first, last, count, min, max, sum
+
+BLOCK_SAMPLES = 4096
+
+SECOND = 1000000000
+HOUR = 3600 * SECOND
+DAY = 24 * HOUR
+
+if np is not None:
+    SAMPLE_DTYPE = np.dtype([("timestamp", "<i8"), ("value", "<f8")])
+
+class Summary(namedtuple("Summary", ["count", "min", "max", "sum"])):
+    """Aggregate of the values in a range, min, max and mean are None when
+    it is empty"""
+
+    __slots__ = ()
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def merge(self, other):
+        if not other.count:
+            return self
+        if not self.count:
+            return other
+
+        return Summary(self.count + other.count, min(self.min, other.min),
+                       max(self.max, other.max), self.sum + other.sum)
+
+EMPTY = Summary(0, None, None, 0.0)
+
+def summarize(samples):
+    """Summary of a sequence of (timestamp, value) samples"""
+    if np is not None and isinstance(samples, np.ndarray):
+        if len(samples) == 0:
+            return EMPTY
+
+        values = samples["value"]
+
+        return Summary(len(values), float(values.min()), float(values.max()), float(values.sum()))
+
+    values = [value for _, value in samples]
+
+    if not values:
+        return EMPTY
+
+    return Summary(len(values), min(values), max(values), math.fsum(values))
+
+class Series():
+    """Sample file and block index of one series"""
+
+    def __init__(self, path):
+        self.path = path
+        self._samples = open(path + ".dat", "a+b")
+        self._index = open(path + ".idx", "a+b")
+
+        self.firsts = []
+        self.lasts = []
+        self.summaries = []
+
+        self._index.seek(0)
+        for first, last, count, low, high, total in BLOCK_SUMMARY.iter_unpack(self._index.read()):
+            self.firsts.append(first)
+            self.lasts.append(last)
+            self.summaries.append(Summary(count, low, high, total))
+
+        self._samples.seek(0, os.SEEK_END)
+        size = self._samples.tell()
+        self.count = size // SAMPLE.size
+
+        # A crash in the middle of writing a sample leaves a partial one at
+        # the end, which would misalign every sample appended after it
+        if size != self.count * SAMPLE.size:
+            self._samples.truncate(self.count * SAMPLE.size)
+
+        expected = sum(summary.count for summary in self.summaries)
+        if expected != self.count:
+            self._rebuild_index()
+
+    def _rebuild_index(self):
+        """Recreate the index from the sample file, after a crash between
+        writing samples and their summary"""
+        self._samples.seek(0)
+        self.count = 0
+        self.firsts, self.lasts, self.summaries = [], [], []
+        self._index.truncate(0)
+
+        while True:
+            data = self._samples.read(BLOCK_SAMPLES * SAMPLE.size)
+            data = data[:len(data) - len(data) % SAMPLE.size]
+
+            if not data:
+                break
+
+            self._add_to_index(list(SAMPLE.iter_unpack(data)))
+
+        self._samples.truncate(self.count * SAMPLE.size)
+        self._write_index(0)
+
+    def _add_to_index(self, samples):
+        """Account for samples appended to the sample file, filling the
+        last block before starting new ones"""
+        offset = 0
+
+        while offset < len(samples):
+            used = self.count % BLOCK_SAMPLES
+
+            if used == 0:
+                self.firsts.append(samples[offset][0])
+                self.lasts.append(samples[offset][0])
+                self.summaries.append(EMPTY)
+
+            chunk = samples[offset:offset + BLOCK_SAMPLES - used]
+
+            self.lasts[-1] = chunk[-1][0]
+            self.summaries[-1] = self.summaries[-1].merge(summarize(chunk))
+
+            self.count += len(chunk)
+            offset += len(chunk)
+
+    def _write_index(self, block):
+        """Rewrite the index from block on"""
+        self._index.truncate(block * BLOCK_SUMMARY.size)
+        self._index.seek(0, os.SEEK_END)
+
+        for first, last, summary in zip(self.firsts[block:], self.lasts[block:], self.summaries[block:]):
+            self._index.write(BLOCK_SUMMARY.pack(first, last, *summary))
+
+    def append(self, samples):
+        """Append (timestamp, value) samples, which must not be older than
+        the newest stored sample"""
+        samples = [(int(timestamp), float(value)) for timestamp, value in samples]
+
+        if not samples:
+            return
+
+        previous = self.lasts[-1] if self.lasts else None
+        for timestamp, _ in samples:
+            if previous is not None and timestamp < previous:
+                raise ValueError("Sample at {0} is older than {1}".format(timestamp, previous))
+            previous = timestamp
+
+        data = bytearray(SAMPLE.size * len(samples))
+        for index, sample in enumerate(samples):
+            SAMPLE.pack_into(data, index * SAMPLE.size, *sample)
+
+        self._samples.seek(0, os.SEEK_END)
+        self._samples.write(data)
+
+        # The last block may have been partial, its summary is rewritten
+        changed = max(len(self.summaries) - 1, 0)
+        self._add_to_index(samples)
+        self._write_index(changed)
+
+    def flush(self):
+        self._samples.flush()
+        self._index.flush()
+
+    def close(self):
+        self._samples.close()
+        self._index.close()
+
+    def read_block(self, block, start=None, end=None):
+        """Samples of block with start <= timestamp < end"""
+        self._samples.flush()
+        self._samples.seek(block * BLOCK_SAMPLES * SAMPLE.size)
+        data = self._samples.read(self.summaries[block].count * SAMPLE.size)
+
+        if np is not None:
+            samples = np.frombuffer(data, dtype=SAMPLE_DTYPE)
+            timestamps = samples["timestamp"]
+
+            low = 0 if start is None else np.searchsorted(timestamps, start, "left")
+            high = len(samples) if end is None else np.searchsorted(timestamps, end, "left")
+
+            return samples[low:high]
+
+        samples = list(SAMPLE.iter_unpack(data))
+        timestamps = [timestamp for timestamp, _ in samples]
+
+        low = 0 if start is None else bisect.bisect_left(timestamps, start)
+        high = len(samples) if end is None else bisect.bisect_left(timestamps, end)
+
+        return samples[low:high]
+
+    def aggregate(self, start, end):
+        """Summary of the samples with start <= timestamp < end"""
+        # Blocks that may overlap the range: the first whose last timestamp
+        # is >= start through the last whose first timestamp is < end
+        first = bisect.bisect_left(self.lasts, start)
+        last = bisect.bisect_left(self.firsts, end) - 1
+
+        result = EMPTY
+
+        for block in range(first, last + 1):
+            if start <= self.firsts[block] and self.lasts[block] < end:
+                result = result.merge(self.summaries[block])
+            else:
+                result = result.merge(summarize(self.read_block(block, start, end)))
+
+        return result
+
+    def aggregate_by(self, start, end, interval):
+        """Returns (bucket start, Summary) for each interval long bucket
+        from start up to end.  Each block is visited once, blocks inside a
+        bucket contribute their summary and blocks spanning bucket edges
+        are read and split."""
+        buckets = list(range(start, end, interval))
+        summaries = [EMPTY] * len(buckets)
+
+        first = bisect.bisect_left(self.lasts, start)
+        last = bisect.bisect_left(self.firsts, end) - 1
+
+        for block in range(first, last + 1):
+            low = (self.firsts[block] - start) // interval
+            high = (self.lasts[block] - start) // interval
+
+            if low == high and self.firsts[block] >= start and self.lasts[block] < end:
+                summaries[low] = summaries[low].merge(self.summaries[block])
+                continue
+
+            samples = self.read_block(block, start, end)
+
+            for bucket in range(max(low, 0), min(high, len(buckets) - 1) + 1):
+                bucket_start = start + bucket * interval
+                bucket_end = min(bucket_start + interval, end)
+
+                if np is not None:
+                    timestamps = samples["timestamp"]
+                    part = samples[np.searchsorted(timestamps, bucket_start, "left"):
+                                   np.searchsorted(timestamps, bucket_end, "left")]
+                else:
+                    part = [sample for sample in samples if bucket_start <= sample[0] < bucket_end]
+
+                summaries[bucket] = summaries[bucket].merge(summarize(part))
+
+        return list(zip(buckets, summaries))
+
+    def samples(self, start, end):
+        """Yields the (timestamp, value) samples with start <= timestamp < end"""
+        first = bisect.bisect_left(self.lasts, start)
+        last = bisect.bisect_left(self.firsts, end) - 1
+
+        for block in range(first, last + 1):
+            for timestamp, value in self.read_block(block, start, end):
+                yield int(timestamp), float(value)
+
+class ReadingStore():
+    """Directory of Series, see the module documentation"""
+
+    def __init__(self, path):
+        self.path = path
+        self._series = {}
+
+        os.makedirs(path, exist_ok=True)
+
+    def series(self, node, channel):
+        key = (node, channel)
+        series = self._series.get(key)
+
+        if series is None:
+            series = Series(os.path.join(self.path, "{0}_{1}".format(node, channel)))
+            self._series[key] = series
+
+        return series
+
+    def keys(self):
+        """(node, channel) of every stored series"""
+        keys = set(self._series)
+
+        for filename in os.listdir(self.path):
+            name, extension = os.path.splitext(filename)
+
+            if extension == ".dat":
+                node, channel = name.split("_")
+                keys.add((int(node), int(channel)))
+
+        return sorted(keys)
+
+    def append(self, node, channel, samples):
+        self.series(node, channel).append(samples)
+
+    def aggregate(self, node, channel, start, end):
+        return self.series(node, channel).aggregate(start, end)
+
+    def aggregate_by(self, node, channel, start, end, interval):
+        """Returns (bucket start, Summary) for each interval long bucket
+        from start up to end, such as daily means with interval=DAY"""
+        return self.series(node, channel).aggregate_by(start, end, interval)
+
+    def samples(self, node, channel, start, end):
+        return self.series(node, channel).samples(start, end)
+
+    def import_record_file(self, path, chunk_records=65536):
+        """Append the STORED_RECORDs of a collector RecordFile.  Records of
+        each series must be in time order across the file."""
+        from collector import STORED_RECORD
+
+        with open(path, "rb") as io:
+            while True:
+                data = io.read(chunk_records * STORED_RECORD.size)
+                data = data[:len(data) - len(data) % STORED_RECORD.size]
+
+                if not data:
+                    break
+
+                grouped = {}
+                for node, timestamp, channel, value in STORED_RECORD.iter_unpack(data):
+                    grouped.setdefault((node, channel), []).append((timestamp, value))
+
+                for (node, channel), samples in grouped.items():
+                    self.append(node, channel, samples)
+
+    def flush(self):
+        for series in self._series.values():
+            series.flush()
+
+    def close(self):
+        for series in self._series.values():
+            series.close()
+
+        self._series.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+def main():
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    load = commands.add_parser("import", help="import a collector record file")
+    load.add_argument("records")
+    load.add_argument("store")
+
+    query = commands.add_parser("query", help="daily summaries of a series")
+    query.add_argument("store")
+    query.add_argument("node", type=int)
+    query.add_argument("channel", type=int)
+    query.add_argument("--days", type=int, default=7)
+
+    args = parser.parse_args()
+
+    with ReadingStore(args.store) as store:
+        if args.command == "import":
+            store.import_record_file(args.records)
+            return
+
+        end = time.time_ns()
+        start = end - args.days * DAY
+
+        started = time.perf_counter()
+        buckets = store.aggregate_by(args.node, args.channel, start, end, DAY)
+        elapsed = time.perf_counter() - started
+
+        for bucket, summary in buckets:
+            day = time.strftime("%Y-%m-%d", time.localtime(bucket / SECOND))
+
+            if summary.count:
+                print("{0} {1:>8} min {2:0.3f} max {3:0.3f} mean {4:0.3f}".format(
+                    day, summary.count, summary.min, summary.max, summary.mean))
+            else:
+                print("{0} {1:>8}".format(day, 0))
+
+        print("{0:0.1f}ms".format(elapsed * 1000))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""Bounded retries and circuit breaking around driver reads.
+
+A transient bus error (a NACK while a sensor is busy, a glitch on a long
+cable) is retried a few times with jittered exponential backoff, but never
+for longer than the RetryPolicy's budget.  A device that keeps failing, such
+as one that was unplugged, trips its CircuitBreaker: calls then fail at once
+with ResilientDevice.CircuitOpen instead of spending bus time on retries, and
+a single probe call is let through after reset_timeout (doubling while the
+probes keep failing).  So one dead sensor doesn't slow down or busy the
+healthy ones sharing its bus:
+
+    bme280 = ResilientDevice(bme280, "bme280",
+                             recover=reopen_bus(bus, 1))
+
+    try:
+        bme280.read_into(buffer)
+    except (OSError, ResilientDevice.Error):
+        pass  # try again next interval
+
+recover is called with the driver when the breaker opens, for example to
+reopen the bus or re-run the sensor's initialization."""
+
+import errno
+import random
+import time
+
+# errno values worth retrying.  ENXIO and ENODEV mean the device or adapter
+# is gone, those are left to the circuit breaker.
+TRANSIENT_ERRNOS = {
+    errno.EREMOTEIO,  # NACK, the device is busy or mid conversion
+    errno.EIO,
+    errno.EAGAIN,
+    errno.EBUSY,
+    errno.ETIMEDOUT,
+}
+
+def transient(error):
+    """True when error is an OSError worth retrying"""
+    return isinstance(error, OSError) and error.errno in TRANSIENT_ERRNOS
+
+class RetryPolicy():
+    """Up to attempts tries with "full jitter" backoff: the sleep before
+    retry n is uniform between 0 and min(max_delay, base_delay * 2 ** n).
+    Retrying stops early once the sleeps would exceed budget seconds."""
+
+    def __init__(self,
+                 attempts=3,
+                 base_delay=0.005,
+                 max_delay=0.1,
+                 budget=0.25,
+                 retryable=transient,
+                 sleep=time.sleep,
+                 random=random.random):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.retryable = retryable
+
+        self._sleep = sleep
+        self._random = random
+
+        self.retries = 0
+
+    def delay(self, attempt):
+        return self._random() * min(self.max_delay, self.base_delay * 2 ** attempt)
+
+    def call(self, function, *args, **kwargs):
+        """Returns function(*args, **kwargs), re-raising its last error when
+        the attempts or budget run out or the error isn't retryable"""
+        spent = 0.0
+        attempt = 0
+
+        while True:
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                attempt += 1
+
+                if attempt >= self.attempts or not self.retryable(e):
+                    raise
+
+                delay = self.delay(attempt)
+
+                if spent + delay > self.budget:
+                    raise
+
+                self.retries += 1
+                spent += delay
+                self._sleep(delay)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+class CircuitBreaker():
+    """Opens after failure_threshold consecutive failures.  While open
+    allow() is False until reset_timeout has passed, then one probe is
+    allowed (half-open).  A successful probe closes the breaker, a failed
+    one opens it again for twice as long, up to max_reset_timeout."""
+
+    def __init__(self,
+                 failure_threshold=5,
+                 reset_timeout=5.0,
+                 max_reset_timeout=300.0,
+                 clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+
+        self._clock = clock
+
+        self.state = CLOSED
+        self.failures = 0
+        self.timeout = reset_timeout
+        self.opened_at = None
+
+    def allow(self):
+        if self.state == CLOSED:
+            return True
+
+        if self.state == OPEN and self._clock() >= self.opened_at + self.timeout:
+            self.state = HALF_OPEN
+            return True
+
+        return False
+
+    def retry_in(self):
+        """Seconds until the next probe is allowed, 0 when closed"""
+        if self.state == CLOSED:
+            return 0.0
+
+        return max(self.opened_at + self.timeout - self._clock(), 0.0)
+
+    def success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.timeout = self.reset_timeout
+
+    def failure(self):
+        """Record a failure, returns True when it opened the breaker"""
+        self.failures += 1
+
+        if self.state == HALF_OPEN:
+            self.timeout = min(self.timeout * 2, self.max_reset_timeout)
+        elif self.state == OPEN or self.failures < self.failure_threshold:
+            return False
+
+        self.state = OPEN
+        self.opened_at = self._clock()
+
+        return True
+
+def reopen_bus(bus, busnum):
+    """recover callback that closes and reopens an smbus2 SMBus, which
+    clears a file descriptor left unusable after the adapter was reset"""
+    def recover(driver):
+        bus.close()
+        bus.open(busnum)
+
+    return recover
+
+class ResilientDevice():
+    """Proxy calling every method of driver through a RetryPolicy and a
+    CircuitBreaker.  Failures are OSErrors and the driver's own Error (a
+    CRC mismatch, say), which is retried too and raised as
+    ResilientDevice.Error once retries run out.  Other attributes, like
+    FIELDS, pass through."""
+
+    class Error(Exception):
+        pass
+
+    class CircuitOpen(Error):
+        pass
+
+    def __init__(self, driver, name=None, retry=None, breaker=None, recover=None):
+        self.driver = driver
+        self.name = name or type(driver).__name__
+        self.breaker = breaker or CircuitBreaker()
+        self.recover = recover
+
+        self._driver_error = getattr(driver, "Error", None)
+
+        if retry is None:
+            retry = RetryPolicy(retryable=self.retryable)
+        self.retry = retry
+
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.recoveries = 0
+
+    def retryable(self, error):
+        """True for the errors retried: transient OSErrors and driver errors"""
+        return transient(error) or self._is_driver_error(error)
+
+    def _is_driver_error(self, error):
+        return self._driver_error is not None and isinstance(error, self._driver_error)
+
+    def call(self, function, *args, **kwargs):
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise self.CircuitOpen("{0} is failing, next probe in {1:0.1f}s".format(
+                self.name, self.breaker.retry_in()))
+
+        self.calls += 1
+
+        try:
+            result = self.retry.call(function, *args, **kwargs)
+        except Exception as e:
+            if not isinstance(e, OSError) and not self._is_driver_error(e):
+                # Not the device failing, but a probe must not leave the
+                # breaker half-open
+                if self.breaker.state == HALF_OPEN:
+                    self.breaker.failure()
+
+                raise
+
+            self.failures += 1
+
+            if self.breaker.failure() and self.recover is not None:
+                self._recover()
+
+            if isinstance(e, OSError):
+                raise
+
+            raise self.Error("{0}: {1}".format(self.name, e)) from e
+
+        self.breaker.success()
+
+        return result
+
+    def _recover(self):
+        self.recoveries += 1
+
+        try:
+            self.recover(self.driver)
+        except Exception:
+            # The breaker stays open and the next probe will tell
+            pass
+
+    def __getattr__(self, name):
+        attribute = getattr(self.driver, name)
+
+        if not callable(attribute):
+            return attribute
+
+        call = self.call
+
+        def resilient(*args, **kwargs):
+            return call(attribute, *args, **kwargs)
+
+        setattr(self, name, resilient)
+
+        return resilient
+
+    def statistics(self):
+        return {
+            "state":      self.breaker.state,
+            "calls":      self.calls,
+            "failures":   self.failures,
+            "retries":    self.retry.retries,
+            "rejected":   self.rejected,
+            "recoveries": self.recoveries,
+        }
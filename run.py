@@ -1,43 +1,52 @@
-from BME280 import BME280
-from SGP30 import SGP30
-import datetime
-import math
+import discovery
 import signal
-import smbus2
+import sys
 from smbus2 import SMBus
 import time
 
-def absolute_humidity(temperature, relative_humidity):
-    """https://carnotcycle.wordpress.com/2012/08/04/how-to-convert-relative-humidity-to-absolute-humidity/"""
-    """https://esphome.io/cookbook/bme280_environment.html"""
-    t     = temperature
-    r_hum = relative_humidity
-
-    a_hum = (6.112 * math.pow(math.e, (17.67 * t) / (t + 243.5)) * r_hum * 18.01534) / ((273.15 + t) * 8.31447215)
-
-    return a_hum
+from daemon import Daemon, humidity_compensation
+from pipeline import AbsoluteHumidity, Pipeline, SinkWorker
 
 def handler(signal, frame):
     exit(0)
 
 signal.signal(signal.SIGINT, handler)
 
-bme280 = BME280(address=0x76)
+# Not a writers.Writer: those write machine formats to a file, this is a
+# line with units for the terminal.  Each batch is still formatted into one
+# write and flush rather than a print per sample.
+def show(samples):
+    lines = []
+
+    for timestamp, readings in samples:
+        bme280 = readings.get("bme280")
+        sgp30 = readings.get("sgp30")
+
+        if bme280 is None or sgp30 is None:
+            continue
+
+        now = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(timestamp / 1e9))
 
-sgp30 = SGP30(SMBus(1))
+        lines.append("{0} {1:0.2f}℃ {2:0.2f}hPa {3:0.3f}%RH {4:0.3f}g/m³ {5:.0f}ppm eCO₂ {6:.0f}ppb tVOC\n".format(
+            now, bme280["temperature"], bme280["pressure"] / 1000, bme280["humidity"],
+            bme280["absolute_humidity"], sgp30["eCO2"], sgp30["tVOC"]))
 
-while(True):
-    now = datetime.datetime.now().isoformat(timespec='seconds')
+    sys.stdout.write("".join(lines))
+    sys.stdout.flush()
 
-    temp  = bme280.read_temperature()
-    pres  = bme280.read_pressure() / 1000
-    r_hum = bme280.read_humidity()
+bus = SMBus(1)
 
-    a_hum = absolute_humidity(temp, r_hum)
+devices = discovery.bind(bus, 1, discovery.inventory(bus, 1))
 
-    sgp30.write_absolute_humidity(a_hum)
-    eCO2, tVOC = sgp30.read_measurements()
-    print("{0} {1:0.2f}℃ {2:0.2f}hPa {3:0.3f}%RH {4}ppm eCO₂ {5}ppb tVOC".format(now, temp, pres, r_hum, eCO2, tVOC))
+# Reads every second; the SGP30 gets the BME280's humidity on the sampling
+# thread, printing happens on the sink's own.  A sample where the BME280
+# read failed leaves the SGP30's compensation as it was, and an SGP30 write
+# error is counted in daemon.hook_errors rather than ending the run.
+daemon = Daemon({"bme280": devices["bme280"], "sgp30": devices["sgp30"]})
+daemon.hooks.append(humidity_compensation())
 
-    time.sleep(1)
+pipeline = Pipeline(transforms=[AbsoluteHumidity("bme280")], sinks=[SinkWorker(show, batch_size=1)])
+pipeline.attach(daemon)
 
+with pipeline:
+    daemon.run()
@@ -0,0 +1,108 @@
+import math
+import time
+from collections import deque
+
+class RunningStats():
+    """Running mean and variance using Welford's online algorithm.  Values are
+    folded in one at a time so no sample history is kept."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean  = 0.0
+        self._m2   = 0.0
+
+    def add(self, value):
+        self.count += 1
+
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2  += delta * (value - self.mean)
+
+        return self.mean
+
+    def variance(self):
+        """Sample variance, 0 until there are at least two values"""
+        if self.count < 2:
+            return 0.0
+
+        return self._m2 / (self.count - 1)
+
+    def stddev(self):
+        return math.sqrt(self.variance())
+
+    def confidence_interval(self, z=1.96):
+        """Half-width of the confidence interval of the mean (95% by default)"""
+        if self.count < 2:
+            return math.inf
+
+        return z * math.sqrt(self.variance() / self.count)
+
+    def converged(self, tolerance, z=1.96):
+        """True when the confidence interval of the mean is within tolerance
+        (relative to the mean)"""
+        return self.confidence_interval(z) <= abs(self.mean) * tolerance
+
+class MovingAverage():
+    """Moving average over the last window values, updated in O(1) per value.
+    The running total is recomputed once per window so float error does not
+    accumulate over long runs."""
+
+    def __init__(self, window):
+        if window < 1:
+            raise ValueError("Unexpected window value {0}".format(window))
+
+        self._values = deque(maxlen=window)
+        self._total  = 0.0
+        self._added  = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    def add(self, value):
+        values = self._values
+
+        if len(values) == values.maxlen:
+            self._total -= values[0]
+
+        values.append(value)
+        self._total += value
+
+        self._added += 1
+        if self._added >= values.maxlen:
+            self._added = 0
+            self._total = math.fsum(values)
+
+        return self.value()
+
+    def full(self):
+        return len(self._values) == self._values.maxlen
+
+    def value(self):
+        if not self._values:
+            return None
+
+        return self._total / len(self._values)
+
+def sample_until_converged(read,
+                           max_samples=100,
+                           min_samples=10,
+                           tolerance=0.005,
+                           interval=0.1):
+    """Call read() until the confidence interval of the mean is within
+    tolerance of the mean or max_samples have been taken.  Returns the
+    RunningStats of the samples."""
+    stats = RunningStats()
+
+    while stats.count < max_samples:
+        if stats.count > 0 and interval > 0:
+            time.sleep(interval)
+
+        stats.add(read())
+
+        if stats.count >= min_samples and stats.converged(tolerance):
+            break
+
+    return stats
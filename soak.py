@@ -0,0 +1,131 @@
+"""Memory soak test of the daemon read paths against the in-process FakeBus.
+
+Runs Daemon.sample() over a BME280, SGP30 and HM3301 for millions of
+iterations (with a RingBuffer history far smaller than the run so it wraps
+many times) and records RSS and the tracemalloc total at checkpoints after
+a warm up.  The run fails when either grows by more than its allowance
+between the first and last checkpoint, and prints the allocation sites that
+grew the most:
+
+    python soak.py                        # 2,000,000 iterations
+    python soak.py --iterations 100000    # quick check
+
+Like benchmark.py the drivers' conversion sleeps are skipped."""
+
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from unittest import mock
+
+from daemon import Daemon
+from fake_bus import FakeBus
+
+def _no_sleep(seconds):
+    # A plain function, a MagicMock would record every call
+    pass
+
+def rss():
+    """Resident set size of this process in bytes"""
+    try:
+        with open("/proc/self/statm") as io:
+            return int(io.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+
+        # Peak rather than current outside Linux, still flat when bounded
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _devices(bus):
+    from BME280 import BME280
+    from HM3301 import HM3301
+    from SGP30 import SGP30
+
+    return {
+        "bme280": BME280(address=0x76, busnum=1, i2c_interface=lambda busnum: bus),
+        "sgp30":  SGP30(bus),
+        "hm3301": HM3301(bus),
+    }
+
+def soak(iterations=2000000, checkpoints=10, warmup=10000, history=3600):
+    """Returns a list of (iteration, rss, traced bytes) checkpoints and the
+    tracemalloc snapshots at the first and last checkpoint"""
+    bus = FakeBus.with_devices()
+
+    with mock.patch("time.sleep", _no_sleep), mock.patch("SGP30.sleep", _no_sleep, create=True):
+        daemon = Daemon(_devices(bus), interval=0, history=history)
+
+        for _ in range(warmup):
+            daemon.sample()
+
+        daemon.freeze()
+
+        tracemalloc.start()
+
+        results = []
+        first = None
+        step = max(iterations // checkpoints, 1)
+
+        try:
+            for done in range(0, iterations + 1, step):
+                if done:
+                    for _ in range(step):
+                        daemon.sample()
+
+                gc.collect()
+                results.append((done, rss(), tracemalloc.get_traced_memory()[0]))
+
+                if first is None:
+                    first = tracemalloc.take_snapshot()
+
+            last = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+            gc.unfreeze()
+
+    return results, first, last
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check the daemon read paths for memory growth")
+    parser.add_argument("--iterations", type=int, default=2000000)
+    parser.add_argument("--checkpoints", type=int, default=10)
+    parser.add_argument("--rss-allowance", type=int, default=256 * 1024,
+                        help="allowed RSS growth in bytes")
+    parser.add_argument("--traced-allowance", type=int, default=16 * 1024,
+                        help="allowed tracemalloc growth in bytes")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    results, first, last = soak(args.iterations, args.checkpoints)
+    elapsed = time.perf_counter() - started
+
+    print("{0:>10} {1:>10} {2:>10}".format("iteration", "RSS KiB", "traced B"))
+    for done, resident, traced in results:
+        print("{0:>10} {1:>10} {2:>10}".format(done, resident // 1024, traced))
+
+    print("{0} iterations in {1:0.1f}s".format(args.iterations, elapsed))
+
+    rss_growth = results[-1][1] - results[0][1]
+    traced_growth = results[-1][2] - results[0][2]
+
+    failures = []
+
+    if rss_growth > args.rss_allowance:
+        failures.append("RSS grew {0} bytes, allowance {1}".format(rss_growth, args.rss_allowance))
+
+    if traced_growth > args.traced_allowance:
+        failures.append("Traced memory grew {0} bytes, allowance {1}".format(traced_growth, args.traced_allowance))
+
+        for stat in last.compare_to(first, "lineno")[:10]:
+            print(stat)
+
+    for failure in failures:
+        print(failure)
+
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
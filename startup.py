@@ -0,0 +1,141 @@
+"""Initialize sensors concurrently.
+
+Driver setup is mostly waiting: BME280 calibration reads and mode change
+pauses, SGP30 iaq_init, feature and baseline commands with fixed conversion
+times, HM3301 mode selection.  initialize() runs each device's setup in its
+own thread so devices on different buses proceed in parallel and devices on
+the same bus use it while the others sleep.  Each shared bus is wrapped in a
+LockedBus so transactions from different threads don't interleave (smbus
+selects the device address and transfers in separate system calls).
+
+    timeline = Timeline()
+    drivers = initialize([
+        ("bme280", 1, lambda bus: BME280(address=0x76, busnum=1, i2c_interface=lambda busnum: bus)),
+        ("sgp30",  1, SGP30),
+        ("hm3301", 0, HM3301),
+    ], timeline=timeline)
+
+    timeline.show()"""
+
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+TimelineEntry = namedtuple("TimelineEntry", ["name", "bus", "started", "finished", "error"])
+
+class LockedBus():
+    """smbus compatible proxy holding a lock for every transaction"""
+
+    def __init__(self, bus):
+        self._bus = bus
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        method = getattr(self._bus, name)
+
+        if not callable(method):
+            return method
+
+        lock = self._lock
+
+        def locked(*args, **kwargs):
+            with lock:
+                return method(*args, **kwargs)
+
+        setattr(self, name, locked)
+
+        return locked
+
+class Timeline():
+    """Start and finish time of each device's setup, in seconds from the
+    start of initialize()"""
+
+    def __init__(self):
+        self.entries = []
+        self.total = None
+
+    def add(self, entry):
+        self.entries.append(entry)
+
+    def show(self, width=50):
+        total = self.total or max([entry.finished for entry in self.entries] + [0])
+        scale = width / total if total > 0 else 0
+
+        for entry in sorted(self.entries, key=lambda entry: entry.started):
+            start = int(entry.started * scale)
+            length = max(int((entry.finished - entry.started) * scale), 1)
+            status = "" if entry.error is None else " failed: {0}".format(entry.error)
+
+            print("{0:<12} bus {1:<3} {2:>7.1f}ms {3}{4}{5}".format(
+                entry.name, entry.bus, (entry.finished - entry.started) * 1000,
+                " " * start, "#" * length, status))
+
+        print("total {0:0.1f}ms".format(total * 1000))
+
+def _open_bus(busnum):
+    from smbus2 import SMBus
+
+    return SMBus(busnum)
+
+def initialize(devices, buses=None, timeline=None, open_bus=_open_bus):
+    """Run (name, busnum, factory) device setups concurrently, where
+    factory(bus) creates the driver.  buses maps bus numbers to already
+    opened buses, other buses are opened with open_bus(busnum).  Returns a
+    dict of name to driver for the devices that initialized, failures are
+    recorded in timeline."""
+    if timeline is None:
+        timeline = Timeline()
+
+    locked = {}
+    for _, busnum, _ in devices:
+        if busnum not in locked:
+            bus = buses.get(busnum) if buses else None
+            locked[busnum] = LockedBus(bus if bus is not None else open_bus(busnum))
+
+    started = time.monotonic()
+
+    def setup(name, busnum, factory):
+        begin = time.monotonic() - started
+
+        try:
+            driver = factory(locked[busnum])
+            error = None
+        except Exception as e:
+            driver = None
+            error = e
+
+        timeline.add(TimelineEntry(name, busnum, begin, time.monotonic() - started, error))
+
+        return name, driver
+
+    drivers = {}
+
+    with ThreadPoolExecutor(max_workers=max(len(devices), 1)) as executor:
+        futures = [executor.submit(setup, *device) for device in devices]
+
+        for future in futures:
+            name, driver = future.result()
+
+            if driver is not None:
+                drivers[name] = driver
+
+    timeline.total = time.monotonic() - started
+
+    return drivers
+
+if __name__ == "__main__":
+    import sys
+    import discovery
+
+    busnum = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    bus = _open_bus(busnum)
+
+    devices = [
+        (name, busnum, lambda bus, device=device: discovery.driver(bus, busnum, device))
+        for name, device in discovery.named(discovery.inventory(bus, busnum))
+    ]
+
+    timeline = Timeline()
+    initialize(devices, buses={busnum: bus}, timeline=timeline)
+    timeline.show()
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+import air_quality
+
+# The budget in the module documentation, for a one-shot read
+IMPORT_BUDGET_MS = 50
+
+CONFIG = """
+[[sensors]]
+chip = "{0}"
+
+[[outputs]]
+type = "jsonl"
+path = "readings.jsonl"
+"""
+
+def write_config(path, chip):
+    with open(path, "w") as io:
+        io.write(CONFIG.format(chip))
+
+    return str(path)
+
+def test_configurations_are_cached_separately(tmp_path, monkeypatch):
+    cache = str(tmp_path / "cache")
+    bme280 = write_config(tmp_path / "bme280.toml", "bme280")
+    sgp30 = write_config(tmp_path / "sgp30.toml", "sgp30")
+
+    air_quality._cached_parse(bme280, cache)
+    air_quality._cached_parse(sgp30, cache)
+
+    assert sorted(os.listdir(cache)) == sorted([
+        os.path.basename(air_quality._cache_filename(bme280, cache)),
+        os.path.basename(air_quality._cache_filename(sgp30, cache)),
+    ])
+
+    def parse(path):
+        raise AssertionError("{0} wasn't cached".format(path))
+
+    # Both are still served from the cache
+    monkeypatch.setattr(air_quality, "_parse", parse)
+
+    assert air_quality._cached_parse(bme280, cache)["sensors"][0]["chip"] == "bme280"
+    assert air_quality._cached_parse(sgp30, cache)["sensors"][0]["chip"] == "sgp30"
+
+def test_read_imports_within_budget(tmp_path, monkeypatch, capsys):
+    # discovery opens buses with smbus2
+    pytest.importorskip("smbus2")
+
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    config = write_config(tmp_path / "bme280.toml", "bme280")
+
+    assert air_quality.importtime(config, IMPORT_BUDGET_MS) == 0, capsys.readouterr().out
+
+def test_read_imports_only_configured_modules(tmp_path, monkeypatch):
+    pytest.importorskip("smbus2")
+
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    config = write_config(tmp_path / "bme280.toml", "bme280")
+
+    _, top = air_quality._import_times(air_quality._read_imports(config))
+
+    assert "BME280" in top
+    assert not {"SGP30", "HM3301", "ADC1201C021", "filters", "deadband", "psychrometrics"} & set(top)
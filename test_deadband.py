@@ -0,0 +1,24 @@
+import math
+
+from deadband import Deadband, ReportByException
+
+def test_change_to_and_from_nan_is_reported():
+    report = ReportByException({"pressure": Deadband(absolute=10.0)})
+
+    assert report.filter(0, {"pressure": 1000.0}) == {"pressure": 1000.0}
+    assert report.filter(1, {"pressure": 1001.0}) == {}
+
+    changed = report.filter(2, {"pressure": math.nan})
+    assert math.isnan(changed["pressure"])
+
+    # Still failing
+    assert report.filter(3, {"pressure": math.nan}) == {}
+
+    assert report.filter(4, {"pressure": 1001.0}) == {"pressure": 1001.0}
+
+def test_nan_reference_with_relative_band():
+    deadband = Deadband(relative=0.01)
+
+    assert deadband.exceeded(math.nan, 0.0)
+    assert deadband.exceeded(5.0, math.nan)
+    assert not deadband.exceeded(math.nan, math.nan)
@@ -0,0 +1,47 @@
+import readings_store
+from readings_store import SAMPLE, Series
+
+def test_partial_trailing_sample_is_truncated_on_open(tmp_path):
+    path = str(tmp_path / "series")
+
+    series = Series(path)
+    series.append([(1, 1.0), (2, 2.0)])
+    series.close()
+
+    # A crash half way through writing the third sample
+    with open(path + ".dat", "ab") as samples:
+        samples.write(SAMPLE.pack(3, 3.0)[:5])
+
+    series = Series(path)
+    assert series.count == 2
+
+    series.append([(4, 4.0)])
+    series.close()
+
+    with open(path + ".dat", "rb") as samples:
+        assert list(SAMPLE.iter_unpack(samples.read())) == [(1, 1.0), (2, 2.0), (4, 4.0)]
+
+    series = Series(path)
+    assert series.count == 3
+    assert series.aggregate(0, 10) == readings_store.Summary(3, 1.0, 4.0, 7.0)
+    series.close()
+
+def test_partial_trailing_sample_is_truncated_on_rebuild(tmp_path):
+    path = str(tmp_path / "series")
+
+    series = Series(path)
+    series.append([(1, 1.0), (2, 2.0)])
+    series.close()
+
+    # The index lost its last write as well
+    with open(path + ".dat", "ab") as samples:
+        samples.write(SAMPLE.pack(3, 3.0)[:5])
+    open(path + ".idx", "wb").close()
+
+    series = Series(path)
+    assert series.count == 2
+    assert series.aggregate(0, 10) == readings_store.Summary(2, 1.0, 2.0, 3.0)
+
+    series.append([(4, 4.0)])
+    assert [tuple(sample) for sample in series.read_block(0)] == [(1, 1.0), (2, 2.0), (4, 4.0)]
+    series.close()
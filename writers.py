@@ -0,0 +1,206 @@
+"""Buffered structured output of readings.
+
+Writers take integer nanosecond timestamps and readings as a dict of source
+name to {field: value}, the same as a pipeline.Sample.  Rows are only kept
+until a flush, which formats them all at once with one write and one flush
+of the file, so each reading costs a tuple append rather than a format and a
+system call:
+
+    with open("readings.csv", "a", newline="") as io:
+        writer = CSVWriter(io, ["bme280.temperature", "bme280.humidity"],
+                           max_rows=600, max_delay=60.0)
+
+        writer.write(time.time_ns(), {"bme280": {"temperature": 21.3, "humidity": 48.2}})
+
+A flush happens once max_rows are buffered or when a write comes max_delay
+seconds after the oldest buffered row, and on close().  A writer is also a
+pipeline sink, called with a list of Samples, then the SinkWorker's batching
+decides when to flush.
+
+JSONLinesWriter writes {"timestamp": ns, "readings": {...}} objects,
+CSVWriter a timestamp column and a source.field column per field, and
+InfluxWriter InfluxDB line protocol with a line per source, tagged with the
+source name.  NaN and infinite values, which JSON and InfluxDB don't
+accept, are written as null by JSONLinesWriter and left out by
+InfluxWriter."""
+
+import math
+import time
+from abc import ABC, abstractmethod
+
+class Writer(ABC):
+    """Buffers rows for format(), which subclasses implement"""
+
+    def __init__(self, io, max_rows=256, max_delay=1.0, clock=time.monotonic):
+        self.io = io
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+
+        self._clock = clock
+
+        self._rows = []
+        self._oldest = None
+
+        self.rows = 0
+        self.flushes = 0
+
+    def write(self, timestamp, readings):
+        rows = self._rows
+
+        if not rows:
+            self._oldest = self._clock()
+
+        rows.append((timestamp, readings))
+
+        if len(rows) >= self.max_rows or self._clock() - self._oldest >= self.max_delay:
+            self.flush()
+
+    def __call__(self, samples):
+        """Write a batch of pipeline.Samples.  The SinkWorker feeding them
+        already waited for the batch, so it is flushed at once."""
+        if not self._rows:
+            self._oldest = self._clock()
+
+        self._rows.extend(samples)
+        self.flush()
+
+    def flush(self):
+        if self._rows:
+            self.format(self._rows)
+
+            self.rows += len(self._rows)
+            self._rows = []
+
+        self.io.flush()
+        self.flushes += 1
+
+    @abstractmethod
+    def format(self, rows):
+        """Write rows, a list of (timestamp, readings), to self.io"""
+
+    def close(self):
+        self.flush()
+        self.io.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+class JSONLinesWriter(Writer):
+    def __init__(self, io, **kwargs):
+        import json
+
+        super().__init__(io, **kwargs)
+
+        self._encode = json.JSONEncoder(separators=(",", ":"), allow_nan=False).encode
+
+    def format(self, rows):
+        encode = self._encode
+        lines = []
+
+        for timestamp, readings in rows:
+            try:
+                line = encode({"timestamp": timestamp, "readings": readings})
+            except ValueError:
+                # NaN and infinity aren't JSON, only rows holding them pay
+                # for the copy
+                line = encode({"timestamp": timestamp, "readings": _null_non_finite(readings)})
+
+            lines.append(line + "\n")
+
+        self.io.write("".join(lines))
+
+def _null_non_finite(readings):
+    return {source: {field: value if math.isfinite(value) else None
+                     for field, value in values.items()}
+            for source, values in readings.items()}
+
+class CSVWriter(Writer):
+    """columns are "source.field" names, fixed for the file as a CSV can't
+    gain columns later.  The header is written first unless the file already
+    has rows."""
+
+    def __init__(self, io, columns, **kwargs):
+        import csv
+
+        super().__init__(io, **kwargs)
+
+        self.columns = list(columns)
+
+        self._keys = [tuple(column.split(".", 1)) for column in self.columns]
+        self._writer = csv.writer(io)
+        self._header = None
+
+    def format(self, rows):
+        if self._header is None:
+            try:
+                self._header = self.io.tell() != 0
+            except (OSError, ValueError):
+                # A pipe or terminal
+                self._header = False
+
+            if not self._header:
+                self._writer.writerow(["timestamp"] + self.columns)
+                self._header = True
+
+        keys = self._keys
+
+        self._writer.writerows(
+            [timestamp] + [readings.get(source, {}).get(field, "") for source, field in keys]
+            for timestamp, readings in rows)
+
+def _escape_tag(value):
+    return str(value).replace("\\", "\\\\").replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+class InfluxWriter(Writer):
+    """Lines of measurement,source=<name>[,tags] field=value,... timestamp.
+    NaN and infinite fields are left out, InfluxDB rejects them."""
+
+    def __init__(self, io, measurement="air_quality", tags=None, **kwargs):
+        super().__init__(io, **kwargs)
+
+        self.measurement = measurement
+        self.tags = tags or {}
+
+        extra = "".join(",{0}={1}".format(_escape_tag(key), _escape_tag(value))
+                        for key, value in sorted(self.tags.items()))
+
+        self._prefix = measurement.replace(",", "\\,").replace(" ", "\\ ") + ",source="
+        self._extra = extra
+
+        # source name: line prefix, and field name: escaped key
+        self._prefixes = {}
+        self._fields = {}
+
+    def _line_prefix(self, source):
+        prefix = self._prefixes.get(source)
+
+        if prefix is None:
+            prefix = self._prefixes[source] = self._prefix + _escape_tag(source) + self._extra + " "
+
+        return prefix
+
+    def _field(self, field):
+        key = self._fields.get(field)
+
+        if key is None:
+            key = self._fields[field] = _escape_tag(field) + "="
+
+        return key
+
+    def format(self, rows):
+        lines = []
+
+        for timestamp, readings in rows:
+            suffix = " {0}\n".format(timestamp)
+
+            for source, values in readings.items():
+                fields = ",".join([self._field(field) + repr(float(value))
+                                   for field, value in values.items() if math.isfinite(value)])
+
+                if fields:
+                    lines.append(self._line_prefix(source) + fields + suffix)
+
+        self.io.write("".join(lines))